@@ -0,0 +1,91 @@
+import { ProviderBuilder } from "../test_data_factory";
+import axios from "axios";
+
+
+declare var process: {
+    env: {
+        SERVER_PORT: string,
+        PAPIEA_ADMIN_S2S_KEY: string
+    }
+};
+const serverPort = parseInt(process.env.SERVER_PORT || '3000');
+const adminKey = process.env.PAPIEA_ADMIN_S2S_KEY || '';
+
+const entityApi = axios.create({
+    baseURL: `http://127.0.0.1:${serverPort}/services`,
+    timeout: 10000,
+    headers: { 'Content-Type': 'application/json' }
+});
+
+const providerApi = axios.create({
+    baseURL: `http://127.0.0.1:${serverPort}/provider/`,
+    timeout: 1000,
+    headers: {
+        'Content-Type': 'application/json',
+        'Authorization': `Bearer ${adminKey}`
+    }
+});
+
+describe("Projection tests", () => {
+    const providerPrefix = "test";
+    const providerVersion = "0.1.0";
+    let kind_name: string
+
+    let uuids: string[] = [];
+
+    beforeAll(async () => {
+        const provider = new ProviderBuilder(providerPrefix).withVersion(providerVersion).withKinds().build();
+        kind_name = provider.kinds[0].name;
+        await providerApi.post('/', provider);
+
+        const entityResponses: any[] = await Promise.all([0, 1, 2].map(i =>
+            entityApi.post(`/${providerPrefix}/${providerVersion}/${kind_name}`, {
+                spec: {
+                    x: i,
+                    y: 11
+                }
+            })));
+        uuids = entityResponses.map(entityResp => entityResp.data.metadata.uuid);
+    });
+
+    afterAll(async () => {
+        await providerApi.delete(`${providerPrefix}/${providerVersion}`);
+        await Promise.all(uuids.map(uuid => entityApi.delete(`/${providerPrefix}/${providerVersion}/${kind_name}/${uuid}`)));
+    });
+
+    test("Filter returns only the projected fields", async () => {
+        const { data } = await entityApi.post(`${providerPrefix}/${providerVersion}/${kind_name}/filter?sort=spec.x`, {
+            spec: {
+                y: 11
+            },
+            projection: ["metadata.uuid", "spec.x"]
+        });
+        expect(data.entity_count).toBe(3);
+        expect(data.results[0]).toEqual({ metadata: { uuid: data.results[0].metadata.uuid }, spec: { x: 0 } });
+    });
+
+    test("Projection can be given as a query parameter", async () => {
+        const { data } = await entityApi.get(`${providerPrefix}/${providerVersion}/${kind_name}?spec=${JSON.stringify({ y: 11 })}&projection=metadata`);
+        expect(data.results.length).toBe(3);
+        for (const entity of data.results) {
+            expect(Object.keys(entity)).toEqual(["metadata"]);
+            expect(entity.metadata.spec_version).toBeDefined();
+        }
+    });
+
+    test("Get returns only the projected fields", async () => {
+        const { data } = await entityApi.get(`${providerPrefix}/${providerVersion}/${kind_name}/${uuids[0]}?projection=spec.y,status.missing`);
+        expect(data).toEqual({ spec: { y: 11 } });
+    });
+
+    test("Empty projection fields are rejected", async () => {
+        expect.assertions(1);
+        try {
+            await entityApi.post(`${providerPrefix}/${providerVersion}/${kind_name}/filter`, {
+                projection: ["spec..x"]
+            });
+        } catch (e) {
+            expect(e.response.status).toBe(400);
+        }
+    });
+});
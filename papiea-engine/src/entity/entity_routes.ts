@@ -3,7 +3,7 @@ import { Router } from "express";
 import { Query } from 'express-serve-static-core';
 import { UserAuthInfo, asyncHandler } from '../auth/authn';
 import { BadRequestError } from '../errors/bad_request_error';
-import { processPaginationParams, processSortQuery } from "../utils/utils";
+import { processPaginationParams, processProjectionQuery, processSortQuery, projectFields } from "../utils/utils";
 import { SortParams } from "./entity_api_impl";
 import { CheckNoQueryParams, check_request } from "../validator/express_validator";
 import {Version} from "papiea-core"
@@ -29,11 +29,18 @@ export function createEntityAPIRouter(entity_api: Entity_API, trace: Function):
         return { results: pageEntities, entity_count: totalEntities };
     }
 
-    const filterEntities = async (user: UserAuthInfo, prefix: string, version: Version, kind_name: string, filter: any, skip: number, size: number, searchDeleted: boolean, exactMatch: boolean, ctx: RequestContext, sortParams?: SortParams): Promise<PaginatedResult<any>> => {
+    const projectEntities = function(page: PaginatedResult<any>, projection?: string[]): PaginatedResult<any> {
+        if (projection === undefined) {
+            return page;
+        }
+        return { results: page.results.map(entity => projectFields(entity, projection)), entity_count: page.entity_count };
+    }
+
+    const filterEntities = async (user: UserAuthInfo, prefix: string, version: Version, kind_name: string, filter: any, skip: number, size: number, searchDeleted: boolean, exactMatch: boolean, ctx: RequestContext, sortParams?: SortParams, projection?: string[]): Promise<PaginatedResult<any>> => {
         if (searchDeleted) {
             const entities = await Async.collect(
                 entity_api.filter_deleted(user, prefix, version, kind_name, filter, exactMatch, ctx, sortParams))
-            return paginateEntities(entities, skip, size)
+            return projectEntities(paginateEntities(entities, skip, size), projection)
         }
 
         const resultEntities = entity_api.filter_entity(
@@ -45,7 +52,7 @@ export function createEntityAPIRouter(entity_api: Entity_API, trace: Function):
         }
 
         const entities = Array.from(uuidToEntity.values());
-        return paginateEntities(entities, skip, size)
+        return projectEntities(paginateEntities(entities, skip, size), projection)
     };
 
     router.post("/:prefix/:version/check_permission", CheckNoQueryParams, trace("check_permission"), asyncHandler(async (req, res) => {
@@ -82,7 +89,7 @@ export function createEntityAPIRouter(entity_api: Entity_API, trace: Function):
 
     router.post("/intent_watcher/filter", check_request({
         allowed_query_params: ['offset', 'limit', 'sort'],
-        allowed_body_params: ['entity_ref', 'created_at', 'status']
+        allowed_body_params: ['uuid', 'entity_ref', 'created_at', 'status']
     }), trace("filter_intent_watcher"), asyncHandler(async (req, res) => {
         const filter: any = {};
         const offset = queryToNum(req.query.offset, 'offset');
@@ -90,6 +97,9 @@ export function createEntityAPIRouter(entity_api: Entity_API, trace: Function):
         const rawSortQuery = queryToString(req.query.sort, 'sort');
         const sortParams = processSortQuery(rawSortQuery);
         const [skip, size] = processPaginationParams(offset, limit);
+        if (req.body.uuid) {
+            filter.uuid = req.body.uuid
+        }
         if (req.body.entity_ref) {
             filter.entity_ref = req.body.entity_ref
         }
@@ -106,7 +116,7 @@ export function createEntityAPIRouter(entity_api: Entity_API, trace: Function):
     }))
 
     router.get("/:prefix/:version/:kind", check_request({
-        allowed_query_params: ['offset', 'limit', 'sort', 'spec', 'status', 'metadata', 'exact', 'deleted']
+        allowed_query_params: ['offset', 'limit', 'sort', 'spec', 'status', 'metadata', 'exact', 'deleted', 'projection']
     }), trace("filter_entity"), asyncHandler(async (req, res) => {
         const filter: any = {};
         const offset = queryToNum(req.query.offset, 'offset');
@@ -115,23 +125,27 @@ export function createEntityAPIRouter(entity_api: Entity_API, trace: Function):
         const exactMatch = queryToBool(req.query.exact, 'exact') ?? false
         const searchDeleted = queryToBool(req.query.deleted, 'deleted') ?? false
         const sortParams = processSortQuery(rawSortQuery);
+        const projection = processProjectionQuery(queryToString(req.query.projection, 'projection'));
         const [skip, size] = processPaginationParams(offset, limit);
 
         filter.spec = JSON.parse(queryToString(req.query.spec, 'spec') ?? '{}');
         filter.status = JSON.parse(queryToString(req.query.status, 'status') ?? '{}');
         filter.metadata = JSON.parse(queryToString(req.query.metadata, 'metadata') ?? '{}');
 
-        res.json(await filterEntities(req.user, req.params.prefix, req.params.version, req.params.kind, filter, skip, size, searchDeleted, exactMatch, res.locals.ctx, sortParams));
+        res.json(await filterEntities(req.user, req.params.prefix, req.params.version, req.params.kind, filter, skip, size, searchDeleted, exactMatch, res.locals.ctx, sortParams, projection));
     }));
 
-    router.get("/:prefix/:version/:kind/:uuid", CheckNoQueryParams, trace("get_entity"), asyncHandler(async (req, res) => {
+    router.get("/:prefix/:version/:kind/:uuid", check_request({
+        allowed_query_params: ['projection']
+    }), trace("get_entity"), asyncHandler(async (req, res) => {
+        const projection = processProjectionQuery(queryToString(req.query.projection, 'projection'));
         const entity = await entity_api.get_entity(req.user, req.params.prefix, req.params.version, req.params.kind, req.params.uuid, res.locals.ctx);
-        res.json(entity);
+        res.json(projection === undefined ? entity : projectFields(entity, projection));
     }));
 
     router.post("/:prefix/:version/:kind/filter", check_request({
-        allowed_query_params: ['offset', 'limit', 'sort', 'exact', 'deleted'],
-        allowed_body_params: ['spec', 'status', 'metadata', 'offset', 'limit', 'sort']
+        allowed_query_params: ['offset', 'limit', 'sort', 'exact', 'deleted', 'projection'],
+        allowed_body_params: ['spec', 'status', 'metadata', 'offset', 'limit', 'sort', 'projection']
     }), trace("filter_entity"), asyncHandler(async (req, res) => {
         const offset = queryToNum(req.query.offset, 'offset') ?? req.body.offset;
         const limit = queryToNum(req.query.limit, 'limit') ?? req.body.limit;
@@ -139,6 +153,7 @@ export function createEntityAPIRouter(entity_api: Entity_API, trace: Function):
         const exactMatch = queryToBool(req.query.exact, 'exact') ?? false
         const searchDeleted = queryToBool(req.query.deleted, 'deleted') ?? false
         const sortParams: undefined | SortParams = processSortQuery(rawSortQuery);
+        const projection = processProjectionQuery(queryToString(req.query.projection, 'projection') ?? req.body.projection);
         const [skip, size] = processPaginationParams(offset, limit);
         const filter: any = {};
         if (req.body.spec) {
@@ -157,7 +172,7 @@ export function createEntityAPIRouter(entity_api: Entity_API, trace: Function):
             filter.metadata = {};
         }
 
-        res.json(await filterEntities(req.user, req.params.prefix, req.params.version, req.params.kind, filter, skip, size, searchDeleted, exactMatch, res.locals.ctx, sortParams));
+        res.json(await filterEntities(req.user, req.params.prefix, req.params.version, req.params.kind, filter, skip, size, searchDeleted, exactMatch, res.locals.ctx, sortParams, projection));
     }));
 
     router.put("/:prefix/:version/:kind/:uuid", check_request({
@@ -77,6 +77,43 @@ export function processSortQuery(query: string | undefined): undefined | SortPar
     return processedQuery;
 }
 
+export function processProjectionQuery(query: string | string[] | undefined): undefined | string[] {
+    if (query === undefined) {
+        return undefined;
+    }
+    const fields = Array.isArray(query) ? query : query.split(",");
+    for (const field of fields) {
+        if (typeof field !== "string" || field === "" || field.split(".").some(key => key === "")) {
+            throw new ValidationError({ message: `Failed to validate projection. Projection fields must be non empty dot separated paths, received ${JSON.stringify(field)}.` })
+        }
+    }
+    return fields;
+}
+
+// Keeps only the given dot separated paths of the entity, paths missing from it are skipped
+export function projectFields(entity: any, fields: string[]): any {
+    const projected: any = {};
+    for (const field of fields) {
+        const path = field.split(".");
+        let value = entity;
+        for (const key of path) {
+            value = isObject(value) ? (value as any)[key] : undefined;
+        }
+        if (value === undefined) {
+            continue;
+        }
+        let target = projected;
+        for (const key of path.slice(0, -1)) {
+            if (!isObject(target[key])) {
+                target[key] = {};
+            }
+            target = target[key];
+        }
+        target[path[path.length - 1]] = value;
+    }
+    return projected;
+}
+
 export function isEmpty(obj: any) {
     // JS type system note:
     // axios returns "" as response.data if no data was returned
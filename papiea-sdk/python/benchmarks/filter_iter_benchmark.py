@@ -0,0 +1,124 @@
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+
+from aiohttp import web
+
+# The benchmarks run against the sdk of this checkout, no install needed
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from papiea.client import EntityCRUD
+
+ENTITIES = 100_000
+BATCH_SIZE = 100
+# Latency papiea needs to answer a page, prefetching hides it
+PAGE_LATENCY_SECS = 0.005
+# Time the consumer spends on every entity
+PROCESS_SECS = 0.00005
+PORT = 8781
+# Every entity passes through one generator per page already read, the recursive
+# implementation is quadratic in the number of pages, only run it over part of the dataset
+RECURSIVE_ENTITIES = 20_000
+
+
+def make_entity(i):
+    return {
+        "metadata": {"uuid": str(uuid.UUID(int=i)), "kind": "benchmark_kind", "spec_version": 1},
+        "spec": {"x": i, "y": i, "name": f"entity_{i}"},
+        "status": {"x": i, "y": i, "name": f"entity_{i}"},
+    }
+
+
+def run_server():
+    # Stand-in for papiea's filter route, paginating a fixed dataset
+    dataset = [make_entity(i) for i in range(ENTITIES)]
+
+    async def filter_entities(request: web.Request) -> web.Response:
+        offset = int(request.query.get("offset") or 0)
+        limit = int(request.query.get("limit") or 30)
+        await asyncio.sleep(PAGE_LATENCY_SECS)
+        return web.json_response({"results": dataset[offset:offset + limit], "entity_count": len(dataset)})
+
+    app = web.Application()
+    app.router.add_post("/services/benchmark/0.1/benchmark_kind/filter", filter_entities)
+    web.run_app(app, host="127.0.0.1", port=PORT, print=None)
+
+
+async def legacy_filter_iter(client, filter_obj):
+    # Recursive implementation the sdk used before
+    async def iter_func(batch_size=None, offset=None):
+        res = await client.api_instance.post(f"filter?limit={batch_size}&offset={offset or ''}", filter_obj)
+        if len(res.results) == 0:
+            return
+        for entity in res.results:
+            yield entity
+        async for val in iter_func(batch_size, (offset or 0) + batch_size):
+            yield val
+
+    return iter_func
+
+
+async def consume(iterator, limit):
+    count = 0
+    async for _ in iterator:
+        count += 1
+        # Consumers mostly await something per entity, giving the prefetched requests a chance to progress
+        time.sleep(PROCESS_SECS)
+        await asyncio.sleep(0)
+        if count == limit:
+            await iterator.aclose()
+            break
+    return count
+
+
+async def run(name, make_iter, limit=ENTITIES):
+    async with EntityCRUD(f"http://127.0.0.1:{PORT}", "benchmark", "0.1", "benchmark_kind",
+                          request_hooks=[]) as client:
+        start = time.perf_counter()
+        count = await consume(await make_iter(client), limit)
+        elapsed = time.perf_counter() - start
+        # Separate pass, tracemalloc slows everything down
+        tracemalloc.start()
+        try:
+            await consume(await make_iter(client), limit)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        print(f"{name:<22} {count} entities in {elapsed:6.2f}s, peak memory: {peak / 1024 / 1024:6.2f} MB")
+
+
+async def main():
+    async with EntityCRUD(f"http://127.0.0.1:{PORT}", "benchmark", "0.1", "benchmark_kind") as client:
+        for _ in range(100):
+            try:
+                await client.filter({})
+                break
+            except Exception:
+                await asyncio.sleep(0.1)
+    print(f"{ENTITIES} entities, pages of {BATCH_SIZE}, {PAGE_LATENCY_SECS * 1000:.0f} ms per page,"
+          f" {PROCESS_SECS * 1e6:.0f} us per entity")
+
+    async def legacy(client):
+        return (await legacy_filter_iter(client, {}))(BATCH_SIZE)
+
+    def prefetching(prefetch):
+        async def make_iter(client):
+            return (await client.filter_iter({}, prefetch=prefetch))(BATCH_SIZE)
+        return make_iter
+
+    await run("recursive", legacy, RECURSIVE_ENTITIES)
+    for prefetch in (0, 1, 2, 4):
+        await run(f"iterative prefetch={prefetch}", prefetching(prefetch))
+
+
+if __name__ == "__main__":
+    server = multiprocessing.Process(target=run_server, daemon=True)
+    server.start()
+    try:
+        asyncio.get_event_loop().run_until_complete(main())
+    finally:
+        server.terminate()
@@ -0,0 +1,68 @@
+import json
+import os
+import sys
+import timeit
+import uuid
+
+# The benchmarks run against the sdk of this checkout, no install needed
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from papiea.core import AttributeDict
+from papiea.json_codec import CODECS
+
+# Rough shape of a filter page of 20 entities with large specs and statuses
+PAGE_SIZE = 20
+FIELDS_PER_ENTITY = 500
+ITERATIONS = 50
+
+
+def make_entity():
+    body = {
+        f"field_{i}": {"name": f"value_{i}", "size": i, "tags": ["a", "b", "c"], "nested": {"enabled": True}}
+        for i in range(FIELDS_PER_ENTITY)
+    }
+    return {
+        "metadata": {
+            "uuid": str(uuid.uuid4()),
+            "kind": "benchmark_kind",
+            "spec_version": 1,
+            "created_at": "2020-01-01T00:00:00.000Z",
+        },
+        "spec": body,
+        "status": body,
+    }
+
+
+def legacy_loads_attrs(data):
+    def object_hook(obj):
+        return AttributeDict(obj)
+
+    return json.loads(data, object_hook=object_hook)
+
+
+def main():
+    page = json.dumps({
+        "results": [make_entity() for _ in range(PAGE_SIZE)],
+        "entity_count": PAGE_SIZE
+    }).encode("utf-8")
+    print(f"Page size: {len(page) / 1024:.0f} KB, {ITERATIONS} iterations")
+
+    legacy = timeit.timeit(lambda: legacy_loads_attrs(page), number=ITERATIONS)
+    print(f"{'json object_hook':<20} decode: {legacy / ITERATIONS * 1000:8.2f} ms")
+    for name, codec_class in CODECS.items():
+        try:
+            codec = codec_class()
+        except Exception:
+            print(f"{name:<20} not installed, skipping")
+            continue
+        decoded = codec.loads_attrs(page)
+        decode = timeit.timeit(lambda: codec.loads_attrs(page), number=ITERATIONS)
+        decode_plain = timeit.timeit(lambda: codec.loads(page), number=ITERATIONS)
+        encode = timeit.timeit(lambda: codec.dumps(decoded), number=ITERATIONS)
+        print(f"{name:<20} decode: {decode / ITERATIONS * 1000:8.2f} ms ({legacy / decode:4.1f}x),"
+              f" decode to plain dicts: {decode_plain / ITERATIONS * 1000:8.2f} ms,"
+              f" encode: {encode / ITERATIONS * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
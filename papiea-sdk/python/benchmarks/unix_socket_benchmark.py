@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from urllib.parse import quote
+
+from aiohttp import web
+
+# The benchmarks run against the sdk of this checkout, no install needed
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from papiea.api import ApiInstance
+from papiea.connection_pool import SessionRegistry
+
+# Small entity reads, the case where transport overhead dominates
+REQUESTS = 2000
+CONCURRENCY = 10
+
+ENTITY = {
+    "metadata": {"uuid": "6b0b2a4e-3d36-4c1b-9a8e-1f6f8a5b2c3d", "kind": "benchmark_kind", "spec_version": 1},
+    "spec": {"x": 10, "y": 11},
+    "status": {"x": 10, "y": 11},
+}
+
+
+async def get_entity(request: web.Request) -> web.Response:
+    return web.json_response(ENTITY)
+
+
+async def run(base_url: str) -> None:
+    registry = SessionRegistry()
+    api = ApiInstance(base_url, logger=logging.getLogger("benchmark"), session_registry=registry)
+    latencies = []
+
+    async def worker(count):
+        for _ in range(count):
+            start = time.perf_counter()
+            await api.get("entity")
+            latencies.append(time.perf_counter() - start)
+
+    # Warm up the connections first
+    await asyncio.gather(*[api.get("entity") for _ in range(CONCURRENCY)])
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    await asyncio.gather(*[worker(REQUESTS // CONCURRENCY) for _ in range(CONCURRENCY)])
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    await api.close()
+    await registry.close()
+
+    latencies.sort()
+    transport = base_url.split(":")[0]
+    print(f"{transport:<6} mean: {statistics.mean(latencies) * 1000:6.3f} ms,"
+          f" p50: {latencies[len(latencies) // 2] * 1000:6.3f} ms,"
+          f" p99: {latencies[int(len(latencies) * 0.99)] * 1000:6.3f} ms,"
+          f" {REQUESTS / wall:8.0f} req/s, cpu per request: {cpu / REQUESTS * 1e6:6.1f} us")
+
+
+async def main() -> None:
+    app = web.Application()
+    app.router.add_get("/entity", get_entity)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    socket_path = os.path.join(tempfile.mkdtemp(), "papiea.sock")
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    await web.UnixSite(runner, socket_path).start()
+    port = runner.addresses[0][1]
+    print(f"{REQUESTS} requests, concurrency {CONCURRENCY}"
+          f" (cpu includes the stand-in server running in the same process)")
+    try:
+        await run(f"http://127.0.0.1:{port}")
+        await run(f"unix://{quote(socket_path, safe='')}")
+    finally:
+        await runner.cleanup()
+        os.remove(socket_path)
+
+
+if __name__ == "__main__":
+    asyncio.get_event_loop().run_until_complete(main())
@@ -7,6 +7,8 @@ import e2e_tests.provider_setup as provider
 import e2e_tests.utils as test_utils
 
 from papiea.core import AttributeDict, IntentfulStatus, Spec
+from papiea.projection import METADATA_ONLY
+from papiea.watch import WatchEventType
 
 
 # Includes all the entity ops related tests
@@ -100,6 +102,131 @@ class TestEntityOperations:
             await test_utils.cleanup()
             await sdk.server.close()
 
+    @pytest.mark.asyncio
+    async def test_get_many_objects(self):
+        papiea_test.logger.debug("Running test to get the objects of a bucket in one go")
+
+        try:
+            sdk = await provider.setup_and_register_sdk()
+        except Exception as ex:
+            papiea_test.logger.debug("Failed to setup/register sdk : " + str(ex))
+            return
+
+        try:
+            async with papiea_test.get_client(papiea_test.BUCKET_KIND) as bucket_entity_client:
+                bucket1_name = "test-bucket1"
+
+                bucket_ref = await bucket_entity_client.invoke_kind_procedure("ensure_bucket_exists", { "bucket_name": bucket1_name })
+                bucket1_entity = await bucket_entity_client.get(bucket_ref)
+
+                object_names = ["test-object1", "test-object2", "test-object3"]
+                for object_name in object_names:
+                    await bucket_entity_client.invoke_procedure("create_object", bucket1_entity.metadata, { "object_name": object_name })
+
+                bucket1_entity = await bucket_entity_client.get(bucket_ref)
+                object_refs = [obj.reference for obj in bucket1_entity.spec.objects]
+                missing_ref = AttributeDict(uuid="00000000-0000-0000-0000-000000000000", kind=papiea_test.OBJECT_KIND)
+
+                async with papiea_test.get_client(papiea_test.OBJECT_KIND) as object_entity_client:
+                    objects = await object_entity_client.get_many(object_refs + [missing_ref], chunk_size=2)
+
+                assert len(objects) == len(object_refs) + 1
+                for object_ref, object_entity in zip(object_refs, objects):
+                    assert object_entity.metadata.uuid == object_ref.uuid
+                assert objects[-1] is None
+        finally:
+            await test_utils.cleanup()
+            await sdk.server.close()
+
+    @pytest.mark.asyncio
+    async def test_watch_bucket_changes(self):
+        papiea_test.logger.debug("Running test to watch the changes to buckets")
+
+        try:
+            sdk = await provider.setup_and_register_sdk()
+        except Exception as ex:
+            papiea_test.logger.debug("Failed to setup/register sdk : " + str(ex))
+            return
+
+        try:
+            async with papiea_test.get_client(papiea_test.BUCKET_KIND) as bucket_entity_client:
+                bucket1_name = "test-bucket1"
+
+                bucket_ref = await bucket_entity_client.invoke_kind_procedure("ensure_bucket_exists", { "bucket_name": bucket1_name })
+
+                async with bucket_entity_client.watch(interval_secs=0.5) as watch:
+                    event = await watch.__anext__()
+                    assert event.type == WatchEventType.Created
+                    assert event.uuid == bucket_ref.uuid
+                    resume_token = watch.resume_token
+
+                    bucket1_entity = await bucket_entity_client.get(bucket_ref)
+                    await bucket_entity_client.invoke_procedure("create_object", bucket1_entity.metadata, { "object_name": "test-object1" })
+
+                    event = await watch.__anext__()
+                    assert event.type == WatchEventType.Updated
+                    assert event.entity.spec.objects[0].name == "test-object1"
+
+                # Resuming from before the update does not replay the creation
+                async with bucket_entity_client.watch(interval_secs=0.5, resume_token=resume_token) as watch:
+                    event = await watch.__anext__()
+                    assert event.type == WatchEventType.Updated
+                    assert event.uuid == bucket_ref.uuid
+        finally:
+            await test_utils.cleanup()
+            await sdk.server.close()
+
+    @pytest.mark.asyncio
+    async def test_filter_bucket_projection(self):
+        papiea_test.logger.debug("Running test to filter buckets returning only some of their fields")
+
+        try:
+            sdk = await provider.setup_and_register_sdk()
+        except Exception as ex:
+            papiea_test.logger.debug("Failed to setup/register sdk : " + str(ex))
+            return
+
+        try:
+            async with papiea_test.get_client(papiea_test.BUCKET_KIND) as bucket_entity_client:
+                bucket1_name = "test-bucket1"
+
+                bucket_ref = await bucket_entity_client.invoke_kind_procedure("ensure_bucket_exists", { "bucket_name": bucket1_name })
+
+                res = await bucket_entity_client.filter({ "spec": { "name": bucket1_name } }, projection=METADATA_ONLY)
+                assert res.entity_count == 1
+                assert res.results[0].metadata.uuid == bucket_ref.uuid
+                assert "spec" not in res.results[0]
+
+                bucket1_entity = await bucket_entity_client.get(bucket_ref, projection=["spec.name"])
+                assert bucket1_entity == { "spec": { "name": bucket1_name } }
+        finally:
+            await test_utils.cleanup()
+            await sdk.server.close()
+
+    @pytest.mark.asyncio
+    async def test_count_and_exists_buckets(self):
+        papiea_test.logger.debug("Running test to count buckets and check their existence")
+
+        try:
+            sdk = await provider.setup_and_register_sdk()
+        except Exception as ex:
+            papiea_test.logger.debug("Failed to setup/register sdk : " + str(ex))
+            return
+
+        try:
+            async with papiea_test.get_client(papiea_test.BUCKET_KIND) as bucket_entity_client:
+                bucket_ref = await bucket_entity_client.invoke_kind_procedure("ensure_bucket_exists", { "bucket_name": "test-bucket1" })
+                await bucket_entity_client.invoke_kind_procedure("ensure_bucket_exists", { "bucket_name": "test-bucket2" })
+
+                assert await bucket_entity_client.count({}) == 2
+                assert await bucket_entity_client.count({ "spec": { "name": "test-bucket1" } }) == 1
+                assert await bucket_entity_client.exists(bucket_ref)
+                missing_ref = AttributeDict(uuid="00000000-0000-0000-0000-000000000000", kind=papiea_test.BUCKET_KIND)
+                assert not await bucket_entity_client.exists(missing_ref)
+        finally:
+            await test_utils.cleanup()
+            await sdk.server.close()
+
     @pytest.mark.asyncio
     async def test_duplicate_object_create(self):
         papiea_test.logger.debug("Running test to create a duplicate object in same bucket")
@@ -1,39 +1,93 @@
-import json
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 from types import TracebackType
-from typing import Any, Optional, Type
+from typing import Any, AsyncGenerator, AsyncIterator, Iterable, Optional, Type, Union
 
-from aiohttp import ClientSession, ClientTimeout
+from aiohttp import ClientResponse, ClientSession
 from multidict import CIMultiDict
 
-from papiea.python_sdk_exceptions import (
-    ApiException,
-    ConflictingEntityException,
-    EntityNotFoundException,
-    PermissionDeniedException,
-    ProcedureInvocationException,
-    UnauthorizedException,
-    ValidationException,
-    BadRequestException,
-    PapieaServerException,
-    check_response
+from papiea.circuit_breaker import CircuitBreakerRegistry
+from papiea.coalescing import RequestCoalescer
+from papiea.compression import CompressionConfig, default_compression
+from papiea.json_codec import JsonCodec, default_codec
+from papiea.connection_pool import (
+    ConnectionPoolConfig,
+    PooledSession,
+    SessionRegistry,
+    default_session_registry,
+    split_unix_url
 )
+from papiea.hooks import RequestHooks, RequestInfo
+from papiea.metrics import ClientMetrics, default_client_metrics
+from papiea.python_sdk_exceptions import check_response
+from papiea.rate_limit import ConcurrencyLimiter, TokenBucket, concurrency_limiter, rate_limiter
+from papiea.retry import RetryPolicy, default_retry_policy
+from papiea.timeouts import RequestTimeout, Timeout, remaining_time
 from papiea.utils import json_loads_attrs
 
 class ApiInstance:
     def __init__(
             self,
             base_url: str,
-            timeout: int = 5000,
+            timeout: RequestTimeout = None,
             headers: dict = {},
             *,
-            logger: logging.Logger
+            logger: logging.Logger,
+            session_registry: Optional[SessionRegistry] = None,
+            pool_config: Optional[ConnectionPoolConfig] = None,
+            codec: Optional[JsonCodec] = None,
+            retry_policy: Optional[RetryPolicy] = None,
+            coalescer: Optional[RequestCoalescer] = None,
+            compression: Optional[CompressionConfig] = None,
+            circuit_breakers: Optional[CircuitBreakerRegistry] = None,
+            concurrency_limit: Union[int, ConcurrencyLimiter, None] = None,
+            rate_limit: Union[float, TokenBucket, None] = None,
+            request_hooks: Optional[Iterable[RequestHooks]] = None
     ):
-        self.base_url = base_url
+        # Unix socket urls are kept for the session registry,
+        # requests themselves are plain http sent over the socket
+        self.connection_url = base_url
+        _, self.base_url = split_unix_url(base_url)
         self.headers = headers
-        self.timeout = timeout
-        self.session = ClientSession(timeout=ClientTimeout(total=timeout))
+        # Plain numbers are seconds, here and in the per call overrides
+        self.timeout = Timeout.from_value(timeout) or Timeout()
         self.logger = logger
+        self.session_registry = session_registry or default_session_registry
+        self.pool_config = pool_config
+        self.codec = codec or default_codec
+        self.retry_policy = retry_policy or default_retry_policy
+        # Collapsing of identical concurrent GETs, disabled unless a coalescer is given
+        self.coalescer = coalescer
+        self.compression = compression or default_compression
+        # Failing fast per route family while papiea is degraded, disabled unless given
+        self.circuit_breakers = circuit_breakers
+        # Numbers give this instance limiters of its own, limiter objects can be shared
+        self.concurrency_limiter = concurrency_limiter(concurrency_limit)
+        self.rate_limiter = rate_limiter(rate_limit)
+        # Metrics are collected unless other hooks (or none at all) are given
+        self.request_hooks = list(request_hooks) if request_hooks is not None else [default_client_metrics]
+        if circuit_breakers is not None:
+            for hooks in self.request_hooks:
+                if isinstance(hooks, ClientMetrics):
+                    hooks.watch_circuit_breakers(circuit_breakers)
+        self._pooled_session: Optional[PooledSession] = None
+
+    @property
+    def pooled_session(self) -> PooledSession:
+        # Sessions are shared between all the instances talking to the same
+        # papiea and are only acquired once a request is made
+        if self._pooled_session is not None and self._pooled_session.key[0] is not asyncio.get_event_loop():
+            # Sessions can only be used on the loop they were opened on, e.g. a
+            # forked provider worker gets new ones instead of its parent's
+            self._pooled_session = None
+        if self._pooled_session is None:
+            self._pooled_session = self.session_registry.acquire(self.connection_url, self.pool_config)
+        return self._pooled_session
+
+    @property
+    def session(self) -> ClientSession:
+        return self.pooled_session.session
 
     async def __aenter__(self) -> "ApiInstance":
         return self
@@ -46,87 +100,153 @@ class ApiInstance:
     ) -> None:
         await self.close()
 
-    @staticmethod
-    def check_result(res: Any) -> Any:
-        if res == "":
+    def check_result(self, res: bytes) -> Any:
+        if res == b"":
             return None
-        return json_loads_attrs(res)
+        return json_loads_attrs(res, self.codec)
 
-    async def call(self, method: str, prefix: str, data: Any, headers: dict = {}):
+    @asynccontextmanager
+    async def _open(self, method: str, prefix: str, data: Any, headers: dict,
+                    timeout: RequestTimeout) -> AsyncIterator[ClientResponse]:
         new_headers = CIMultiDict()
         new_headers.update(self.headers)
         new_headers.update(headers)
-        data_binary = json.dumps(data).encode("utf-8")
-        # TODO: this is too much code duplication but I cannot think of
-        # a way outside macros that could abstract async with block
-        # and sadly there are no macro in python
-        if method == "get":
-            async with self.session.get(
-                    self.base_url + "/" + prefix, headers=new_headers
-            ) as resp:
-                await check_response(resp, self.logger)
-                res = await resp.text()
-            return self.check_result(res)
-        elif method == "post":
-            async with self.session.post(
-                    self.base_url + "/" + prefix, data=data_binary, headers=new_headers
-            ) as resp:
-                await check_response(resp, self.logger)
-                res = await resp.text()
-            return self.check_result(res)
-        elif method == "put":
-            async with self.session.put(
-                    self.base_url + "/" + prefix, data=data_binary, headers=new_headers
-            ) as resp:
-                await check_response(resp, self.logger)
-                res = await resp.text()
-            return self.check_result(res)
-        elif method == "patch":
-            async with self.session.patch(
-                    self.base_url + "/" + prefix, data=data_binary, headers=new_headers
-            ) as resp:
-                await check_response(resp, self.logger)
-                res = await resp.text()
-            return self.check_result(res)
-        elif method == "delete":
-            async with self.session.delete(
-                    self.base_url + "/" + prefix, headers=new_headers
-            ) as resp:
-                await check_response(resp, self.logger)
-                res = await resp.text()
-            return self.check_result(res)
-
-    async def make_request(self, method: str, prefix: str, data: Any, headers: dict):
+        new_headers.setdefault("Accept-Encoding", self.compression.accept_encoding())
+        if method in ("post", "put", "patch"):
+            data_binary, content_encoding = self.compression.compress_request(self.codec.dumps(data))
+            if content_encoding is not None:
+                new_headers["Content-Encoding"] = content_encoding
+        else:
+            data_binary = None
+        url = self.base_url + "/" + prefix
+        breaker = None
+        if self.circuit_breakers is not None:
+            breaker = self.circuit_breakers.breaker_for(url)
+            breaker.before_request()
+        error = None
         try:
-            return await self.call(method, prefix, data, headers)
-        except (ConflictingEntityException, EntityNotFoundException,
-                PermissionDeniedException, ProcedureInvocationException,
-                UnauthorizedException, ValidationException, BadRequestException,
-                PapieaServerException, ApiException):
+            async with self._limited():
+                # Time spent waiting for the limiters counts against the deadline
+                client_timeout = (Timeout.from_value(timeout) or self.timeout).to_client_timeout()
+                pooled_session = self.pooled_session
+                if pooled_session.session.closed:
+                    # Only replace the session if the session itself is unusable,
+                    # a failing request says nothing about the other requests sharing it
+                    self.logger.debug("RENEWING SESSION")
+                    await self.renew_session(pooled_session.session)
+                session = pooled_session.checkout()
+                info = None
+                if self.request_hooks:
+                    info = RequestInfo(method, url)
+                    for hooks in self.request_hooks:
+                        hooks.on_request(info)
+                try:
+                    async with session.request(
+                            method, url, data=data_binary, headers=new_headers, timeout=client_timeout
+                    ) as resp:
+                        if info is not None:
+                            info.status = resp.status
+                        await check_response(resp, self.logger, self.codec)
+                        yield resp
+                except BaseException as e:
+                    if info is not None:
+                        # A stream closed early by its consumer is not a failed request
+                        error = None if isinstance(e, GeneratorExit) else e
+                        for hooks in self.request_hooks:
+                            hooks.on_response(info, error)
+                        info = None
+                    raise
+                finally:
+                    if info is not None:
+                        for hooks in self.request_hooks:
+                            hooks.on_response(info, None)
+                    await pooled_session.checkin(session)
+        except BaseException as e:
+            error = e
             raise
-        except:
-            self.logger.debug("RENEWING SESSION")
-            await self.renew_session()
-            return await self.call(method, prefix, data, headers)
+        finally:
+            if breaker is not None:
+                breaker.record(error)
+
+    @asynccontextmanager
+    async def _limited(self) -> AsyncIterator[None]:
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire()
+        if self.concurrency_limiter is None:
+            yield
+            return
+        async with self.concurrency_limiter:
+            yield
+
+    async def call(self, method: str, prefix: str, data: Any, headers: dict = {},
+                   timeout: RequestTimeout = None):
+        async with self._open(method, prefix, data, headers, timeout) as resp:
+            res = await resp.read()
+        return self.check_result(res)
 
-    async def post(self, prefix: str, data: Any, headers: dict = {}) -> Any:
-        return await self.make_request("post", prefix, data, headers)
+    async def stream(self, method: str, prefix: str, data: Any = None, headers: dict = {},
+                     timeout: RequestTimeout = None) -> AsyncGenerator[bytes, None]:
+        """Yields the response body chunk by chunk as it arrives. Streams are
+        not retried, the caller might already have consumed part of the body."""
+        async with self._open(method, prefix, data, headers, timeout) as resp:
+            async for chunk in resp.content.iter_any():
+                yield chunk
 
-    async def put(self, prefix: str, data: Any, headers: dict = {}) -> Any:
-        return await self.make_request("put", prefix, data, headers)
+    async def make_request(self, method: str, prefix: str, data: Any, headers: dict,
+                           timeout: RequestTimeout = None):
+        self.retry_policy.budget.record_request()
+        attempt = 0
+        while True:
+            try:
+                return await self.call(method, prefix, data, headers, timeout)
+            except Exception as e:
+                if not self.retry_policy.should_retry(method, e, attempt):
+                    raise
+                delay = self.retry_policy.backoff(attempt)
+                remaining = remaining_time()
+                if remaining is not None and remaining <= delay:
+                    raise
+                self.logger.debug(f"Retrying {method} request to {self.base_url}/{prefix} in {delay:.2f}s"
+                                  f" after error: {e!r}")
+                await asyncio.sleep(delay)
+            attempt += 1
 
-    async def patch(self, prefix: str, data: Any, headers: dict = {}) -> Any:
-        return await self.make_request("patch", prefix, data, headers)
+    async def post(self, prefix: str, data: Any, headers: dict = {},
+                   timeout: RequestTimeout = None) -> Any:
+        return await self.make_request("post", prefix, data, headers, timeout)
 
-    async def get(self, prefix: str, headers: dict = {}) -> Any:
-        return await self.make_request("get", prefix, {}, headers)
+    async def put(self, prefix: str, data: Any, headers: dict = {},
+                  timeout: RequestTimeout = None) -> Any:
+        return await self.make_request("put", prefix, data, headers, timeout)
 
-    async def delete(self, prefix: str, headers: dict = {}) -> Any:
-        return await self.make_request("delete", prefix, {}, headers)
+    async def patch(self, prefix: str, data: Any, headers: dict = {},
+                    timeout: RequestTimeout = None) -> Any:
+        return await self.make_request("patch", prefix, data, headers, timeout)
+
+    async def get(self, prefix: str, headers: dict = {},
+                  timeout: RequestTimeout = None) -> Any:
+        if self.coalescer is None:
+            return await self.make_request("get", prefix, {}, headers, timeout)
+        auth = CIMultiDict(self.headers)
+        auth.update(headers)
+        # Only callers asking for the same timeout share a request, deadlines
+        # are left out as each caller waits for the shared request up to its own
+        request_timeout = Timeout.from_value(timeout) or self.timeout
+        key = (self.connection_url + "/" + prefix, auth.get("Authorization"),
+               (request_timeout.total, request_timeout.connect, request_timeout.read))
+        return await self.coalescer.run(key, lambda: self.make_request("get", prefix, {}, headers, timeout))
+
+    async def delete(self, prefix: str, headers: dict = {},
+                     timeout: RequestTimeout = None) -> Any:
+        return await self.make_request("delete", prefix, {}, headers, timeout)
 
     async def close(self):
-        await self.session.close()
+        if self._pooled_session is not None:
+            pooled_session, self._pooled_session = self._pooled_session, None
+            await self.session_registry.release(pooled_session)
 
-    async def renew_session(self):
-        await self.close()
-        self.session = ClientSession(timeout=ClientTimeout(total=self.timeout))
+    async def renew_session(self, session: Optional[ClientSession] = None):
+        if self._pooled_session is not None:
+            for hooks in self.request_hooks:
+                hooks.on_session_renewed(self.session_registry.origin(self.connection_url))
+            await self.session_registry.renew(self._pooled_session, session or self._pooled_session.session)
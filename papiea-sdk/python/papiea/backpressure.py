@@ -0,0 +1,100 @@
+import asyncio
+import math
+import time
+from typing import Awaitable, Callable, Optional
+
+from aiohttp import web
+
+from .metrics import DEFAULT_BUCKETS, MetricsRegistry, default_registry
+from .python_sdk_exceptions import InvocationError
+from .rate_limit import ConcurrencyLimiter
+
+Handler = Callable[[web.Request], Awaitable[web.StreamResponse]]
+
+QUEUE_FULL = "queue_full"
+WAIT_TIMEOUT = "wait_timeout"
+
+
+class HandlerLimit(object):
+    """Caps the concurrent calls of a provider handler. Up to `max_queue`
+    calls wait for a free slot, each for at most `max_wait_secs`. Calls
+    finding the queue full are answered with 429 right away, calls that
+    waited too long with 503, both telling papiea when to retry."""
+
+    def __init__(self, max_concurrency: int, max_queue: int = 100, max_wait_secs: float = 30,
+                 retry_after_secs: float = 1):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency should be at least 1")
+        if max_queue < 0:
+            raise ValueError("max_queue should not be negative")
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait_secs = max_wait_secs
+        self.retry_after_secs = retry_after_secs
+
+
+class HandlerMetrics(object):
+    def __init__(self, registry: Optional[MetricsRegistry] = None):
+        self.registry = registry or default_registry
+        self.in_flight = self.registry.gauge(
+            "papiea_provider_handler_in_flight", "Handler calls being processed", ("route",)
+        )
+        self.queue_depth = self.registry.gauge(
+            "papiea_provider_handler_queue_depth", "Handler calls waiting for a free slot", ("route",)
+        )
+        self.wait = self.registry.histogram(
+            "papiea_provider_handler_wait_seconds", "Time handler calls waited for a free slot", ("route",),
+            DEFAULT_BUCKETS
+        )
+        self.rejected = self.registry.counter(
+            "papiea_provider_handler_rejected_total", "Handler calls turned away by the concurrency limit",
+            ("route", "reason")
+        )
+
+
+default_handler_metrics = HandlerMetrics(default_registry)
+
+
+def _reject(status: int, message: str, retry_after_secs: float) -> web.Response:
+    error = InvocationError(status, message, {"message": message})
+    return web.json_response(error.to_response(), status=status,
+                             headers={"Retry-After": str(max(1, math.ceil(retry_after_secs)))})
+
+
+def limit_handler(route: str, handler: Handler, limit: HandlerLimit,
+                  metrics: Optional[HandlerMetrics] = None) -> Handler:
+    limiter = ConcurrencyLimiter(limit.max_concurrency)
+    metrics = metrics or default_handler_metrics
+    labels = (route,)
+    # Counted here rather than taken from the limiter, wait_for only
+    # starts waiting on the limiter once the event loop gets to it
+    queued = 0
+
+    async def limited_handler(request: web.Request) -> web.StreamResponse:
+        nonlocal queued
+        if limiter.in_flight < limit.max_concurrency and not queued:
+            await limiter.acquire()
+        else:
+            if queued >= limit.max_queue:
+                metrics.rejected.inc(labels + (QUEUE_FULL,))
+                return _reject(429, f"Too many calls waiting for handler {route}", limit.retry_after_secs)
+            started = time.monotonic()
+            queued += 1
+            metrics.queue_depth.inc(labels)
+            try:
+                await asyncio.wait_for(limiter.acquire(), limit.max_wait_secs)
+            except asyncio.TimeoutError:
+                metrics.rejected.inc(labels + (WAIT_TIMEOUT,))
+                return _reject(503, f"Timed out waiting for handler {route}", limit.retry_after_secs)
+            finally:
+                queued -= 1
+                metrics.queue_depth.dec(labels)
+                metrics.wait.observe(labels, time.monotonic() - started)
+        metrics.in_flight.inc(labels)
+        try:
+            return await handler(request)
+        finally:
+            metrics.in_flight.dec(labels)
+            limiter.release()
+
+    return limited_handler
@@ -0,0 +1,124 @@
+import asyncio
+from typing import Any, AsyncGenerator, AsyncIterable, Awaitable, Callable, Dict, Iterable, List, Optional, Union
+
+from .python_sdk_exceptions import typed_exception
+from .rate_limit import TokenBucket, rate_limiter
+
+DEFAULT_CONCURRENCY = 8
+
+BulkItems = Union[Iterable[Any], AsyncIterable[Any]]
+
+
+class BulkItemResult(object):
+    __slots__ = ("index", "item", "result", "error")
+
+    def __init__(self, index: int, item: Any, result: Any = None, error: Optional[BaseException] = None):
+        # Position of the item in the input
+        self.index = index
+        self.item = item
+        self.result = result
+        # Papiea errors are converted to the typed exceptions of python_sdk_exceptions
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class BulkReport(object):
+    """Outcome of a bulk operation. Only failures are kept unless
+    `keep_results` is set, so large inputs do not pile up in memory."""
+
+    def __init__(self, keep_results: bool = False):
+        self.keep_results = keep_results
+        self.succeeded = 0
+        self.failed = 0
+        self.failures: List[BulkItemResult] = []
+        self.results: List[BulkItemResult] = []
+        self.errors_by_type: Dict[str, int] = {}
+
+    @property
+    def total(self) -> int:
+        return self.succeeded + self.failed
+
+    def add(self, item_result: BulkItemResult) -> None:
+        if item_result.ok:
+            self.succeeded += 1
+            if self.keep_results:
+                self.results.append(item_result)
+        else:
+            self.failed += 1
+            self.failures.append(item_result)
+            error_type = type(item_result.error).__name__
+            self.errors_by_type[error_type] = self.errors_by_type.get(error_type, 0) + 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "errors_by_type": dict(self.errors_by_type)
+        }
+
+
+async def _iterate(items: BulkItems) -> AsyncGenerator[Any, None]:
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def run_bulk(
+        items: BulkItems,
+        operation: Callable[[Any], Awaitable[Any]],
+        concurrency: int = DEFAULT_CONCURRENCY,
+        rate_limit: Union[float, TokenBucket, None] = None
+) -> AsyncGenerator[BulkItemResult, None]:
+    """Runs the operation for every item with up to `concurrency` of them in flight
+    and yields the results as they complete. A failing item does not stop the
+    others. Items are only pulled from the input when there is room for them."""
+    limiter = rate_limiter(rate_limit)
+
+    async def run_one(index: int, item: Any) -> BulkItemResult:
+        if limiter is not None:
+            await limiter.acquire()
+        try:
+            return BulkItemResult(index, item, result=await operation(item))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return BulkItemResult(index, item, error=typed_exception(e))
+
+    inputs = _iterate(items)
+    pending = set()
+    index = 0
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(pending) < concurrency:
+                try:
+                    item = await inputs.__anext__()
+                except StopAsyncIteration:
+                    exhausted = True
+                    break
+                pending.add(asyncio.ensure_future(run_one(index, item)))
+                index += 1
+            if not pending:
+                return
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in sorted(done, key=lambda task: task.result().index):
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        await inputs.aclose()
+
+
+async def collect_report(results: AsyncIterable[BulkItemResult], keep_results: bool = False) -> BulkReport:
+    report = BulkReport(keep_results)
+    async for item_result in results:
+        report.add(item_result)
+    return report
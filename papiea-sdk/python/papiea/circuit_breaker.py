@@ -0,0 +1,176 @@
+import asyncio
+import time
+from enum import Enum
+from typing import Any, Dict, Iterable, Optional
+
+from aiohttp import ClientConnectionError, ClientPayloadError
+
+from .python_sdk_exceptions import ApiException, CircuitOpenException, DeadlineExceededException
+
+ENTITY_CRUD = "entity_crud"
+FILTER = "filter"
+PROCEDURE = "procedure"
+UPDATE_STATUS = "update_status"
+INTENT_WATCHER = "intent_watcher"
+
+FAILURE_STATUSES = tuple(range(500, 600))
+
+
+def route_family(url: str) -> str:
+    """Groups papiea urls into families failing together, e.g. a degraded
+    mongo slows down filters long before single entity reads"""
+    path = url.split("?", 1)[0]
+    if "/services/intent_watcher" in path:
+        return INTENT_WATCHER
+    if path.endswith("/update_status"):
+        return UPDATE_STATUS
+    if "/procedure/" in path:
+        return PROCEDURE
+    if path.endswith("/filter"):
+        return FILTER
+    return ENTITY_CRUD
+
+
+class CircuitState(str, Enum):
+    Closed = "closed"
+    Open = "open"
+    HalfOpen = "half_open"
+
+
+class CircuitBreaker(object):
+    """Fails requests fast once `failure_threshold` consecutive requests failed.
+    After `recovery_timeout_secs` up to `half_open_max_calls` probe requests are
+    let through, the circuit closes again after `success_threshold` of them succeed
+    and reopens on the first failure."""
+
+    def __init__(
+            self,
+            name: str,
+            failure_threshold: int = 5,
+            recovery_timeout_secs: float = 10,
+            half_open_max_calls: int = 1,
+            success_threshold: int = 1,
+            failure_statuses: Iterable[int] = FAILURE_STATUSES
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout_secs = recovery_timeout_secs
+        self.half_open_max_calls = half_open_max_calls
+        self.success_threshold = success_threshold
+        self.failure_statuses = set(failure_statuses)
+        self._state = CircuitState.Closed
+        self._consecutive_failures = 0
+        self._half_open_calls = 0
+        self._half_open_successes = 0
+        self._opened_at = 0.0
+        # Counters since creation
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> CircuitState:
+        if self._state == CircuitState.Open and self._retry_in() <= 0:
+            self._transition(CircuitState.HalfOpen)
+        return self._state
+
+    def _retry_in(self) -> float:
+        return self._opened_at + self.recovery_timeout_secs - time.monotonic()
+
+    def _transition(self, state: CircuitState) -> None:
+        self._state = state
+        self._half_open_calls = 0
+        self._half_open_successes = 0
+        if state == CircuitState.Open:
+            self._opened_at = time.monotonic()
+            self.times_opened += 1
+        elif state == CircuitState.Closed:
+            self._consecutive_failures = 0
+
+    def is_failure(self, e: BaseException) -> bool:
+        if isinstance(e, ApiException):
+            return e.status in self.failure_statuses
+        return isinstance(e, (ClientConnectionError, ClientPayloadError, asyncio.TimeoutError))
+
+    def before_request(self) -> None:
+        state = self.state
+        if state == CircuitState.Closed:
+            return
+        if state == CircuitState.HalfOpen and self._half_open_calls < self.half_open_max_calls:
+            self._half_open_calls += 1
+            return
+        self.rejected += 1
+        raise CircuitOpenException(self.name, max(self._retry_in(), 0))
+
+    def on_success(self) -> None:
+        if self._state == CircuitState.HalfOpen:
+            self._half_open_successes += 1
+            if self._half_open_successes >= self.success_threshold:
+                self._transition(CircuitState.Closed)
+            else:
+                # The probe is done, let the next one through
+                self.on_abandoned()
+        else:
+            self._consecutive_failures = 0
+
+    def on_failure(self) -> None:
+        if self._state == CircuitState.HalfOpen:
+            self._transition(CircuitState.Open)
+            return
+        self._consecutive_failures += 1
+        if self._state == CircuitState.Closed and self._consecutive_failures >= self.failure_threshold:
+            self._transition(CircuitState.Open)
+
+    def on_abandoned(self) -> None:
+        # Request was cancelled before we learned anything, free up its probe slot
+        if self._state == CircuitState.HalfOpen and self._half_open_calls > 0:
+            self._half_open_calls -= 1
+
+    def record(self, e: Optional[BaseException]) -> None:
+        if e is None:
+            self.on_success()
+        elif isinstance(e, DeadlineExceededException):
+            # Never reached papiea
+            self.on_abandoned()
+        elif self.is_failure(e):
+            self.on_failure()
+        elif isinstance(e, (Exception, GeneratorExit)):
+            # 4xx and alike or a stream closed early, papiea itself is answering fine
+            self.on_success()
+        else:
+            self.on_abandoned()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "state": self.state.value,
+            "consecutive_failures": self._consecutive_failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected
+        }
+
+
+class CircuitBreakerRegistry(object):
+    """One circuit breaker per route family, all created with the same settings.
+    Can be shared between several clients talking to the same papiea."""
+
+    def __init__(self, **breaker_options):
+        self.breaker_options = breaker_options
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, family: str) -> CircuitBreaker:
+        breaker = self._breakers.get(family)
+        if breaker is None:
+            breaker = CircuitBreaker(family, **self.breaker_options)
+            self._breakers[family] = breaker
+        return breaker
+
+    def breaker_for(self, url: str) -> CircuitBreaker:
+        return self.get(route_family(url))
+
+    def breakers(self) -> Dict[str, CircuitBreaker]:
+        return dict(self._breakers)
+
+    def states(self) -> Dict[str, CircuitState]:
+        return {family: breaker.state for family, breaker in self._breakers.items()}
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        return {family: breaker.to_dict() for family, breaker in self._breakers.items()}
@@ -1,19 +1,112 @@
+import asyncio
+import hashlib
 import time
 import logging
 from types import TracebackType
-from typing import Any, Optional, List, Type, Callable, AsyncGenerator
+from typing import Any, Optional, Iterator, List, Tuple, Type, Callable, AsyncGenerator, Union
 
 from opentracing import Tracer
 
 from .api import ApiInstance
+from .bulk import DEFAULT_CONCURRENCY, BulkItemResult, BulkItems, BulkReport, collect_report, run_bulk
 from .core import AttributeDict, Entity, EntityReference, EntitySpec, IntentfulStatus, IntentWatcher, Metadata, Secret, \
     Spec
+from .entity_cache import EntityCache
+from .json_stream import iter_json_array
+from .pagination import (
+    DEFAULT_PREFETCH,
+    KEYSET_MODE,
+    OFFSET_MODE,
+    Page,
+    get_path,
+    keyset_pages,
+    merge_iterators,
+    prefetch_pages,
+    uuid_ranges,
+    with_bounds,
+    with_lower_bound
+)
+from .projection import Projection, projection_fields, with_projection
+from .rate_limit import ConcurrencyLimiter, TokenBucket
+from .timeouts import RequestTimeout
 from .tracing_utils import init_default_tracer, inject_tracing_headers
+from .watch import DEFAULT_WATCH_INTERVAL_SECS, EntityWatch, WatchStateStore
+from .watcher_poller import WatcherPoller
 
 FilterResults = AttributeDict
 
 BATCH_SIZE = 20
 
+DEFAULT_SHARDS = 16
+
+GET_MANY_CHUNK_SIZE = 100
+
+# Past the end of any result, filters then only return the entity count
+COUNT_OFFSET = 2 ** 53 - 1
+
+# Watches rescan everything every interval, bigger pages keep the number of requests down
+WATCH_BATCH_SIZE = 1000
+
+# Streams ask for every entity at once, papiea returns 30 when no limit is given
+STREAM_LIMIT = 2 ** 53 - 1
+
+# Watchers are polled quickly at first, then less and less often
+WATCHER_POLL_DELAY_MILLIS = 100
+WATCHER_MAX_POLL_DELAY_MILLIS = 2000
+
+
+def poll_delays(initial_secs: float, max_secs: float, factor: float = 1.5) -> Iterator[float]:
+    delay = initial_secs
+    while True:
+        yield delay
+        delay = min(delay * factor, max_secs)
+
+
+def paginated_iter_func(api_instance: ApiInstance, filter_obj: Any, timeout: RequestTimeout, prefetch: int,
+                        mode: str, keyset_key: str, projection: Projection = None, sort: Optional[str] = None,
+                        limit: Optional[int] = None) -> Callable[[Optional[int], Optional[Any]], AsyncGenerator[Any, None]]:
+    def page_size(batch_size: Optional[int]) -> int:
+        batch_size = batch_size or BATCH_SIZE
+        # No point in fetching more than the caller is going to take
+        return min(batch_size, limit) if limit else batch_size
+
+    if mode == OFFSET_MODE:
+        fields = projection_fields(projection)
+        sort_query = f"&sort={sort}" if sort is not None else ""
+
+        async def fetch_page(batch_size: int, offset: int) -> Page:
+            res = await api_instance.post(
+                with_projection(f"filter?limit={batch_size}&offset={offset or ''}{sort_query}", fields),
+                filter_obj, timeout=timeout
+            )
+            return res.results, res.get("entity_count")
+
+        def iter_func(batch_size: Optional[int] = None, offset: Optional[int] = None):
+            batch_size = page_size(batch_size)
+            return prefetch_pages(lambda page_offset: fetch_page(batch_size, page_offset),
+                                  batch_size, offset or 0, prefetch, limit)
+
+        return iter_func
+    if mode == KEYSET_MODE:
+        if sort is not None:
+            raise ValueError(f"Keyset pagination is always sorted by its key ({keyset_key}), sort is not supported")
+        # The next page starts after the key of the last entity, which has to be returned
+        fields = projection_fields(projection, keyset_key)
+
+        async def fetch_keyset_page(batch_size: int, after: Optional[Any]) -> List[Any]:
+            page_filter = filter_obj if after is None else with_lower_bound(filter_obj, keyset_key, after)
+            res = await api_instance.post(with_projection(f"filter?limit={batch_size}&sort={keyset_key}:asc", fields),
+                                          page_filter, timeout=timeout)
+            return res.results
+
+        def keyset_iter_func(batch_size: Optional[int] = None, after: Optional[Any] = None):
+            batch_size = page_size(batch_size)
+            return keyset_pages(lambda page_after: fetch_keyset_page(batch_size, page_after), batch_size,
+                                lambda item: get_path(item, keyset_key), after, prefetch > 0, limit)
+
+        return keyset_iter_func
+    raise ValueError(f"Unknown pagination mode: {mode}, expected {OFFSET_MODE} or {KEYSET_MODE}")
+
 
 class EntityCRUD(object):
     def __init__(
@@ -24,7 +117,9 @@ class EntityCRUD(object):
             kind: str,
             s2skey: Optional[str] = None,
             logger: logging.Logger = logging.getLogger(__name__),
-            tracer: Tracer = init_default_tracer()
+            tracer: Tracer = init_default_tracer(),
+            cache: Optional[EntityCache] = None,
+            **api_options
     ):
         headers = {
             "Content-Type": "application/json",
@@ -32,9 +127,15 @@ class EntityCRUD(object):
         if s2skey is not None:
             headers["Authorization"] = f"Bearer {s2skey}"
         self.api_instance = ApiInstance(
-            f"{papiea_url}/services/{prefix}/{version}/{kind}", headers=headers, logger=logger
+            f"{papiea_url}/services/{prefix}/{version}/{kind}", headers=headers, logger=logger, **api_options
         )
+        self.prefix = prefix
+        self.version = version
         self.kind = kind
+        # Caching of get and get_many, disabled unless a cache is given
+        self.cache = cache
+        # Cache scope, papiea decides what each user can read so users don't share entries
+        self._credentials = hashlib.sha256(s2skey.encode()).hexdigest() if s2skey is not None else None
         self.tracer = tracer
         self.__constructor_present = None
 
@@ -50,73 +151,269 @@ class EntityCRUD(object):
         await self.api_instance.close()
         self.tracer.close()
 
-    async def get(self, entity_reference: EntityReference) -> Entity:
+    # A per call `timeout` replaces the api instance's one for that call, plain
+    # numbers are seconds as in the ApiInstance constructor
+    async def get(self, entity_reference: EntityReference, timeout: RequestTimeout = None,
+                  projection: Projection = None) -> Entity:
         with self.tracer.start_span(operation_name=f"get_entity_client") as span:
             inject_tracing_headers(self.tracer, span, self.api_instance)
-            return await self.api_instance.get(entity_reference.uuid)
-
-    async def get_all(self) -> List[Entity]:
+            if projection is not None:
+                # Partial entities are never cached
+                return await self.api_instance.get(
+                    with_projection(entity_reference.uuid, projection_fields(projection)), timeout=timeout
+                )
+            if self.cache is None:
+                return await self.api_instance.get(entity_reference.uuid, timeout=timeout)
+            key = self._cache_key(entity_reference.uuid)
+            entity, fresh = self.cache.lookup(key, self._credentials)
+            if entity is not None:
+                if fresh:
+                    return entity
+                if await self._is_current(entity, timeout):
+                    self.cache.revalidated(key, self._credentials)
+                    return entity
+                self.cache.mark_stale(key, self._credentials)
+            generation = self.cache.generation()
+            entity = await self.api_instance.get(entity_reference.uuid, timeout=timeout)
+            self.cache.put(key, entity, generation, self._credentials)
+            return entity
+
+    def _cache_key(self, uuid: str) -> Tuple[str, str, str, str]:
+        return self.prefix, self.version, self.kind, uuid
+
+    async def _is_current(self, entity: Entity, timeout: RequestTimeout) -> bool:
+        # Only counts the entities matching the cached versions, no entity is sent back
+        metadata = {"uuid": entity.metadata.uuid, "spec_version": entity.metadata.spec_version}
+        if entity.metadata.get("status_hash") is not None:
+            metadata["status_hash"] = entity.metadata.status_hash
+        return await self.count({"metadata": metadata}, timeout) == 1
+
+    async def get_all(self, timeout: RequestTimeout = None, projection: Projection = None) -> List[Entity]:
         with self.tracer.start_span(operation_name=f"list_entities_client") as span:
             inject_tracing_headers(self.tracer, span, self.api_instance)
-            res = await self.api_instance.get("")
+            res = await self.api_instance.get(with_projection("", projection_fields(projection)), timeout=timeout)
             return res.results
 
-    async def create(self, payload: Any) -> EntitySpec:
+    async def create(self, payload: Any, timeout: RequestTimeout = None) -> EntitySpec:
         with self.tracer.start_span(operation_name=f"create_entity_client") as span:
             inject_tracing_headers(self.tracer, span, self.api_instance)
-            return await self.api_instance.post("", payload)
+            return await self.api_instance.post("", payload, timeout=timeout)
 
-    async def update(self, metadata: Metadata, spec: Spec) -> EntitySpec:
+    async def update(self, metadata: Metadata, spec: Spec, timeout: RequestTimeout = None) -> EntitySpec:
         with self.tracer.start_span(operation_name=f"update_entity_client") as span:
             inject_tracing_headers(self.tracer, span, self.api_instance)
             payload = {"metadata": metadata, "spec": spec}
-            return await self.api_instance.put(metadata.uuid, payload)
+            try:
+                return await self.api_instance.put(metadata.uuid, payload, timeout=timeout)
+            finally:
+                if self.cache is not None:
+                    self.cache.invalidate(self._cache_key(metadata.uuid))
 
-    async def delete(self, entity_reference: EntityReference) -> None:
+    async def delete(self, entity_reference: EntityReference, timeout: RequestTimeout = None) -> None:
         with self.tracer.start_span(operation_name=f"delete_entity_client") as span:
             inject_tracing_headers(self.tracer, span, self.api_instance)
-            return await self.api_instance.delete(entity_reference.uuid)
-
-    async def filter(self, filter_obj: Any) -> FilterResults:
+            try:
+                return await self.api_instance.delete(entity_reference.uuid, timeout=timeout)
+            finally:
+                if self.cache is not None:
+                    self.cache.invalidate(self._cache_key(entity_reference.uuid))
+
+    def bulk_create_iter(self, payloads: BulkItems, concurrency: int = DEFAULT_CONCURRENCY,
+                         rate_limit: Union[float, TokenBucket, None] = None,
+                         timeout: RequestTimeout = None) -> AsyncGenerator[BulkItemResult, None]:
+        return run_bulk(payloads, lambda payload: self.create(payload, timeout), concurrency, rate_limit)
+
+    async def bulk_create(self, payloads: BulkItems, concurrency: int = DEFAULT_CONCURRENCY,
+                          rate_limit: Union[float, TokenBucket, None] = None, timeout: RequestTimeout = None,
+                          keep_results: bool = False) -> BulkReport:
+        return await collect_report(self.bulk_create_iter(payloads, concurrency, rate_limit, timeout), keep_results)
+
+    def bulk_update_iter(self, entities: BulkItems, concurrency: int = DEFAULT_CONCURRENCY,
+                         rate_limit: Union[float, TokenBucket, None] = None,
+                         timeout: RequestTimeout = None) -> AsyncGenerator[BulkItemResult, None]:
+        """Updates every entity (anything with metadata and spec) to its spec"""
+        return run_bulk(entities, lambda entity: self.update(entity.metadata, entity.spec, timeout),
+                        concurrency, rate_limit)
+
+    async def bulk_update(self, entities: BulkItems, concurrency: int = DEFAULT_CONCURRENCY,
+                          rate_limit: Union[float, TokenBucket, None] = None, timeout: RequestTimeout = None,
+                          keep_results: bool = False) -> BulkReport:
+        return await collect_report(self.bulk_update_iter(entities, concurrency, rate_limit, timeout), keep_results)
+
+    def bulk_delete_iter(self, entity_references: BulkItems, concurrency: int = DEFAULT_CONCURRENCY,
+                         rate_limit: Union[float, TokenBucket, None] = None,
+                         timeout: RequestTimeout = None) -> AsyncGenerator[BulkItemResult, None]:
+        return run_bulk(entity_references, lambda entity_reference: self.delete(entity_reference, timeout),
+                        concurrency, rate_limit)
+
+    async def bulk_delete(self, entity_references: BulkItems, concurrency: int = DEFAULT_CONCURRENCY,
+                          rate_limit: Union[float, TokenBucket, None] = None, timeout: RequestTimeout = None,
+                          keep_results: bool = False) -> BulkReport:
+        return await collect_report(self.bulk_delete_iter(entity_references, concurrency, rate_limit, timeout),
+                                    keep_results)
+
+    async def filter(self, filter_obj: Any, timeout: RequestTimeout = None,
+                     projection: Projection = None) -> FilterResults:
         with self.tracer.start_span(operation_name=f"filter_entities_client") as span:
             inject_tracing_headers(self.tracer, span, self.api_instance)
-            return await self.api_instance.post("filter", filter_obj)
+            return await self.api_instance.post(
+                with_projection("filter", projection_fields(projection)), filter_obj, timeout=timeout
+            )
 
-    async def filter_iter(self, filter_obj: Any) -> Callable[[Optional[int], Optional[int]], AsyncGenerator[Any, None]]:
-        async def iter_func(batch_size: Optional[int] = None, offset: Optional[int] = None):
-            if not batch_size:
-                batch_size = BATCH_SIZE
-            res = await self.api_instance.post(f"filter?limit={batch_size}&offset={offset or ''}", filter_obj)
-            if len(res.results) == 0:
-                return
-            else:
-                for entity in res.results:
-                    yield entity
-                offset = offset or 0
-                async for val in iter_func(batch_size, offset + batch_size):
-                    yield val
-                return
+    async def count(self, filter_obj: Any, timeout: RequestTimeout = None) -> int:
+        with self.tracer.start_span(operation_name=f"count_entities_client") as span:
+            inject_tracing_headers(self.tracer, span, self.api_instance)
+            res = await self.api_instance.post(f"filter?offset={COUNT_OFFSET}&limit=1", filter_obj, timeout=timeout)
+            return res.entity_count
+
+    async def exists(self, entity_reference: EntityReference, timeout: RequestTimeout = None) -> bool:
+        """Unlike get, a missing entity is not an error here and nothing is logged"""
+        return await self.count({"metadata": {"uuid": entity_reference.uuid}}, timeout) > 0
+
+    async def get_many(self, entity_references: List[EntityReference], chunk_size: int = GET_MANY_CHUNK_SIZE,
+                       concurrency: int = 4, timeout: RequestTimeout = None) -> List[Optional[Entity]]:
+        """Resolves the references with one filter request per `chunk_size` uuids,
+        running up to `concurrency` of them at a time. Entities are returned in
+        the order of the references, None marks references that were not found."""
+        uuids = list(dict.fromkeys(ref.uuid for ref in entity_references))
+        limiter = ConcurrencyLimiter(concurrency)
+        found = {}
+        if self.cache is not None:
+            # Expired entries are fetched again along with the misses, a batch
+            # costs about the same as revalidating them one by one
+            missing = []
+            for uuid in uuids:
+                key = self._cache_key(uuid)
+                entity, fresh = self.cache.lookup(key, self._credentials)
+                if fresh:
+                    found[uuid] = entity
+                else:
+                    if entity is not None:
+                        self.cache.mark_stale(key, self._credentials)
+                    missing.append(uuid)
+            uuids = missing
+
+        async def get_chunk(chunk: List[str]) -> None:
+            async with limiter:
+                generation = self.cache.generation() if self.cache is not None else None
+                res = await self.api_instance.post(
+                    f"filter?limit={len(chunk)}", {"metadata": {"uuid": {"$in": chunk}}}, timeout=timeout
+                )
+            for entity in res.results:
+                found[entity.metadata.uuid] = entity
+                if self.cache is not None:
+                    self.cache.put(self._cache_key(entity.metadata.uuid), entity, generation, self._credentials)
+
+        with self.tracer.start_span(operation_name=f"get_many_entities_client") as span:
+            inject_tracing_headers(self.tracer, span, self.api_instance)
+            await asyncio.gather(*[get_chunk(uuids[i:i + chunk_size]) for i in range(0, len(uuids), chunk_size)])
+        return [found.get(ref.uuid) for ref in entity_references]
 
-        return iter_func
+    def filter_stream(self, filter_obj: Any, timeout: RequestTimeout = None) -> AsyncGenerator[Entity, None]:
+        """Yields the matching entities while the response is still being received,
+        so memory use is bounded by a single entity rather than the whole page"""
+        return self._stream("filter_entities_stream_client", "post", f"filter?limit={STREAM_LIMIT}",
+                            filter_obj, timeout)
 
-    async def list_iter(self) -> Callable[[Optional[int], Optional[int]], AsyncGenerator[Any, None]]:
-        return await self.filter_iter({})
+    def get_all_stream(self, timeout: RequestTimeout = None) -> AsyncGenerator[Entity, None]:
+        return self._stream("list_entities_stream_client", "get", f"?limit={STREAM_LIMIT}", None, timeout)
+
+    async def _stream(self, operation_name: str, method: str, prefix: str, data: Any,
+                      timeout: RequestTimeout) -> AsyncGenerator[Entity, None]:
+        with self.tracer.start_span(operation_name=operation_name) as span:
+            inject_tracing_headers(self.tracer, span, self.api_instance)
+            chunks = self.api_instance.stream(method, prefix, data, timeout=timeout)
+            entities = iter_json_array(chunks)
+            try:
+                async for entity in entities:
+                    yield entity
+            finally:
+                # Releases the response and its connection right away if the caller stops early
+                await entities.aclose()
+                await chunks.aclose()
+
+    async def filter_iter(self, filter_obj: Any, timeout: RequestTimeout = None,
+                          prefetch: int = DEFAULT_PREFETCH, mode: str = OFFSET_MODE,
+                          keyset_key: str = "metadata.uuid",
+                          projection: Projection = None) -> Callable[[Optional[int], Optional[Any]], AsyncGenerator[Any, None]]:
+        """In keyset mode entities are sorted by `keyset_key` (which has to be
+        unique) and the returned function takes the key to start after instead of an offset"""
+        return paginated_iter_func(self.api_instance, filter_obj, timeout, prefetch, mode, keyset_key, projection)
+
+    async def list_iter(self, timeout: RequestTimeout = None, prefetch: int = DEFAULT_PREFETCH,
+                        mode: str = OFFSET_MODE,
+                        projection: Projection = None) -> Callable[[Optional[int], Optional[Any]], AsyncGenerator[Any, None]]:
+        return await self.filter_iter({}, timeout, prefetch, mode, projection=projection)
+
+    def scan_shards(self, filter_obj: Any, shards: int = DEFAULT_SHARDS, batch_size: Optional[int] = None,
+                    timeout: RequestTimeout = None) -> List[AsyncGenerator[Entity, None]]:
+        """Splits the scan of the matching entities into independent iterators
+        over disjoint uuid ranges, e.g. to hand them to separate workers"""
+        iterators = []
+        for start, end in uuid_ranges(shards):
+            bounds = {}
+            if start is not None:
+                bounds["$gte"] = start
+            if end is not None:
+                bounds["$lt"] = end
+            shard_filter = with_bounds(filter_obj, "metadata.uuid", bounds) if bounds else filter_obj
+            # Workers are decoupled from the consumer by the merge queue, no need to prefetch
+            iter_func = paginated_iter_func(self.api_instance, shard_filter, timeout, 0, KEYSET_MODE, "metadata.uuid")
+            iterators.append(iter_func(batch_size))
+        return iterators
+
+    async def scan_parallel(self, filter_obj: Any, shards: int = DEFAULT_SHARDS, concurrency: int = 4,
+                            batch_size: Optional[int] = None,
+                            timeout: RequestTimeout = None) -> AsyncGenerator[Entity, None]:
+        """Yields the matching entities scanning `concurrency` uuid ranges at a
+        time, entities come in no particular order"""
+        with self.tracer.start_span(operation_name=f"scan_entities_client") as span:
+            inject_tracing_headers(self.tracer, span, self.api_instance)
+            iterators = self.scan_shards(filter_obj, shards, batch_size, timeout)
+            queue_size = (batch_size or BATCH_SIZE) * concurrency
+            merged = merge_iterators(iterators, concurrency, queue_size)
+            try:
+                async for entity in merged:
+                    yield entity
+            finally:
+                # Stops the shard scans right away if the caller stops early
+                await merged.aclose()
+
+    def watch(self, filter_obj: Any = None, interval_secs: float = DEFAULT_WATCH_INTERVAL_SECS,
+              resume_token: Optional[str] = None, emit_existing: bool = True,
+              batch_size: Optional[int] = WATCH_BATCH_SIZE, timeout: RequestTimeout = None,
+              projection: Projection = None, state_store: Optional[WatchStateStore] = None) -> EntityWatch:
+        """Yields WatchEvents for the entities matching the filter as they are
+        created, updated, change status or get deleted. Save `resume_token`
+        after handling an event to continue from there, across restarts only
+        with a `state_store` that outlives the process.
+        With METADATA_ONLY as projection rescans only transfer the metadata."""
+        filter_obj = filter_obj or {}
+        # Changes are told apart by the metadata versions
+        projection = projection_fields(projection, "metadata")
+
+        def scan() -> AsyncGenerator[Entity, None]:
+            iter_func = paginated_iter_func(self.api_instance, filter_obj, timeout, DEFAULT_PREFETCH,
+                                            KEYSET_MODE, "metadata.uuid", projection)
+            return iter_func(batch_size)
+
+        return EntityWatch(scan, interval_secs, resume_token, emit_existing, state_store, self.api_instance.logger)
 
     async def invoke_procedure(
-            self, procedure_name: str, entity_reference: EntityReference, input_: Any
+            self, procedure_name: str, entity_reference: EntityReference, input_: Any, timeout: RequestTimeout = None
     ) -> Any:
         with self.tracer.start_span(operation_name=f"invoke_{procedure_name}_procedure_client") as span:
             inject_tracing_headers(self.tracer, span, self.api_instance)
             payload = input_
             return await self.api_instance.post(
-                f"{entity_reference.uuid}/procedure/{procedure_name}", payload
+                f"{entity_reference.uuid}/procedure/{procedure_name}", payload, timeout=timeout
             )
 
-    async def invoke_kind_procedure(self, procedure_name: str, input_: Any) -> Any:
+    async def invoke_kind_procedure(self, procedure_name: str, input_: Any, timeout: RequestTimeout = None) -> Any:
         with self.tracer.start_span(operation_name=f"invoke_{procedure_name}_kind_procedure_client") as span:
             inject_tracing_headers(self.tracer, span, self.api_instance)
             payload = input_
-            return await self.api_instance.post(f"procedure/{procedure_name}", payload)
+            return await self.api_instance.post(f"procedure/{procedure_name}", payload, timeout=timeout)
 
 
 class IntentWatcherClient(object):
@@ -125,7 +422,9 @@ class IntentWatcherClient(object):
             papiea_url: str,
             s2skey: Secret = None,
             logger: logging.Logger = logging.getLogger(__name__),
-            tracer: Optional[Tracer] = init_default_tracer()
+            tracer: Optional[Tracer] = init_default_tracer(),
+            shared_poll_interval_millis: Optional[float] = None,
+            **api_options
     ):
         headers = {
             "Content-Type": "application/json",
@@ -136,10 +435,15 @@ class IntentWatcherClient(object):
         if s2skey is not None:
             headers["Authorization"] = f"Bearer {s2skey}"
         self.api_instance = ApiInstance(
-            f"{papiea_url}/services/intent_watcher", headers=headers, logger=logger
+            f"{papiea_url}/services/intent_watcher", headers=headers, logger=logger, **api_options
         )
 
         self.logger = logger
+        # Waits go through a single poller for all the coroutines instead
+        # of polling each on its own, disabled unless an interval is given
+        self.poller = None
+        if shared_poll_interval_millis is not None:
+            self.poller = WatcherPoller(self._fetch_watchers, shared_poll_interval_millis / 1000, logger=logger)
 
     async def __aenter__(self) -> "IntentWatcherClient":
         return self
@@ -150,41 +454,122 @@ class IntentWatcherClient(object):
             exc_val: Optional[BaseException],
             exc_tb: Optional[TracebackType]
     ) -> None:
+        if self.poller is not None:
+            await self.poller.close()
         await self.api_instance.close()
         self.tracer.close()
 
-    async def get_intent_watcher(self, id: str) -> IntentWatcher:
+    async def get_intent_watcher(self, id: str, timeout: RequestTimeout = None) -> IntentWatcher:
         with self.tracer.start_span(operation_name=f"get_intent_watcher_client") as span:
             inject_tracing_headers(self.tracer, span, self.api_instance)
-            return await self.api_instance.get(id)
+            return await self.api_instance.get(id, timeout=timeout)
 
-    async def list_intent_watcher(self) -> List[IntentWatcher]:
+    async def list_intent_watcher(self, timeout: RequestTimeout = None) -> List[IntentWatcher]:
         with self.tracer.start_span(operation_name=f"list_intent_watchers_client") as span:
             inject_tracing_headers(self.tracer, span, self.api_instance)
-            res = await self.api_instance.get("")
+            res = await self.api_instance.get("", timeout=timeout)
             return res.results
 
     # filter_intent_watcher(AttributeDict(status=IntentfulStatus.Pending))
-    async def filter_intent_watcher(self, filter_obj: Any) -> List[IntentWatcher]:
+    async def filter_intent_watcher(self, filter_obj: Any, timeout: RequestTimeout = None) -> List[IntentWatcher]:
         with self.tracer.start_span(operation_name=f"filter_intent_watcher_client") as span:
             inject_tracing_headers(self.tracer, span, self.api_instance)
-            res = await self.api_instance.post("filter", filter_obj)
+            res = await self.api_instance.post("filter", filter_obj, timeout=timeout)
             return res.results
 
+    async def filter_iter(self, filter_obj: Any, timeout: RequestTimeout = None,
+                          prefetch: int = DEFAULT_PREFETCH, mode: str = OFFSET_MODE,
+                          keyset_key: str = "uuid", sort: Optional[str] = None,
+                          limit: Optional[int] = None) -> Callable[[Optional[int], Optional[Any]], AsyncGenerator[IntentWatcher, None]]:
+        """Pages through the matching watchers, `sort` (e.g. "created_at:desc")
+        orders them in offset mode and `limit` caps how many are returned"""
+        return paginated_iter_func(self.api_instance, filter_obj, timeout, prefetch, mode, keyset_key,
+                                   sort=sort, limit=limit)
+
+    async def list_iter(self, timeout: RequestTimeout = None, prefetch: int = DEFAULT_PREFETCH,
+                        mode: str = OFFSET_MODE, sort: Optional[str] = None,
+                        limit: Optional[int] = None) -> Callable[[Optional[int], Optional[Any]], AsyncGenerator[IntentWatcher, None]]:
+        return await self.filter_iter({}, timeout, prefetch, mode, sort=sort, limit=limit)
+
     async def wait_for_watcher_status(self, watcher_ref: AttributeDict, watcher_status: IntentfulStatus,
-                                      timeout_secs: float = 50, delay_millis: float = 500) -> bool:
-        start_time = time.time()
-        delay_secs = delay_millis / 1000
+                                      timeout_secs: float = 50, delay_millis: float = WATCHER_POLL_DELAY_MILLIS,
+                                      timeout: RequestTimeout = None,
+                                      max_delay_millis: float = WATCHER_MAX_POLL_DELAY_MILLIS) -> bool:
+        """Polls the watcher, starting every `delay_millis` and slowing down up to
+        every `max_delay_millis`, until it reaches the status. With a shared
+        poller the watcher is polled along with all the others instead."""
+        if self.poller is not None:
+            try:
+                await self.poller.wait(watcher_ref.uuid, watcher_status, timeout_secs)
+                return True
+            except asyncio.TimeoutError:
+                raise Exception(f"Timeout waiting for change in watcher status with uuid: {watcher_ref.uuid},"
+                                f" desired status: {watcher_status}")
+        deadline = time.monotonic() + timeout_secs
+        delays = poll_delays(delay_millis / 1000, max_delay_millis / 1000)
         while True:
-            watcher = await self.get_intent_watcher(watcher_ref.uuid)
+            watcher = await self.get_intent_watcher(watcher_ref.uuid, timeout)
             if watcher.status == watcher_status:
                 return True
-            end_time = time.time()
-            time_elapsed = end_time - start_time
-            if time_elapsed > timeout_secs:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
                 raise Exception(f"Timeout waiting for change in watcher status with uuid: {watcher_ref.uuid} for entity with uuid: {watcher.entity_ref.uuid} and kind: {watcher.entity_ref.kind} in provider with prefix: {watcher.entity_ref.provider_prefix} and version: {watcher.entity_ref.provider_version},"
                                 f" desired status: {watcher_status} and current status: {watcher.status}")
-            time.sleep(delay_secs)
+            await asyncio.sleep(min(next(delays), remaining))
+
+    async def wait_for_many(self, watcher_refs: List[AttributeDict], watcher_status: IntentfulStatus,
+                            timeout_secs: float = 50, delay_millis: float = WATCHER_POLL_DELAY_MILLIS,
+                            timeout: RequestTimeout = None,
+                            max_delay_millis: float = WATCHER_MAX_POLL_DELAY_MILLIS,
+                            chunk_size: int = GET_MANY_CHUNK_SIZE) -> AsyncGenerator[IntentWatcher, None]:
+        """Yields each watcher as soon as it reaches the status. All the watchers
+        still pending are polled together, with one filter request per `chunk_size`"""
+        if self.poller is not None:
+            async for watcher in self._wait_shared(watcher_refs, watcher_status, timeout_secs):
+                yield watcher
+            return
+        deadline = time.monotonic() + timeout_secs
+        delays = poll_delays(delay_millis / 1000, max_delay_millis / 1000)
+        pending = set(watcher_ref.uuid for watcher_ref in watcher_refs)
+        current = {}
+        while pending:
+            uuids = list(pending)
+            chunks = [uuids[i:i + chunk_size] for i in range(0, len(uuids), chunk_size)]
+            results = await asyncio.gather(*[self._fetch_watchers(chunk, timeout) for chunk in chunks])
+            for watchers in results:
+                for watcher in watchers:
+                    current[watcher.uuid] = watcher.status
+                    if watcher.status == watcher_status:
+                        pending.discard(watcher.uuid)
+                        yield watcher
+            if not pending:
+                return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                statuses = ", ".join(f"{uuid}: {current.get(uuid, 'not found')}" for uuid in sorted(pending))
+                raise Exception(f"Timeout waiting for change in status of {len(pending)} watchers,"
+                                f" desired status: {watcher_status} and current statuses: {statuses}")
+            await asyncio.sleep(min(next(delays), remaining))
+
+    async def _wait_shared(self, watcher_refs: List[AttributeDict], watcher_status: IntentfulStatus,
+                           timeout_secs: float) -> AsyncGenerator[IntentWatcher, None]:
+        waits = [asyncio.ensure_future(self.poller.wait(watcher_ref.uuid, watcher_status, timeout_secs))
+                 for watcher_ref in watcher_refs]
+        try:
+            for finished, done in enumerate(asyncio.as_completed(waits)):
+                try:
+                    yield await done
+                except asyncio.TimeoutError:
+                    raise Exception(f"Timeout waiting for change in status of {len(waits) - finished} watchers,"
+                                    f" desired status: {watcher_status}")
+        finally:
+            for wait in waits:
+                wait.cancel()
+            await asyncio.gather(*waits, return_exceptions=True)
+
+    async def _fetch_watchers(self, uuids: List[str], timeout: RequestTimeout = None) -> List[IntentWatcher]:
+        res = await self.api_instance.post(f"filter?limit={len(uuids)}", {"uuid": {"$in": uuids}}, timeout=timeout)
+        return res.results
 
 
 class ProviderClient(object):
@@ -195,20 +580,22 @@ class ProviderClient(object):
             version: str,
             s2skey: Optional[str] = None,
             logger: logging.Logger = logging.getLogger(__name__),
-            tracer: Optional[Tracer] = init_default_tracer()
+            tracer: Optional[Tracer] = init_default_tracer(),
+            **api_options
     ):
         self.papiea_url = papiea_url
         self.provider = provider
         self.version = version
         self.s2skey = s2skey
         self.logger = logger
+        self.api_options = api_options
         headers = {
             "Content-Type": "application/json",
         }
         if s2skey is not None:
             headers["Authorization"] = f"Bearer {s2skey}"
         self.api_instance = ApiInstance(
-            f"{papiea_url}/services/{provider}/{version}", headers=headers, logger=logger
+            f"{papiea_url}/services/{provider}/{version}", headers=headers, logger=logger, **api_options
         )
         self.tracer = tracer
 
@@ -226,11 +613,11 @@ class ProviderClient(object):
 
     def get_kind(self, kind: str) -> EntityCRUD:
         return EntityCRUD(
-            self.papiea_url, self.provider, self.version, kind, self.s2skey, self.logger
+            self.papiea_url, self.provider, self.version, kind, self.s2skey, self.logger, **self.api_options
         )
 
-    async def invoke_procedure(self, procedure_name: str, input: Any) -> Any:
+    async def invoke_procedure(self, procedure_name: str, input: Any, timeout: RequestTimeout = None) -> Any:
         with self.tracer.start_span(operation_name=f"invoke_{procedure_name}_procedure_client") as span:
             inject_tracing_headers(self.tracer, span, self.api_instance)
             payload = input
-            return await self.api_instance.post(f"procedure/{procedure_name}", payload)
+            return await self.api_instance.post(f"procedure/{procedure_name}", payload, timeout=timeout)
@@ -0,0 +1,85 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from .python_sdk_exceptions import DeadlineExceededException
+from .timeouts import remaining_time, run_without_deadline
+
+
+def copy_tree(obj: Any) -> Any:
+    # copy.deepcopy does not work with AttributeDict, its __getattr__ raises KeyError
+    if isinstance(obj, dict):
+        return type(obj)((key, copy_tree(value)) for key, value in obj.items())
+    if isinstance(obj, list):
+        return [copy_tree(value) for value in obj]
+    return obj
+
+
+class CoalescingStats(object):
+    def __init__(self):
+        # Requests actually sent to papiea
+        self.requests = 0
+        # Calls that were answered by a request already in flight
+        self.hits = 0
+        # Requests whose result was shared with at least one other caller
+        self.collapsed = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return {"requests": self.requests, "hits": self.hits, "collapsed": self.collapsed}
+
+
+class _Flight(object):
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+async def _wait(task: asyncio.Future) -> Any:
+    # The shared request ignores the deadlines of its callers, each of
+    # them only gives up waiting for it once its own deadline has passed
+    remaining = remaining_time()
+    if remaining is None:
+        return await asyncio.shield(task)
+    if remaining <= 0:
+        raise DeadlineExceededException("Deadline exceeded before the request could be made")
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), remaining)
+    except asyncio.TimeoutError:
+        raise DeadlineExceededException("Deadline exceeded while waiting for a coalesced request") from None
+
+
+class RequestCoalescer(object):
+    """Collapses identical concurrent requests into one. The first caller's
+    request is shared, every other caller gets its own copy of the result
+    so that callers can keep mutating what they got back. The shared request
+    runs outside of the first caller's deadline, every caller still stops
+    waiting at its own deadline.
+    Can be shared between several clients to collapse requests across them."""
+
+    def __init__(self):
+        self.stats = CoalescingStats()
+        self._flights: Dict[Hashable, _Flight] = {}
+
+    async def run(self, key: Hashable, request: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._flights.get(key)
+        if flight is None:
+            self.stats.requests += 1
+            # Run the request in its own task so cancelling the first caller
+            # does not cancel the request for everybody else
+            flight = _Flight(run_without_deadline(asyncio.ensure_future, request()))
+            self._flights[key] = flight
+
+            def remove_flight(task):
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                # Failure is reported to the callers, don't let asyncio warn about it
+                if not task.cancelled():
+                    task.exception()
+
+            flight.task.add_done_callback(remove_flight)
+            return await _wait(flight.task)
+        self.stats.hits += 1
+        flight.waiters += 1
+        if flight.waiters == 1:
+            self.stats.collapsed += 1
+        result = await _wait(flight.task)
+        return copy_tree(result)
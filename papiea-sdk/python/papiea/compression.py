@@ -0,0 +1,57 @@
+import gzip
+from typing import Awaitable, Callable, Optional, Tuple
+
+from aiohttp import web
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class CompressionConfig(object):
+    def __init__(
+            self,
+            accept_compressed_responses: bool = True,
+            compress_requests: bool = False,
+            request_threshold_bytes: int = 64 * 1024,
+            response_threshold_bytes: int = 64 * 1024,
+            level: int = 6
+    ):
+        self.accept_compressed_responses = accept_compressed_responses
+        self.compress_requests = compress_requests
+        self.request_threshold_bytes = request_threshold_bytes
+        self.response_threshold_bytes = response_threshold_bytes
+        self.level = level
+
+    def accept_encoding(self) -> str:
+        if not self.accept_compressed_responses:
+            return "identity"
+        # aiohttp only decodes brotli when the brotli package is installed
+        if brotli is not None:
+            return "gzip, deflate, br"
+        return "gzip, deflate"
+
+    def compress_request(self, body: bytes) -> Tuple[bytes, Optional[str]]:
+        """Returns the body to send along with its Content-Encoding"""
+        if not self.compress_requests or len(body) < self.request_threshold_bytes:
+            return body, None
+        return gzip.compress(body, compresslevel=self.level), "gzip"
+
+    def middleware(self) -> Callable:
+        @web.middleware
+        async def compression_middleware(
+                request: web.Request, handler: Callable[[web.Request], Awaitable[web.StreamResponse]]
+        ) -> web.StreamResponse:
+            response = await handler(request)
+            # Small responses are not worth the cpu, compression itself is only
+            # enabled if the caller accepts it (see StreamResponse.enable_compression)
+            if isinstance(response, web.Response) and isinstance(response.body, (bytes, bytearray)) \
+                    and len(response.body) >= self.response_threshold_bytes:
+                response.enable_compression()
+            return response
+
+        return compression_middleware
+
+
+default_compression = CompressionConfig()
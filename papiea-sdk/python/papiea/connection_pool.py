@@ -0,0 +1,158 @@
+import asyncio
+from typing import Dict, Optional, Set, Tuple
+from urllib.parse import unquote
+
+from aiohttp import BaseConnector, ClientSession, TCPConnector, UnixConnector
+from yarl import URL
+
+UNIX_SCHEMES = ("unix://", "http+unix://")
+
+
+def split_unix_url(base_url: str) -> Tuple[Optional[str], str]:
+    """Splits a url of the form unix://%2Fvar%2Frun%2Fpapiea.sock/services into the
+    socket path (/var/run/papiea.sock) and the http url to send over it
+    (http://localhost/services). Other urls are returned unchanged."""
+    for scheme in UNIX_SCHEMES:
+        if base_url.startswith(scheme):
+            socket_path, separator, path = base_url[len(scheme):].partition("/")
+            return unquote(socket_path), "http://localhost" + separator + path
+    return None, base_url
+
+
+class ConnectionPoolConfig(object):
+    def __init__(
+            self,
+            limit: int = 100,
+            limit_per_host: int = 100,
+            keepalive_timeout: float = 30,
+            use_dns_cache: bool = True,
+            ttl_dns_cache: Optional[int] = 300
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.use_dns_cache = use_dns_cache
+        self.ttl_dns_cache = ttl_dns_cache
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, ConnectionPoolConfig) and vars(self) == vars(other)
+
+    def create_connector(self, unix_socket_path: Optional[str] = None) -> BaseConnector:
+        if unix_socket_path is not None:
+            return UnixConnector(
+                unix_socket_path,
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout
+            )
+        return TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            use_dns_cache=self.use_dns_cache,
+            ttl_dns_cache=self.ttl_dns_cache
+        )
+
+
+class PooledSession(object):
+    def __init__(self, key: Tuple[asyncio.AbstractEventLoop, str], config: ConnectionPoolConfig,
+                 unix_socket_path: Optional[str] = None):
+        self.key = key
+        self.config = config
+        self.unix_socket_path = unix_socket_path
+        self.session = ClientSession(connector=config.create_connector(unix_socket_path))
+        self.refs = 0
+        # Requests currently running on each session, retired sessions
+        # are only closed once their last request completes
+        self._in_flight: Dict[ClientSession, int] = {}
+        self._retired: Set[ClientSession] = set()
+
+    def new_session(self) -> None:
+        self.session = ClientSession(connector=self.config.create_connector(self.unix_socket_path))
+
+    def checkout(self) -> ClientSession:
+        session = self.session
+        self._in_flight[session] = self._in_flight.get(session, 0) + 1
+        return session
+
+    async def checkin(self, session: ClientSession) -> None:
+        remaining = self._in_flight.get(session, 1) - 1
+        if remaining > 0:
+            self._in_flight[session] = remaining
+            return
+        self._in_flight.pop(session, None)
+        if session in self._retired:
+            self._retired.discard(session)
+            await session.close()
+
+    async def retire(self, session: ClientSession) -> None:
+        # Somebody else might have renewed the session already
+        if self.session is not session:
+            return
+        self.new_session()
+        if self._in_flight.get(session, 0) > 0:
+            self._retired.add(session)
+        else:
+            await session.close()
+
+
+class SessionRegistry(object):
+    """Keeps one ClientSession (and thus one connector) per event loop and
+    Papiea origin, shared by every ApiInstance pointing to that origin.
+    Sessions are reference counted and closed once the last user releases them.
+    Instances sharing a session have to agree on its ConnectionPoolConfig."""
+
+    def __init__(self, config: Optional[ConnectionPoolConfig] = None):
+        self.config = config or ConnectionPoolConfig()
+        self._sessions: Dict[Tuple[asyncio.AbstractEventLoop, str], PooledSession] = {}
+
+    @staticmethod
+    def origin(base_url: str) -> str:
+        unix_socket_path, _ = split_unix_url(base_url)
+        if unix_socket_path is not None:
+            return f"unix://{unix_socket_path}"
+        url = URL(base_url)
+        return f"{url.scheme}://{url.host}:{url.port}"
+
+    def configure(self, config: ConnectionPoolConfig) -> None:
+        # Only affects sessions opened after this call
+        self.config = config
+
+    def _purge_closed_loops(self) -> None:
+        for key in [key for key in self._sessions if key[0].is_closed()]:
+            del self._sessions[key]
+
+    def acquire(self, base_url: str, config: Optional[ConnectionPoolConfig] = None) -> PooledSession:
+        self._purge_closed_loops()
+        key = (asyncio.get_event_loop(), self.origin(base_url))
+        pooled = self._sessions.get(key)
+        if pooled is None:
+            pooled = PooledSession(key, config or self.config, split_unix_url(base_url)[0])
+            self._sessions[key] = pooled
+        elif config is not None and config != pooled.config:
+            # The session of an origin is shared, it cannot follow both configs
+            raise ValueError(f"A session for {key[1]} is already open with a different connection pool config")
+        elif pooled.session.closed:
+            pooled.new_session()
+        pooled.refs += 1
+        return pooled
+
+    async def release(self, pooled: PooledSession) -> None:
+        pooled.refs -= 1
+        if pooled.refs > 0:
+            return
+        if self._sessions.get(pooled.key) is pooled:
+            del self._sessions[pooled.key]
+        await pooled.session.close()
+
+    async def renew(self, pooled: PooledSession, session: ClientSession) -> None:
+        await pooled.retire(session)
+
+    async def close(self) -> None:
+        sessions = list(self._sessions.values())
+        self._sessions.clear()
+        for pooled in sessions:
+            await pooled.session.close()
+
+
+default_session_registry = SessionRegistry()
@@ -206,7 +206,10 @@ class PapieaError(enum.Enum):
     Unauthorized = "unauthorized_error"
     PermissionDenied = "permission_denied_error"
     ConflictingEntity = "conflicting_entity_error"
+    SpecConflictingEntity = "spec_conflicting_entity_error"
+    StatusConflictingEntity = "status_conflicting_entity_error"
     ServerError = "server_error"
+    OnActionError = "on_action_error"
 
 
 class DiffSelectionStrategy(enum.Enum):
@@ -0,0 +1,155 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional, Set, Tuple
+
+from .coalescing import copy_tree
+from .core import Entity
+from .json_codec import default_codec
+
+
+class CacheStats(object):
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        # Expired entries found unchanged by the metadata check
+        self.revalidated = 0
+        # Expired entries that had changed and were fetched again
+        self.stale = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "stale": self.stale,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+
+class _Entry(object):
+    __slots__ = ("entity", "size", "expires_at")
+
+    def __init__(self, entity: Entity, size: int, expires_at: float):
+        self.entity = entity
+        self.size = size
+        self.expires_at = expires_at
+
+
+class EntityCache(object):
+    """LRU cache of entities bounded both by the number of entries and by
+    their approximate size (the length of their json encoding). Entries are
+    served as they are for `ttl_secs`, after that they are revalidated
+    against papiea before being served again. Every lookup returns a copy,
+    callers can freely modify what they get.
+
+    Can be shared between clients. Entries are stored per `scope`, EntityCRUD
+    passes its credentials so clients acting for different users never get
+    each other's entities, while invalidating a key drops it for every scope.
+    Fetches racing an update or delete pass the `generation()` taken before
+    they started to `put`, entities invalidated since then are not stored."""
+
+    def __init__(
+            self,
+            max_entries: int = 10000,
+            ttl_secs: float = 30,
+            max_bytes: Optional[int] = 64 * 1024 * 1024,
+            size_of: Optional[Callable[[Entity], int]] = None
+    ):
+        self.max_entries = max_entries
+        self.ttl_secs = ttl_secs
+        self.max_bytes = max_bytes
+        self.size_of = size_of or (lambda entity: len(default_codec.dumps(entity)))
+        self.stats = CacheStats()
+        self._entries: "OrderedDict[Tuple[Hashable, Hashable], _Entry]" = OrderedDict()
+        self._scopes: Dict[Hashable, Set[Hashable]] = {}
+        self._bytes = 0
+        # Generation of the latest invalidation of each key, only the most recent
+        # ones are kept, puts older than the ones forgotten are dropped
+        self._generation = 0
+        self._invalidated: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._forgotten_generation = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def lookup(self, key: Hashable, scope: Hashable = None) -> Tuple[Optional[Entity], bool]:
+        """Returns a copy of the cached entity (None on a miss) and whether it is still fresh"""
+        entry = self._entries.get((key, scope))
+        if entry is None:
+            self.stats.misses += 1
+            return None, False
+        self._entries.move_to_end((key, scope))
+        fresh = entry.expires_at > time.monotonic()
+        if fresh:
+            self.stats.hits += 1
+        return copy_tree(entry.entity), fresh
+
+    def generation(self) -> int:
+        return self._generation
+
+    def put(self, key: Hashable, entity: Entity, generation: Optional[int] = None, scope: Hashable = None) -> None:
+        if generation is not None and \
+                (generation < self._forgotten_generation or self._invalidated.get(key, 0) > generation):
+            # Fetched before the entity was last updated or deleted
+            return
+        self._remove(key, scope)
+        size = self.size_of(entity)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        self._entries[(key, scope)] = _Entry(copy_tree(entity), size, time.monotonic() + self.ttl_secs)
+        self._scopes.setdefault(key, set()).add(scope)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or \
+                (self.max_bytes is not None and self._bytes > self.max_bytes):
+            evicted_key, evicted_scope = next(iter(self._entries))
+            self._remove(evicted_key, evicted_scope)
+            self.stats.evictions += 1
+
+    def revalidated(self, key: Hashable, scope: Hashable = None) -> None:
+        entry = self._entries.get((key, scope))
+        if entry is not None:
+            entry.expires_at = time.monotonic() + self.ttl_secs
+            self.stats.revalidated += 1
+
+    def mark_stale(self, key: Hashable, scope: Hashable = None) -> None:
+        self.stats.stale += 1
+        self._remove(key, scope)
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drops the key for every scope"""
+        self._generation += 1
+        self._invalidated[key] = self._generation
+        self._invalidated.move_to_end(key)
+        if len(self._invalidated) > self.max_entries:
+            _, self._forgotten_generation = self._invalidated.popitem(last=False)
+        removed = False
+        for scope in list(self._scopes.get(key, ())):
+            removed = self._remove(key, scope) or removed
+        if removed:
+            self.stats.invalidations += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._scopes.clear()
+        self._bytes = 0
+        self._generation += 1
+        self._invalidated.clear()
+        self._forgotten_generation = self._generation
+
+    def _remove(self, key: Hashable, scope: Hashable) -> bool:
+        entry = self._entries.pop((key, scope), None)
+        if entry is None:
+            return False
+        self._bytes -= entry.size
+        scopes = self._scopes[key]
+        scopes.discard(scope)
+        if not scopes:
+            del self._scopes[key]
+        return True
@@ -0,0 +1,59 @@
+import re
+import time
+from functools import lru_cache
+from typing import Optional, Tuple
+from urllib.parse import urlsplit
+
+_UUID = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+
+# Routes of a provider (not of one of its kinds) under /services/{prefix}/{version}
+_PROVIDER_ROUTES = ("procedure", "check_permission")
+
+
+@lru_cache(maxsize=4096)
+def route_template(url: str) -> Tuple[str, str]:
+    """Returns the route of a papiea url with ids replaced by placeholders,
+    along with the entity kind the url is about ("" if none), e.g.
+    http://papiea/services/location_provider/0.1.0/Location/<uuid>/procedure/move
+    -> ("/services/{prefix}/{version}/{kind}/{uuid}/procedure/move", "Location")"""
+    segments = [segment for segment in urlsplit(url).path.split("/") if segment]
+    kind = ""
+    if len(segments) >= 2 and segments[0] == "services" and segments[1] == "intent_watcher":
+        if len(segments) > 2 and segments[2] != "filter":
+            segments[2] = "{id}"
+    elif len(segments) >= 3 and segments[0] in ("services", "provider"):
+        segments[1], segments[2] = "{prefix}", "{version}"
+        if segments[0] == "services" and len(segments) >= 4 and segments[3] not in _PROVIDER_ROUTES:
+            kind = segments[3]
+            segments[3] = "{kind}"
+    segments = ["{uuid}" if _UUID.match(segment) else segment for segment in segments]
+    return "/" + "/".join(segments), kind
+
+
+class RequestInfo(object):
+    __slots__ = ("method", "url", "route", "kind", "started_at", "status")
+
+    def __init__(self, method: str, url: str):
+        self.method = method
+        self.url = url
+        self.route, self.kind = route_template(url)
+        self.started_at = time.perf_counter()
+        # Set once papiea answered, stays None on connection errors and timeouts
+        self.status: Optional[int] = None
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+
+class RequestHooks(object):
+    """Called around every request ApiInstance sends to papiea, retries included"""
+
+    def on_request(self, info: RequestInfo) -> None:
+        pass
+
+    def on_response(self, info: RequestInfo, error: Optional[BaseException]) -> None:
+        pass
+
+    def on_session_renewed(self, base_url: str) -> None:
+        pass
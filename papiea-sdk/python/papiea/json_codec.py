@@ -0,0 +1,95 @@
+import json
+from typing import Any, Optional, Union
+
+from .core import AttributeDict
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+class JsonCodec(object):
+    name = "json"
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return json.loads(data)
+
+    def loads_attrs(self, data: Union[bytes, str]) -> Any:
+        """Decodes every object to an AttributeDict. All codecs decode this
+        way, only `dumps` and `loads` are sped up by orjson/ujson."""
+        # The hook still runs once per object, passing the class only saves
+        # the call to a python wrapper (a few percent). Decoding with orjson
+        # and converting the tree afterwards was measured to be slower, see
+        # benchmarks/json_codec_benchmark.py
+        return json.loads(data, object_hook=AttributeDict)
+
+
+class OrjsonCodec(JsonCodec):
+    """Unlike the json module, orjson writes NaN and infinities as null and
+    decodes integers beyond 64 bits as floats"""
+    name = "orjson"
+
+    def __init__(self):
+        if orjson is None:
+            raise Exception("orjson codec requested but orjson is not installed")
+
+    def dumps(self, obj: Any) -> bytes:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # Integers beyond 64 bits among others, the json module still writes them
+            return super().dumps(obj)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return orjson.loads(data)
+
+
+class UjsonCodec(JsonCodec):
+    name = "ujson"
+
+    def __init__(self):
+        if ujson is None:
+            raise Exception("ujson codec requested but ujson is not installed")
+
+    def dumps(self, obj: Any) -> bytes:
+        try:
+            return ujson.dumps(obj, ensure_ascii=False).encode("utf-8")
+        except OverflowError:
+            # Integers beyond 64 bits, NaN and infinities, the json module still writes them
+            return super().dumps(obj)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        try:
+            return ujson.loads(data)
+        except ValueError:
+            return super().loads(data)
+
+
+CODECS = {
+    JsonCodec.name: JsonCodec,
+    OrjsonCodec.name: OrjsonCodec,
+    UjsonCodec.name: UjsonCodec
+}
+
+
+def get_codec(name: Optional[str] = None) -> JsonCodec:
+    """Returns the codec with the given name, the json module one by default.
+    orjson and ujson are opt-in (e.g. ApiInstance(codec=get_codec("orjson"))),
+    they do not handle every value the way the json module does."""
+    if name is None:
+        return JsonCodec()
+    if name not in CODECS:
+        raise Exception(f"Unknown json codec: {name}, available codecs: {list(CODECS.keys())}")
+    return CODECS[name]()
+
+
+default_codec = get_codec()
@@ -0,0 +1,136 @@
+import codecs
+import json
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, List
+
+from .core import AttributeDict
+
+_WHITESPACE = " \t\n\r"
+
+
+class IncompleteJson(Exception):
+    pass
+
+
+class JsonArrayStream(object):
+    """Incrementally parses a json object of the form {"<key>": [...], ...}
+    fed chunk by chunk, returning the items of the array as soon as each of
+    them is complete. Only the item being parsed is kept in memory, the rest
+    of the object's fields are collected into `fields`."""
+
+    def __init__(self, key: str = "results"):
+        self.key = key
+        self.fields: Dict[str, Any] = AttributeDict()
+        self._decoder = json.JSONDecoder(object_hook=AttributeDict)
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        self._finished = False
+        # Where we are in the object: "start", "key", "colon", "value", "items", "comma", "end"
+        self._state = "start"
+        self._current_key = None
+        # Skips decode attempts until enough new data arrived, keeps
+        # re-parsing of big items amortized linear
+        self._retry_at = 0
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        self._buffer += self._text_decoder.decode(chunk)
+        return self._parse()
+
+    def finish(self) -> List[Any]:
+        self._buffer += self._text_decoder.decode(b"", final=True)
+        self._finished = True
+        self._retry_at = 0
+        items = self._parse()
+        if self._state != "end":
+            raise ValueError(f"Unexpected end of json stream while parsing '{self.key}'")
+        return items
+
+    def _skip_whitespace(self) -> bool:
+        while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+            self._pos += 1
+        return self._pos < len(self._buffer)
+
+    def _expect(self, char: str) -> None:
+        if self._buffer[self._pos] != char:
+            raise ValueError(f"Expected '{char}' at position {self._pos} of json stream,"
+                             f" got '{self._buffer[self._pos]}'")
+        self._pos += 1
+
+    def _decode_value(self) -> Any:
+        if len(self._buffer) < self._retry_at:
+            raise IncompleteJson()
+        try:
+            value, end = self._decoder.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            if self._finished:
+                raise
+            self._retry_at = len(self._buffer) * 2 - self._pos
+            raise IncompleteJson()
+        # A number at the very end of the buffer might still continue in the next chunk
+        if end == len(self._buffer) and not self._finished:
+            raise IncompleteJson()
+        self._pos = end
+        self._retry_at = 0
+        return value
+
+    def _compact(self) -> None:
+        if self._pos > 0:
+            self._buffer = self._buffer[self._pos:]
+            self._retry_at = max(0, self._retry_at - self._pos)
+            self._pos = 0
+
+    def _parse(self) -> List[Any]:
+        items = []
+        try:
+            while self._state != "end" and self._skip_whitespace():
+                if self._state == "start":
+                    self._expect("{")
+                    self._state = "key"
+                elif self._state == "key":
+                    if self._buffer[self._pos] == "}":
+                        self._pos += 1
+                        self._state = "end"
+                        continue
+                    if self._buffer[self._pos] == ",":
+                        self._pos += 1
+                        continue
+                    self._current_key = self._decode_value()
+                    self._state = "colon"
+                elif self._state == "colon":
+                    self._expect(":")
+                    self._state = "value"
+                elif self._state == "value":
+                    if self._current_key == self.key and self._buffer[self._pos] == "[":
+                        self._pos += 1
+                        self._state = "items"
+                    else:
+                        self.fields[self._current_key] = self._decode_value()
+                        self._state = "key"
+                elif self._state == "items":
+                    if self._buffer[self._pos] == "]":
+                        self._pos += 1
+                        self._state = "key"
+                        continue
+                    items.append(self._decode_value())
+                    self._compact()
+                    self._state = "comma"
+                elif self._state == "comma":
+                    if self._buffer[self._pos] == "]":
+                        self._pos += 1
+                        self._state = "key"
+                    else:
+                        self._expect(",")
+                        self._state = "items"
+        except IncompleteJson:
+            pass
+        self._compact()
+        return items
+
+
+async def iter_json_array(chunks: AsyncIterator[bytes], key: str = "results") -> AsyncGenerator[Any, None]:
+    parser = JsonArrayStream(key)
+    async for chunk in chunks:
+        for item in parser.feed(chunk):
+            yield item
+    for item in parser.finish():
+        yield item
@@ -0,0 +1,226 @@
+import bisect
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .circuit_breaker import CircuitBreakerRegistry, CircuitState
+from .hooks import RequestHooks, RequestInfo
+from .python_sdk_exceptions import ApiException
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f"{name}=\"{_escape(str(value))}\"" for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric(object):
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values: Dict[Labels, float] = {}
+
+    def get(self, labels: Labels = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> Iterable[Tuple[str, Sequence[str], Labels, float]]:
+        for labels, value in self._values.items():
+            yield self.name, self.label_names, labels, value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for name, label_names, labels, value in self.samples():
+            lines.append(f"{name}{_format_labels(label_names, labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, labels: Labels, value: float) -> None:
+        self._values[labels] = value
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, labels: Labels = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Per labels: bucket counts (not cumulative, last one is +Inf), sum
+        self._histograms: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, labels: Labels, value: float) -> None:
+        histogram = self._histograms.get(labels)
+        if histogram is None:
+            histogram = ([0] * (len(self.buckets) + 1), [0.0])
+            self._histograms[labels] = histogram
+        counts, total = histogram
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def count(self, labels: Labels = ()) -> int:
+        histogram = self._histograms.get(labels)
+        return sum(histogram[0]) if histogram is not None else 0
+
+    def samples(self) -> Iterable[Tuple[str, Sequence[str], Labels, float]]:
+        bucket_label_names = self.label_names + ("le",)
+        for labels, (counts, total) in self._histograms.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", bucket_label_names, labels + (_format_value(bound),), cumulative
+            yield f"{self.name}_sum", self.label_names, labels, total[0]
+            yield f"{self.name}_count", self.label_names, labels, cumulative
+
+
+class MetricsRegistry(object):
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        # Called on every render, for metrics computed from state kept elsewhere
+        self._collectors: List[Callable[[], Iterable[Metric]]] = []
+
+    def _get_or_create(self, metric_class, name: str, documentation: str, label_names: Sequence[str], **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = metric_class(name, documentation, label_names, **kwargs)
+            self._metrics[name] = metric
+        elif not isinstance(metric, metric_class) or metric.label_names != tuple(label_names):
+            raise ValueError(f"Metric {name} is already registered with a different type or labels")
+        return metric
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, label_names)
+
+    def gauge(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, label_names)
+
+    def histogram(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, label_names, buckets=buckets)
+
+    def add_collector(self, collector: Callable[[], Iterable[Metric]]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for metric in collector():
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def status_class(status: Optional[int]) -> str:
+    if status is None:
+        return "error"
+    return f"{status // 100}xx"
+
+
+def error_type(e: BaseException) -> str:
+    # Papiea errors all surface as ApiException, the papiea error type is more telling
+    if isinstance(e, ApiException):
+        try:
+            return e.details.error.type
+        except (AttributeError, KeyError, TypeError):
+            return f"http_{e.status}"
+    return type(e).__name__
+
+
+_CIRCUIT_STATE_VALUES = {CircuitState.Closed: 0, CircuitState.HalfOpen: 1, CircuitState.Open: 2}
+
+
+class ClientMetrics(RequestHooks):
+    """Latency, in flight and error metrics of the requests sent to papiea"""
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None,
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.registry = registry or default_registry
+        labels = ("method", "route", "kind")
+        self.duration = self.registry.histogram(
+            "papiea_client_request_duration_seconds", "Duration of requests to papiea",
+            labels + ("status_class",), buckets
+        )
+        self.in_flight = self.registry.gauge(
+            "papiea_client_requests_in_flight", "Requests to papiea waiting for an answer", labels
+        )
+        self.errors = self.registry.counter(
+            "papiea_client_errors_total", "Failed requests to papiea by error type", labels + ("error",)
+        )
+        self.session_renewals = self.registry.counter(
+            "papiea_client_session_renewals_total", "Http sessions replaced after being closed", ("origin",)
+        )
+        self._circuit_breakers: List[CircuitBreakerRegistry] = []
+
+    def on_request(self, info: RequestInfo) -> None:
+        self.in_flight.inc((info.method, info.route, info.kind))
+
+    def on_response(self, info: RequestInfo, error: Optional[BaseException]) -> None:
+        labels = (info.method, info.route, info.kind)
+        self.in_flight.dec(labels)
+        self.duration.observe(labels + (status_class(info.status),), info.elapsed)
+        if error is not None:
+            self.errors.inc(labels + (error_type(error),))
+
+    def on_session_renewed(self, base_url: str) -> None:
+        self.session_renewals.inc((base_url,))
+
+    def watch_circuit_breakers(self, circuit_breakers: CircuitBreakerRegistry) -> None:
+        if any(watched is circuit_breakers for watched in self._circuit_breakers):
+            return
+        if not self._circuit_breakers:
+            self.registry.add_collector(self._collect_circuit_breakers)
+        self._circuit_breakers.append(circuit_breakers)
+
+    def _collect_circuit_breakers(self) -> Iterable[Metric]:
+        state = Gauge("papiea_client_circuit_breaker_state",
+                      "Circuit breaker state per route family (0 closed, 1 half open, 2 open)", ("family",))
+        opened = Counter("papiea_client_circuit_breaker_opened_total",
+                         "Times the circuit breaker of a route family opened", ("family",))
+        rejected = Counter("papiea_client_circuit_breaker_rejected_total",
+                           "Requests rejected by an open circuit breaker", ("family",))
+        for circuit_breakers in self._circuit_breakers:
+            for family, breaker in circuit_breakers.breakers().items():
+                state.set((family,), _CIRCUIT_STATE_VALUES[breaker.state])
+                opened.inc((family,), breaker.times_opened)
+                rejected.inc((family,), breaker.rejected)
+        return state, opened, rejected
+
+
+default_registry = MetricsRegistry()
+
+default_client_metrics = ClientMetrics(default_registry)
@@ -0,0 +1,203 @@
+import asyncio
+from collections import deque
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Pages requested ahead of the one being consumed
+DEFAULT_PREFETCH = 2
+
+# Items of a page along with the total number of items, if known
+Page = Tuple[List[Any], Optional[int]]
+
+
+def _discard(task: asyncio.Future) -> None:
+    task.cancel()
+    # Failure of a page nobody is waiting for anymore, don't let asyncio warn about it
+    if task.done() and not task.cancelled():
+        task.exception()
+
+
+async def prefetch_pages(
+        fetch_page: Callable[[int], Awaitable[Page]],
+        page_size: int,
+        offset: int = 0,
+        prefetch: int = DEFAULT_PREFETCH,
+        limit: Optional[int] = None
+) -> AsyncGenerator[Any, None]:
+    """Yields the items of consecutive pages starting at `offset`, requesting up
+    to `prefetch` pages ahead while the current one is consumed. Pages are only
+    requested when the consumer asks for more, so at most `prefetch` + 1 pages
+    are held in memory however slow the consumer is. Iteration ends with the
+    first page that is not full, or after `limit` items."""
+    pending = deque()
+    next_offset = offset
+    total = None
+    end = offset + limit if limit is not None else None
+    if end is not None and end <= offset:
+        return
+
+    def schedule() -> None:
+        nonlocal next_offset
+        pending.append((next_offset, asyncio.ensure_future(fetch_page(next_offset))))
+        next_offset += page_size
+
+    try:
+        schedule()
+        while pending:
+            page_offset, page = pending.popleft()
+            items, count = await page
+            if count is not None:
+                total = count
+            last = len(items) < page_size
+            if end is not None and page_offset + page_size >= end:
+                items = items[:end - page_offset]
+                last = True
+            if last:
+                for item in items:
+                    yield item
+                return
+            # The total only tells how far it is worth prefetching, entities
+            # created in the meantime are still picked up page by page
+            while len(pending) < prefetch and (total is None or next_offset < total) \
+                    and (end is None or next_offset < end):
+                schedule()
+            for item in items:
+                yield item
+            if not pending:
+                schedule()
+    finally:
+        for _, page in pending:
+            _discard(page)
+
+
+OFFSET_MODE = "offset"
+KEYSET_MODE = "keyset"
+
+
+def get_path(obj: Any, path: str) -> Any:
+    for field in path.split("."):
+        obj = obj[field]
+    return obj
+
+
+def with_bounds(filter_obj: Any, path: str, bounds: Dict[str, Any]) -> Any:
+    """Returns a copy of the filter additionally restricting the dotted `path`
+    by the given range operators ($gt, $gte, $lt, $lte), existing bounds
+    on the same path are kept if they are tighter"""
+    filter_obj = dict(filter_obj or {})
+    *parents, field = path.split(".")
+    current = filter_obj
+    for parent in parents:
+        current[parent] = dict(current.get(parent) or {})
+        current = current[parent]
+    condition = current.get(field)
+    if condition is not None and not isinstance(condition, dict):
+        raise ValueError(f"Range on {path} cannot be combined with a filter on its exact value")
+    condition = dict(condition or {})
+    for operator, value in bounds.items():
+        if operator in condition:
+            value = max(value, condition[operator]) if operator in ("$gt", "$gte") else min(value, condition[operator])
+        condition[operator] = value
+    current[field] = condition
+    return filter_obj
+
+
+def with_lower_bound(filter_obj: Any, path: str, after: Any) -> Any:
+    return with_bounds(filter_obj, path, {"$gt": after})
+
+
+async def keyset_pages(
+        fetch_page: Callable[[Optional[Any]], Awaitable[List[Any]]],
+        page_size: int,
+        key: Callable[[Any], Any],
+        after: Optional[Any] = None,
+        prefetch: bool = True,
+        limit: Optional[int] = None
+) -> AsyncGenerator[Any, None]:
+    """Yields the items of consecutive pages sorted by a unique key, every page
+    is requested with the key of the last item seen instead of an offset, so
+    items created or deleted meanwhile do not shift the following pages.
+    The key of the next page is known as soon as a page arrives, so with
+    `prefetch` the next page is requested while the current one is consumed."""
+    if limit is not None and limit <= 0:
+        return
+    next_page = asyncio.ensure_future(fetch_page(after))
+    remaining = limit
+    try:
+        while next_page is not None:
+            items = await next_page
+            next_page = None
+            if remaining is not None:
+                items = items[:remaining]
+                remaining -= len(items)
+            full = len(items) >= page_size and remaining != 0
+            if full and prefetch:
+                next_page = asyncio.ensure_future(fetch_page(key(items[-1])))
+            for item in items:
+                yield item
+            if full and not prefetch:
+                next_page = asyncio.ensure_future(fetch_page(key(items[-1])))
+    finally:
+        if next_page is not None:
+            _discard(next_page)
+
+
+def uuid_ranges(shards: int) -> List[Tuple[Optional[str], Optional[str]]]:
+    """Splits the uuid keyspace into `shards` contiguous [start, end) ranges of
+    about the same size. The first and last ranges are open ended, so the ranges
+    cover every string, uuids that are not lowercase hex only skew the balance."""
+    if shards < 1:
+        raise ValueError("shards should be at least 1")
+    bounds = [f"{(i << 32) // shards:08x}" for i in range(1, shards)]
+    return list(zip([None] + bounds, bounds + [None]))
+
+
+_DONE = object()
+
+
+class _Failure(object):
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+async def merge_iterators(iterators: Sequence[AsyncIterator[Any]], concurrency: int,
+                          queue_size: int = 100) -> AsyncGenerator[Any, None]:
+    """Consumes up to `concurrency` iterators at a time and yields their items
+    as they come, in no particular order. The queue in between holds at most
+    `queue_size` items, producers wait while the consumer is behind."""
+    queue = asyncio.Queue(maxsize=queue_size)
+    remaining = iter(iterators)
+
+    async def worker() -> None:
+        try:
+            for iterator in remaining:
+                try:
+                    async for item in iterator:
+                        await queue.put(item)
+                finally:
+                    # Stops the requests the iterator might have in flight
+                    aclose = getattr(iterator, "aclose", None)
+                    if aclose is not None:
+                        await aclose()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await queue.put(_Failure(e))
+            return
+        await queue.put(_DONE)
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(min(concurrency, len(iterators)))]
+    running = len(workers)
+    try:
+        while running:
+            item = await queue.get()
+            if item is _DONE:
+                running -= 1
+            elif isinstance(item, _Failure):
+                raise item.error
+            else:
+                yield item
+    finally:
+        for task in workers:
+            _discard(task)
+        # Let the workers clean up before the caller closes the client
+        await asyncio.gather(*workers, return_exceptions=True)
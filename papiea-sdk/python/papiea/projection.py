@@ -0,0 +1,28 @@
+from typing import List, Optional, Union
+from urllib.parse import quote
+
+# Dot separated paths of the fields to return, either as a list or comma separated
+Projection = Optional[Union[str, List[str]]]
+
+METADATA_ONLY = ["metadata"]
+
+
+def projection_fields(projection: Projection, *required: str) -> Optional[List[str]]:
+    """Normalizes the projection, adding the `required` fields (e.g. the keys
+    pagination depends on) unless they are already covered"""
+    if projection is None:
+        return None
+    fields = projection.split(",") if isinstance(projection, str) else list(projection)
+    if not fields:
+        raise ValueError("Projection has to contain at least one field")
+    for field in required:
+        if not any(field == selected or field.startswith(selected + ".") for selected in fields):
+            fields.append(field)
+    return fields
+
+
+def with_projection(url: str, fields: Optional[List[str]]) -> str:
+    if fields is None:
+        return url
+    separator = "&" if "?" in url else "?"
+    return f"{url}{separator}projection={quote(','.join(fields), safe=',.')}"
@@ -5,10 +5,13 @@ from types import TracebackType
 from typing import Any, Callable, List, NoReturn, Optional, Type, Union
 
 from aiohttp import web
+import opentracing
 from opentracing import Tracer, Format, child_of
 
 from .api import ApiInstance
+from .backpressure import HandlerLimit, limit_handler
 from .client import IntentWatcherClient, EntityCRUD
+from .compression import CompressionConfig, default_compression
 from .core import (
     DataDescription,
     Entity,
@@ -25,26 +28,62 @@ from .core import (
     ConstructorProcedureDescription,
     ConstructorResult, CreateS2SKeyRequest, AttributeDict
 )
+from .metrics import CONTENT_TYPE, MetricsRegistry, default_registry
 from .python_sdk_context import IntentfulCtx, ProceduralCtx
 from .python_sdk_exceptions import ApiException, InvocationError, SecurityApiError
+from .timeouts import deadline
 from .utils import json_loads_attrs, validate_error_codes
-from .tracing_utils import init_default_tracer, get_special_operation_name
+from .workers import WorkerPool, bind_tcp, bind_unix, make_runner, site_options
+from .tracing_utils import init_default_tracer, get_special_operation_name, reinit_tracer_after_fork
 
 BackgroundTaskCallback = Callable[[IntentfulCtx, Optional[Any]], Any]
 
 class ProviderServerManager(object):
-    def __init__(self, public_host: str = "127.0.0.1", public_port: int = 9000):
+    """Serves the provider callbacks. With `workers` above 1 the handlers run
+    in that many forked processes sharing the listening sockets, this
+    process only supervises them. Every worker has state of its own:
+    - `/metrics` is answered by whichever worker accepts the scrape, each
+      worker's counters only cover the calls it handled
+    - handler limits apply per worker, up to `workers` times
+      `max_concurrency` calls of a handler run at once
+    - tracers in `tracers` (and the global one) restart the thread reporting
+      their spans, keeping their sampler and agent settings"""
+
+    def __init__(self, public_host: str = "127.0.0.1", public_port: int = 9000,
+                 compression: Optional[CompressionConfig] = None,
+                 unix_socket_path: Optional[str] = None, listen_tcp: bool = True,
+                 handler_limit: Optional[HandlerLimit] = None, workers: int = 1,
+                 shutdown_timeout: float = 60):
         self.public_host = public_host
         self.public_port = public_port
+        # Clients running next to the provider can call it over a unix socket
+        # in addition to tcp. The callbacks registered with papiea stay on tcp,
+        # the engine cannot call providers over a unix socket
+        self.unix_socket_path = unix_socket_path
+        self.listen_tcp = listen_tcp
+        if not listen_tcp:
+            raise Exception("Provider server needs to listen on tcp, papiea cannot call providers over a unix socket")
         self.should_run = False
-        self.app = web.Application()
+        self.compression = compression or default_compression
+        self.app = web.Application(middlewares=[self.compression.middleware()])
         self._runner = None
+        # Applies to every handler registered without a limit of its own
+        self.handler_limit = handler_limit
+        # With several workers handlers run in forked processes sharing the
+        # listening sockets, this process only supervises them
+        self.workers = workers
+        self.shutdown_timeout = shutdown_timeout
+        self.worker_pool: Optional[WorkerPool] = None
+        self.tracers: List[Tracer] = []
 
     def register_handler(
-            self, route: str, handler: Callable[[web.Request], web.Response]
+            self, route: str, handler: Callable[[web.Request], web.Response], limit: Optional[HandlerLimit] = None
     ) -> None:
         if not self.should_run:
             self.should_run = True
+        limit = limit or self.handler_limit
+        if limit is not None:
+            handler = limit_handler(route, handler, limit)
         self.app.add_routes([web.post(route, handler)])
 
     def register_healthcheck(self) -> None:
@@ -56,28 +95,55 @@ class ProviderServerManager(object):
 
         self.app.add_routes([web.get("/healthcheck", healthcheck_callback_fn)])
 
+    def register_metrics(self, path: str = "/metrics", registry: Optional[MetricsRegistry] = None) -> None:
+        registry = registry or default_registry
+
+        async def metrics_callback_fn(request):
+            return web.Response(body=registry.render().encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+
+        self.app.add_routes([web.get(path, metrics_callback_fn)])
+
     async def start_server(self) -> NoReturn:
-        if self.should_run:
-            runner = web.AppRunner(self.app)
+        if self.should_run and self.workers > 1:
+            sockets = []
+            if self.listen_tcp:
+                sockets.append(bind_tcp(self.public_host, self.public_port))
+            if self.unix_socket_path is not None:
+                sockets.append(bind_unix(self.unix_socket_path))
+            self.worker_pool = WorkerPool(self.app, sockets, self.workers, self.shutdown_timeout,
+                                          on_start=self._on_worker_start)
+            self.worker_pool.start()
+        elif self.should_run:
+            runner = make_runner(self.app, self.shutdown_timeout)
             await runner.setup()
             self._runner = runner
-            site = web.TCPSite(runner, self.public_host, self.public_port)
-            await site.start()
+            if self.listen_tcp:
+                site = web.TCPSite(runner, self.public_host, self.public_port, **site_options(self.shutdown_timeout))
+                await site.start()
+            if self.unix_socket_path is not None:
+                site = web.UnixSite(runner, self.unix_socket_path, **site_options(self.shutdown_timeout))
+                await site.start()
+
+    def _on_worker_start(self) -> None:
+        tracers = {id(tracer): tracer for tracer in [opentracing.global_tracer()] + self.tracers}
+        for tracer in tracers.values():
+            reinit_tracer_after_fork(tracer)
 
     async def close(self) -> None:
+        if self.worker_pool is not None:
+            await self.worker_pool.close()
+            self.worker_pool = None
         if self._runner is not None:
             await self._runner.cleanup()
 
     def callback_url(self) -> str:
         return f"http://{self.public_host}:{self.public_port}"
 
-    def procedure_callback_url(self, procedure_name: str, kind: Optional[str]) -> str:
+    def procedure_callback_url(self, procedure_name: str, kind: Optional[str] = None) -> str:
         if kind is not None:
-            return f"http://{self.public_host}:{self.public_port}/{kind}/{procedure_name}"
+            return f"{self.callback_url()}/{kind}/{procedure_name}"
         else:
-            return (
-                f"http://{self.public_host}:{self.public_port}/{procedure_name}"
-            )
+            return f"{self.callback_url()}/{procedure_name}"
 
 
 class SecurityApi(object):
@@ -140,7 +206,8 @@ class ProviderSdk(object):
             server_manager: Optional[ProviderServerManager] = None,
             allow_extra_props: bool = False,
             logger: logging.Logger = None,
-            tracer: Tracer = init_default_tracer()
+            tracer: Tracer = init_default_tracer(),
+            **api_options
     ):
         self._version = None
         self._prefix = None
@@ -154,22 +221,36 @@ class ProviderSdk(object):
         else:
             self._server_manager = ProviderServerManager()
         self.tracer = tracer
+        self._server_manager.tracers.append(tracer)
         self._procedures = {}
         self.meta_ext = {}
         self.allow_extra_props = allow_extra_props
+        self.api_options = api_options
         self._security_api = SecurityApi(self, s2skey)
-        self._intent_watcher_client = IntentWatcherClient(papiea_url, s2skey, logger, tracer)
+        self._intent_watcher_client = IntentWatcherClient(papiea_url, s2skey, logger, tracer, **api_options)
         self._provider_api = ApiInstance(
             self.provider_url,
             headers={
                 "Content-Type": "application/json",
                 "Authorization": f"Bearer {self._s2skey}",
             },
-            logger=self.logger
+            logger=self.logger,
+            **api_options
+        )
+        # Calls made on behalf of users (e.g. permission checks) bring their own
+        # authorization, the session is shared with the provider api
+        self._entity_api = ApiInstance(
+            self.entity_url,
+            headers={
+                "Content-Type": "application/json",
+            },
+            logger=self.logger,
+            **api_options
         )
         self._oauth2 = None
         self._authModel = None
         self._policy = None
+        self._handler_timeout_secs = None
 
     async def __aenter__(self) -> "ProviderSdk":
         return self
@@ -181,6 +262,8 @@ class ProviderSdk(object):
             exc_tb: Optional[TracebackType],
     ) -> None:
         await self._provider_api.close()
+        await self._entity_api.close()
+        await self._intent_watcher_client.api_instance.close()
 
     @property
     def provider(self) -> Provider:
@@ -197,6 +280,10 @@ class ProviderSdk(object):
     def provider_api(self) -> ApiInstance:
         return self._provider_api
 
+    @property
+    def entity_api(self) -> ApiInstance:
+        return self._entity_api
+
     @property
     def entity_url(self) -> str:
         return f"{self.papiea_url}/services"
@@ -270,11 +357,22 @@ class ProviderSdk(object):
         self.meta_ext = ext
         return self
 
+    def handler_timeout(self, timeout_secs: Optional[float]) -> "ProviderSdk":
+        """Budget in seconds for the sdk calls made by a single handler
+        invocation. Papiea does not send a budget of its own along with the
+        callbacks, this is the only limit; None (the default) disables it."""
+        self._handler_timeout_secs = timeout_secs
+        return self
+
+    def callback_deadline(self) -> Optional[float]:
+        return self._handler_timeout_secs
+
     def provider_procedure(
             self,
             name: str,
             procedure_description: ProcedureDescription,
             handler: Callable[[ProceduralCtx, Any], Any],
+            limit: Optional[HandlerLimit] = None
     ) -> "ProviderSdk":
         procedure_callback_url = self._server_manager.procedure_callback_url(name)
         callback_url = self._server_manager.callback_url()
@@ -295,12 +393,13 @@ class ProviderSdk(object):
 
         async def procedure_callback_fn(req):
             try:
-                body_obj = json_loads_attrs(await req.text())
+                body_obj = json_loads_attrs(await req.read())
                 span_context = self.tracer.extract(
                     format=Format.HTTP_HEADERS,
                     carrier=req.headers,
                 )
-                with self.tracer.start_span(operation_name=f"{name}_provider_procedure_sdk", references=child_of(span_context)):
+                with self.tracer.start_span(operation_name=f"{name}_provider_procedure_sdk", references=child_of(span_context)), \
+                        deadline(self.callback_deadline()):
                     result = await handler(
                         ProceduralCtx(self, prefix, version, req.headers), body_obj
                     )
@@ -311,7 +410,7 @@ class ProviderSdk(object):
                 e = InvocationError.from_error(e, str(e))
                 return web.json_response(e.to_response(), status=e.status_code)
 
-        self._server_manager.register_handler("/" + name, procedure_callback_fn)
+        self._server_manager.register_handler("/" + name, procedure_callback_fn, limit)
         return self
 
     async def register(self) -> None:
@@ -362,10 +461,11 @@ class ProviderSdk(object):
             public_port: Optional[int],
             allow_extra_props: bool = False,
             logger: logging.Logger = logging.getLogger(__name__),
-            tracer: Tracer = init_default_tracer()
+            tracer: Tracer = init_default_tracer(),
+            **api_options
     ) -> "ProviderSdk":
         server_manager = ProviderServerManager(public_host, public_port)
-        return ProviderSdk(papiea_url, s2skey, server_manager, allow_extra_props, logger, tracer)
+        return ProviderSdk(papiea_url, s2skey, server_manager, allow_extra_props, logger, tracer, **api_options)
 
     def secure_with(
             self, oauth_config: Any, casbin_model: str, casbin_initial_policy: str
@@ -417,6 +517,7 @@ class KindBuilder:
             name: str,
             procedure_description: ProcedureDescription,
             handler: Callable[[ProceduralCtx, Entity, Any], Any],
+            limit: Optional[HandlerLimit] = None
     ) -> "KindBuilder":
         procedure_callback_url = self.server_manager.procedure_callback_url(
             name, self.kind["name"]
@@ -439,12 +540,13 @@ class KindBuilder:
 
         async def procedure_callback_fn(req):
             try:
-                body_obj = json_loads_attrs(await req.text())
+                body_obj = json_loads_attrs(await req.read())
                 span_context = self.tracer.extract(
                     format=Format.HTTP_HEADERS,
                     carrier=req.headers,
                 )
-                with self.tracer.start_span(operation_name=f"{name}_entity_procedure", references=child_of(span_context)):
+                with self.tracer.start_span(operation_name=f"{name}_entity_procedure", references=child_of(span_context)), \
+                        deadline(self.provider.callback_deadline()):
                     result = await handler(
                         ProceduralCtx(self.provider, prefix, version, req.headers),
                         Entity(
@@ -462,7 +564,7 @@ class KindBuilder:
                 return web.json_response(e.to_response(), status=e.status_code)
 
         self.server_manager.register_handler(
-            f"/{self.kind['name']}/{name}", procedure_callback_fn
+            f"/{self.kind['name']}/{name}", procedure_callback_fn, limit
         )
         return self
 
@@ -471,6 +573,7 @@ class KindBuilder:
             name: str,
             procedure_description: Union[ProcedureDescription, ConstructorProcedureDescription],
             handler: Callable[[ProceduralCtx, Any], Any],
+            limit: Optional[HandlerLimit] = None
     ) -> "KindBuilder":
         procedure_callback_url = self.server_manager.procedure_callback_url(
             name, self.kind["name"]
@@ -498,8 +601,9 @@ class KindBuilder:
                     carrier=req.headers,
                 )
                 operation_name = get_special_operation_name(name, prefix, version, self.kind.name)
-                with self.tracer.start_span(operation_name=operation_name, references=child_of(span_context)):
-                    body_obj = json_loads_attrs(await req.text())
+                with self.tracer.start_span(operation_name=operation_name, references=child_of(span_context)), \
+                        deadline(self.provider.callback_deadline()):
+                    body_obj = json_loads_attrs(await req.read())
                     result = await handler(
                         ProceduralCtx(self.provider, prefix, version, req.headers),
                         body_obj.input,
@@ -512,12 +616,13 @@ class KindBuilder:
                 return web.json_response(e.to_response(), status=e.status_code)
 
         self.server_manager.register_handler(
-            f"/{self.kind['name']}/{name}", procedure_callback_fn
+            f"/{self.kind['name']}/{name}", procedure_callback_fn, limit
         )
         return self
 
     def on(
             self, sfs_signature: str, handler: Callable[[IntentfulCtx, Entity, Any], Any],
+            limit: Optional[HandlerLimit] = None
     ) -> "KindBuilder":
         procedure_callback_url = self.server_manager.procedure_callback_url(
             sfs_signature, self.kind["name"]
@@ -564,8 +669,9 @@ class KindBuilder:
                     format=Format.HTTP_HEADERS,
                     carrier=req.headers,
                 )
-                with self.tracer.start_span(operation_name=f"{sfs_signature}_handler_procedure", references=child_of(span_context)):
-                    body_obj = json_loads_attrs(await req.text())
+                with self.tracer.start_span(operation_name=f"{sfs_signature}_handler_procedure", references=child_of(span_context)), \
+                        deadline(self.provider.callback_deadline()):
+                    body_obj = json_loads_attrs(await req.read())
                     result = await handler(
                         IntentfulCtx(self.provider, prefix, version, req.headers),
                         Entity(
@@ -583,27 +689,29 @@ class KindBuilder:
                 return web.json_response(e.to_response(), status=e.status_code)
 
         self.server_manager.register_handler(
-            f"/{self.kind['name']}/{sfs_signature}", procedure_callback_fn
+            f"/{self.kind['name']}/{sfs_signature}", procedure_callback_fn, limit
         )
         self.server_manager.register_healthcheck()
         return self
 
-    def on_create(self, description: ConstructorProcedureDescription, handler: Callable[[ProceduralCtx, Any], ConstructorResult]) -> "KindBuilder":
+    def on_create(self, description: ConstructorProcedureDescription, handler: Callable[[ProceduralCtx, Any], ConstructorResult],
+                  limit: Optional[HandlerLimit] = None) -> "KindBuilder":
         name = f"__{self.kind['name']}_create"
         if description.get("input_schema") == None:
             description["input_schema"] = self.kind['kind_structure']
         self.kind_procedure(
-            name, description, handler
+            name, description, handler, limit
         )
         return self
 
     def on_delete(
         self,
         handler: Callable[[ProceduralCtx, Any], Any],
+        limit: Optional[HandlerLimit] = None
     ) -> "KindBuilder":
         name = f"__{self.kind['name']}_delete"
         self.kind_procedure(
-            name, ProcedureDescription(), handler
+            name, ProcedureDescription(), handler, limit
         )
         return self
 
@@ -660,13 +768,13 @@ class BackgroundTaskBuilder:
     async def update_task_entity(self):
         if self.task_entity:
             async with EntityCRUD(self.provider.papiea_url, self.provider.get_prefix(), self.provider.get_version(),
-                                  self.name, self.provider.s2s_key) as client:
+                                  self.name, self.provider.s2s_key, **self.provider.api_options) as client:
                 self.task_entity = await client.get(self.task_entity.metadata)
 
     async def start_task(self):
         if self.task_entity is None:
             async with EntityCRUD(self.provider.papiea_url, self.provider.get_prefix(), self.provider.get_version(),
-                                  self.name, self.provider.s2s_key) as client:
+                                  self.name, self.provider.s2s_key, **self.provider.api_options) as client:
                 if not self.metadata_extension is None:
                     self.task_entity = await client.create({
                         "spec": {"state": json.dumps(self.BackgroundTaskState.RunningSpecState)},
@@ -685,7 +793,7 @@ class BackgroundTaskBuilder:
         else:
             await self.update_task_entity()
             async with EntityCRUD(self.provider.papiea_url, self.provider.get_prefix(), self.provider.get_version(),
-                                  self.name, self.provider.s2s_key) as client:
+                                  self.name, self.provider.s2s_key, **self.provider.api_options) as client:
                 self.task_entity = await client.update(self.task_entity.metadata,
                                                        {"spec": {"state": json.dumps(self.BackgroundTaskState.RunningSpecState)}})
             url = f"{self.provider.get_prefix()}/{self.provider.get_version()}"
@@ -702,7 +810,7 @@ class BackgroundTaskBuilder:
         else:
             await self.update_task_entity()
             async with EntityCRUD(self.provider.papiea_url, self.provider.get_prefix(), self.provider.get_version(),
-                                  self.name, self.provider.s2s_key) as client:
+                                  self.name, self.provider.s2s_key, **self.provider.api_options) as client:
                 self.task_entity = await client.update(self.task_entity.metadata,
                                                        {"spec": {"state": json.dumps(self.BackgroundTaskState.IdleSpecState)}})
             url = f"{self.provider.get_prefix()}/{self.provider.get_version()}"
@@ -719,7 +827,7 @@ class BackgroundTaskBuilder:
         else:
             await self.update_task_entity()
             async with EntityCRUD(self.provider.papiea_url, self.provider.get_prefix(), self.provider.get_version(),
-                                  self.name, self.provider.s2s_key) as client:
+                                  self.name, self.provider.s2s_key, **self.provider.api_options) as client:
                 await client.delete(self.task_entity.metadata)
 
     @staticmethod
@@ -1,7 +1,5 @@
-import json
 from typing import Any, List, Optional, Tuple
 from deprecated import deprecated
-from aiohttp import ClientSession
 from multidict import CIMultiDict
 
 from .client import EntityCRUD
@@ -36,6 +34,7 @@ class ProceduralCtx(object):
             entity_reference.kind,
             self.get_invoking_token(),
             self.provider.logger,
+            **self.provider.api_options
         )
 
     async def check_permission(
@@ -68,15 +67,11 @@ class ProceduralCtx(object):
         headers: dict = {},
     ) -> bool:
         try:
-            data_binary = json.dumps(entity_action).encode("utf-8")
-            async with ClientSession() as session:
-                async with session.post(
-                    f"{ self.base_url }/{ provider_prefix }/{ provider_version }/check_permission",
-                    data=data_binary,
-                    headers=headers,
-                ) as resp:
-                    res = await resp.text()
-            res = json.loads(res)
+            res = await self.provider.entity_api.post(
+                f"{ provider_prefix }/{ provider_version }/check_permission",
+                entity_action,
+                headers=headers,
+            )
             return res["success"] == "Ok"
         except Exception as e:
             return False
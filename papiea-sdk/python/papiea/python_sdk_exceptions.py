@@ -1,23 +1,28 @@
-import json
 import logging
 from typing import Any, List, Optional
 
 from aiohttp import ClientResponse
 
 from papiea.core import PapieaError
+from papiea.json_codec import JsonCodec
 from papiea.utils import json_loads_attrs
 
 
 class ApiException(Exception):
-    def __init__(self, status: int, details: str):
-        super().__init__(details.error.message)
+    def __init__(self, status: int, details: Any):
+        try:
+            message = details.error.message
+        except (AttributeError, KeyError, TypeError):
+            # Not a papiea error, e.g. a 502 page from a proxy in front of papiea
+            message = str(details)
+        super().__init__(message)
         self.status = status
         self.details = details
 
 
-async def check_response(resp: ClientResponse, logger: logging.Logger):
+async def check_response(resp: ClientResponse, logger: logging.Logger, codec: Optional[JsonCodec] = None):
     if resp.status >= 400:
-        await PapieaBaseException.raise_error(resp, logger)
+        await PapieaBaseException.raise_error(resp, logger, codec)
 
 
 class PapieaBaseException(Exception):
@@ -29,15 +34,15 @@ class PapieaBaseException(Exception):
         self.details = details
 
     @staticmethod
-    async def raise_error(resp: ClientResponse, logger: logging.Logger):
-        details = await resp.text()
+    async def raise_error(resp: ClientResponse, logger: logging.Logger, codec: Optional[JsonCodec] = None):
+        details = await resp.read()
         try:
-            details = json_loads_attrs(details)
+            details = json_loads_attrs(details, codec)
             logger.error(f"Got exception while making request. Status: {resp.status},"
                          f" Details: {details}")
         except:
             logger.error(f"Got exception while making request. Status: {resp.status}")
-            raise ApiException(resp.status, details)
+            raise ApiException(resp.status, details.decode("utf-8", errors="replace"))
         raise ApiException(resp.status, details)
 
 
@@ -75,6 +80,17 @@ class PapieaServerException(PapieaBaseException):
     pass
 
 
+class DeadlineExceededException(Exception):
+    pass
+
+
+class CircuitOpenException(Exception):
+    def __init__(self, family: str, retry_in_secs: float):
+        super().__init__(f"Circuit for {family} requests is open, retry in {retry_in_secs:.1f}s")
+        self.family = family
+        self.retry_in_secs = retry_in_secs
+
+
 class InvocationError(Exception):
     def __init__(
             self,
@@ -118,11 +134,31 @@ class SecurityApiError(InvocationError):
 
 EXCEPTION_MAP = {
     PapieaError.ConflictingEntity.value: ConflictingEntityException,
+    PapieaError.SpecConflictingEntity.value: ConflictingEntityException,
+    PapieaError.StatusConflictingEntity.value: ConflictingEntityException,
     PapieaError.EntityNotFound.value: EntityNotFoundException,
     PapieaError.PermissionDenied.value: PermissionDeniedException,
     PapieaError.ProcedureInvocation.value: ProcedureInvocationException,
     PapieaError.Unauthorized.value: UnauthorizedException,
     PapieaError.Validation.value: ValidationException,
     PapieaError.BadRequest.value: BadRequestException,
-    PapieaError.ServerError.value: PapieaServerException
+    PapieaError.ServerError.value: PapieaServerException,
+    PapieaError.OnActionError.value: OnActionException
 }
+
+
+def typed_exception(e: BaseException) -> BaseException:
+    """Returns the exception from EXCEPTION_MAP matching the papiea error type
+    of an ApiException, other exceptions are returned as is"""
+    if not isinstance(e, ApiException):
+        return e
+    try:
+        exception_class = EXCEPTION_MAP.get(e.details.error.type)
+    except (AttributeError, KeyError, TypeError):
+        return e
+    if exception_class is None:
+        return e
+    typed = exception_class(str(e), None, e.details)
+    typed.status = e.status
+    typed.__cause__ = e
+    return typed
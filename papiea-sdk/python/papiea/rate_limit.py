@@ -0,0 +1,115 @@
+import asyncio
+import time
+from collections import deque
+from types import TracebackType
+from typing import Optional, Type, Union
+
+
+class ConcurrencyLimiter(object):
+    """Caps the number of requests in flight. Unlike asyncio.Semaphore waiters
+    are served strictly in arrival order, a freed slot is handed over to the
+    longest waiting request so newcomers cannot jump the queue.
+    Can be shared between several clients to cap requests across them."""
+
+    def __init__(self, max_in_flight: int):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight should be at least 1")
+        self.max_in_flight = max_in_flight
+        self._in_flight = 0
+        self._waiters = deque()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> None:
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._in_flight += 1
+            return
+        # Futures are created on the loop of the waiting request,
+        # so a limiter can be created outside of any loop
+        waiter = asyncio.get_event_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over right before the cancellation, pass it on
+                self.release()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._in_flight -= 1
+
+    async def __aenter__(self) -> "ConcurrencyLimiter":
+        await self.acquire()
+        return self
+
+    async def __aexit__(
+            self,
+            exc_type: Optional[Type[BaseException]],
+            exc_val: Optional[BaseException],
+            exc_tb: Optional[TracebackType],
+    ) -> None:
+        self.release()
+
+
+class TokenBucket(object):
+    """Limits requests to `rate_per_sec` on average with bursts of up to `burst`
+    requests. Every request reserves the next free token on arrival and sleeps
+    until it is due, so waiting requests are served in arrival order.
+    Can be shared between several clients to limit requests across them."""
+
+    def __init__(self, rate_per_sec: float, burst: Optional[int] = None):
+        if rate_per_sec <= 0:
+            raise ValueError("rate_per_sec should be positive")
+        self.rate_per_sec = rate_per_sec
+        self.burst = burst or max(1, int(rate_per_sec))
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate_per_sec)
+        self._updated_at = now
+
+    @property
+    def available(self) -> float:
+        self._refill()
+        return max(self._tokens, 0)
+
+    async def acquire(self) -> None:
+        self._refill()
+        # Tokens go negative while requests are queued, each one waits for its own token
+        self._tokens -= 1
+        if self._tokens >= 0:
+            return
+        try:
+            await asyncio.sleep(-self._tokens / self.rate_per_sec)
+        except asyncio.CancelledError:
+            self._tokens += 1
+            raise
+
+
+def concurrency_limiter(value: Union[int, ConcurrencyLimiter, None]) -> Optional[ConcurrencyLimiter]:
+    # Plain numbers give the client a limiter of its own
+    if value is None or isinstance(value, ConcurrencyLimiter):
+        return value
+    return ConcurrencyLimiter(value)
+
+
+def rate_limiter(value: Union[float, TokenBucket, None]) -> Optional[TokenBucket]:
+    if value is None or isinstance(value, TokenBucket):
+        return value
+    return TokenBucket(value)
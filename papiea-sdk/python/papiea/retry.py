@@ -0,0 +1,93 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Iterable, Optional
+
+from aiohttp import ClientConnectorError, ClientOSError, ClientPayloadError, ServerDisconnectedError
+
+from .python_sdk_exceptions import ApiException
+
+IDEMPOTENT_METHODS = ("get", "put", "delete")
+RETRYABLE_STATUSES = (502, 503, 504)
+
+
+class RetryBudget(object):
+    """Caps retries to a fraction of the requests made in the last `ttl_secs`,
+    so that a struggling papiea is not hit with a multiple of its normal load."""
+
+    def __init__(self, ratio: float = 0.2, min_retries_per_sec: float = 10, ttl_secs: float = 10):
+        self.ratio = ratio
+        self.min_retries_per_sec = min_retries_per_sec
+        self.ttl_secs = ttl_secs
+        self._requests = deque()
+        self._retries = deque()
+
+    def _expire(self, now: float) -> None:
+        for window in (self._requests, self._retries):
+            while window and window[0] < now - self.ttl_secs:
+                window.popleft()
+
+    def record_request(self) -> None:
+        now = time.monotonic()
+        self._expire(now)
+        self._requests.append(now)
+
+    def try_withdraw(self) -> bool:
+        now = time.monotonic()
+        self._expire(now)
+        allowed = self.min_retries_per_sec * self.ttl_secs + self.ratio * len(self._requests)
+        if len(self._retries) >= allowed:
+            return False
+        self._retries.append(now)
+        return True
+
+
+class RetryPolicy(object):
+    def __init__(
+            self,
+            max_attempts: int = 3,
+            backoff_base_secs: float = 0.1,
+            backoff_max_secs: float = 2,
+            jitter: bool = True,
+            idempotent_methods: Iterable[str] = IDEMPOTENT_METHODS,
+            retryable_statuses: Iterable[int] = RETRYABLE_STATUSES,
+            budget: Optional[RetryBudget] = None
+    ):
+        self.max_attempts = max_attempts
+        self.backoff_base_secs = backoff_base_secs
+        self.backoff_max_secs = backoff_max_secs
+        self.jitter = jitter
+        self.idempotent_methods = set(idempotent_methods)
+        self.retryable_statuses = set(retryable_statuses)
+        self.budget = budget or RetryBudget()
+
+    def is_retryable(self, method: str, e: BaseException) -> bool:
+        # Request never left the client, it is safe to resend whatever the method is
+        if isinstance(e, ClientConnectorError):
+            return True
+        if method not in self.idempotent_methods:
+            return False
+        if isinstance(e, ApiException):
+            return e.status in self.retryable_statuses
+        # Connection resets, dropped keep-alive connections, timeouts
+        return isinstance(e, (ServerDisconnectedError, ClientOSError, ClientPayloadError, asyncio.TimeoutError))
+
+    def should_retry(self, method: str, e: BaseException, attempt: int) -> bool:
+        if attempt + 1 >= self.max_attempts:
+            return False
+        if not self.is_retryable(method, e):
+            return False
+        return self.budget.try_withdraw()
+
+    def backoff(self, attempt: int) -> float:
+        delay = min(self.backoff_max_secs, self.backoff_base_secs * (2 ** attempt))
+        if self.jitter:
+            # "Full jitter", spreads retries of concurrent callers
+            return random.uniform(0, delay)
+        return delay
+
+
+NO_RETRY = RetryPolicy(max_attempts=1)
+
+default_retry_policy = RetryPolicy()
@@ -0,0 +1,80 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Any, Callable, Iterator, Optional, Union
+
+from aiohttp import ClientTimeout
+
+from .python_sdk_exceptions import DeadlineExceededException
+
+# Absolute time.monotonic() value after which no more requests should be made
+_deadline = ContextVar("papiea_deadline", default=None)
+
+
+class Timeout(object):
+    """Timeouts of a single request in seconds, None disables the respective timeout"""
+
+    def __init__(
+            self,
+            total: Optional[float] = 120,
+            connect: Optional[float] = 10,
+            read: Optional[float] = 60
+    ):
+        self.total = total
+        self.connect = connect
+        self.read = read
+
+    @staticmethod
+    def from_value(value: Union["Timeout", float, None]) -> Optional["Timeout"]:
+        # Plain numbers are a total timeout in seconds, wherever a timeout is
+        # given (ApiInstance or per call)
+        if value is None or isinstance(value, Timeout):
+            return value
+        return Timeout(total=value, connect=min(value, 10), read=value)
+
+    def to_client_timeout(self) -> ClientTimeout:
+        total = self.total
+        remaining = remaining_time()
+        if remaining is not None:
+            if remaining <= 0:
+                raise DeadlineExceededException("Deadline exceeded before the request could be made")
+            total = remaining if total is None else min(total, remaining)
+        return ClientTimeout(total=total, connect=self.connect, sock_read=self.read)
+
+
+# Either a Timeout or a plain number of seconds
+RequestTimeout = Union[Timeout, float, None]
+
+
+def remaining_time() -> Optional[float]:
+    deadline_at = _deadline.get()
+    if deadline_at is None:
+        return None
+    return deadline_at - time.monotonic()
+
+
+@contextmanager
+def deadline(timeout_secs: Optional[float]) -> Iterator[None]:
+    """Caps every papiea request made inside the block (including the ones
+    made from tasks spawned inside it) to the given budget. Nested deadlines
+    can only shorten the budget of the enclosing one."""
+    if timeout_secs is None:
+        yield
+        return
+    deadline_at = time.monotonic() + timeout_secs
+    current = _deadline.get()
+    if current is not None:
+        deadline_at = min(deadline_at, current)
+    token = _deadline.set(deadline_at)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def run_without_deadline(func: Callable[..., Any], *args: Any) -> Any:
+    """Calls `func` outside of the current deadline, tasks it creates do not
+    inherit the deadline either. Everything else in the context is kept."""
+    context = copy_context()
+    context.run(_deadline.set, None)
+    return context.run(func, *args)
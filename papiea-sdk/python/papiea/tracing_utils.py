@@ -1,13 +1,22 @@
+import os
+import random
+import time
+from typing import Any, Dict
+
+import jaeger_client
 import opentracing
 from jaeger_client import Config
+from jaeger_client.local_agent_net import LocalAgentSender
+from jaeger_client.reporter import BaseReporter, CompositeReporter, Reporter
+from jaeger_client.sampler import RemoteControlledSampler, Sampler
 from opentracing import Tracer, Format, Span
 
 from papiea.api import ApiInstance
 import re
 
 
-def init_default_tracer() -> Tracer:
-    config = Config(
+def default_tracer_config() -> Config:
+    return Config(
         config={
             'sampler': {
                 'type': 'const',
@@ -21,14 +30,71 @@ def init_default_tracer() -> Tracer:
         service_name='papiea-sdk-python',
         validate=True,
     )
+
+
+def init_default_tracer() -> Tracer:
     # this call also sets opentracing.tracer
-    tracer = config.initialize_tracer()
+    tracer = default_tracer_config().initialize_tracer()
     if tracer:
         return tracer
     else:
         return opentracing.global_tracer()
 
 
+def _restart_channel(channel: Any, restarted: Dict[int, Any]) -> Any:
+    # The agent channel runs its io loop in a thread, which forked processes lack
+    if isinstance(channel, LocalAgentSender) and id(channel) not in restarted:
+        channel.io_loop = channel._create_new_thread_loop()
+        restarted[id(channel)] = channel
+    return channel
+
+
+def _restart_reporter(tracer: jaeger_client.Tracer, reporter: BaseReporter, restarted: Dict[int, Any]) -> BaseReporter:
+    if isinstance(reporter, CompositeReporter):
+        return CompositeReporter(*[_restart_reporter(tracer, child, restarted) for child in reporter.reporters])
+    if not isinstance(reporter, Reporter):
+        return reporter
+    fresh = Reporter(
+        channel=_restart_channel(reporter._channel, restarted),
+        queue_capacity=reporter.queue_capacity,
+        batch_size=reporter.batch_size,
+        flush_interval=getattr(reporter, "flush_interval", None),
+        error_reporter=reporter.error_reporter,
+        metrics_factory=reporter.metrics_factory,
+        logger=reporter.logger
+    )
+    fresh.set_process(tracer.service_name, tracer.tags, tracer.max_tag_value_length)
+    return fresh
+
+
+def _restart_sampler(sampler: Sampler, restarted: Dict[int, Any]) -> Sampler:
+    # Other samplers have no background polling and keep working as they are
+    if not isinstance(sampler, RemoteControlledSampler):
+        return sampler
+    return RemoteControlledSampler(
+        channel=_restart_channel(sampler._channel, restarted),
+        service_name=sampler.service_name,
+        logger=sampler.logger,
+        metrics_factory=sampler.metrics_factory,
+        error_reporter=sampler.error_reporter,
+        sampling_refresh_interval=sampler.sampling_refresh_interval,
+        init_sampler=sampler.sampler,
+        max_operations=sampler.max_operations
+    )
+
+
+def reinit_tracer_after_fork(tracer: Tracer) -> None:
+    """A forked process neither gets the thread a jaeger tracer reports its
+    spans from nor span ids of its own. Restarts the reporter and a remote
+    controlled sampler with their own settings and reseeds the ids."""
+    if not isinstance(tracer, jaeger_client.Tracer):
+        return
+    restarted: Dict[int, Any] = {}
+    tracer.reporter = _restart_reporter(tracer, tracer.reporter, restarted)
+    tracer.sampler = _restart_sampler(tracer.sampler, restarted)
+    tracer.random = random.Random(time.time() * os.getpid())
+
+
 def inject_tracing_headers(tracer: Tracer, span: Span, api_instance: ApiInstance):
     http_header_carrier = {}
     tracer.inject(
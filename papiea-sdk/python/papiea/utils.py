@@ -1,14 +1,11 @@
-import json
-from typing import Any, Optional
+from typing import Any, Optional, Union
 
-from .core import AttributeDict, ErrorSchemas
+from .core import ErrorSchemas
+from .json_codec import JsonCodec, default_codec
 
 
-def json_loads_attrs(s: str) -> Any:
-    def object_hook(obj):
-        return AttributeDict(obj)
-
-    return json.loads(s, object_hook=object_hook)
+def json_loads_attrs(s: Union[bytes, str], codec: Optional[JsonCodec] = None) -> Any:
+    return (codec or default_codec).loads_attrs(s)
 
 
 def validate_error_codes(error_schemas: Optional[ErrorSchemas]):
@@ -0,0 +1,246 @@
+import asyncio
+import base64
+import json
+import logging
+import zlib
+from collections import OrderedDict
+from enum import Enum
+from types import TracebackType
+from typing import AsyncGenerator, Callable, Dict, List, Optional, Set, Tuple, Type
+from uuid import uuid4
+
+from .core import Entity
+
+DEFAULT_WATCH_INTERVAL_SECS = 5
+MAX_WATCH_RETRY_DELAY_SECS = 60
+
+# Changes carried by the resume token itself, past that the state is checkpointed to the store
+MAX_TOKEN_CHANGES = 100
+
+_TOKEN_VERSION = 2
+
+Version = Tuple[int, Optional[str]]
+
+
+class WatchEventType(str, Enum):
+    Created = "created"
+    Updated = "updated"
+    StatusChanged = "status_changed"
+    Deleted = "deleted"
+
+
+class WatchEvent(object):
+    def __init__(self, type: WatchEventType, uuid: str, entity: Optional[Entity]):
+        self.type = type
+        self.uuid = uuid
+        # None for deleted entities
+        self.entity = entity
+
+    def __repr__(self) -> str:
+        return f"WatchEvent({self.type.value}, {self.uuid})"
+
+
+class WatchStateStore(object):
+    """Keeps the checkpointed states resume tokens refer to. This store keeps
+    the latest `max_states` in memory, so its tokens only resume watches of
+    the same process. Subclasses saving them elsewhere (a file, a database)
+    make tokens usable across restarts."""
+
+    def __init__(self, max_states: int = 64):
+        self.max_states = max_states
+        self._states: "OrderedDict[str, Dict[str, Version]]" = OrderedDict()
+
+    def save(self, key: str, versions: Dict[str, Version]) -> None:
+        self._states[key] = dict(versions)
+        self._states.move_to_end(key)
+        while len(self._states) > self.max_states:
+            self._states.popitem(last=False)
+
+    def load(self, key: str) -> Optional[Dict[str, Version]]:
+        versions = self._states.get(key)
+        return dict(versions) if versions is not None else None
+
+    def delete(self, key: str) -> None:
+        self._states.pop(key, None)
+
+
+default_watch_state_store = WatchStateStore()
+
+
+class WatchState(object):
+    """The spec version and status hash of every entity seen by a watch,
+    which is all it takes to tell the changes of the next scan apart.
+
+    Tokens only hold the key of the last checkpoint saved to the store and
+    the changes made since, at most MAX_TOKEN_CHANGES of them."""
+
+    def __init__(self, store: WatchStateStore, versions: Optional[Dict[str, Version]] = None):
+        self.store = store
+        self.versions = versions or {}
+        # None stands for the empty state, no need to save that one
+        self.checkpoint: Optional[str] = None
+        # Changes since the checkpoint, already json encoded for the token
+        self.changes: Dict[str, str] = {}
+        self._token: Optional[str] = None
+        self._saved: List[str] = []
+
+    def to_token(self) -> str:
+        # Only rebuilt after a change, reading it after every event is cheap
+        if self._token is None:
+            payload = f'{{"v":{_TOKEN_VERSION},"checkpoint":{json.dumps(self.checkpoint)},' \
+                      f'"changes":[{",".join(self.changes.values())}]}}'
+            self._token = base64.urlsafe_b64encode(zlib.compress(payload.encode(), 1)).decode()
+        return self._token
+
+    @staticmethod
+    def from_token(token: str, store: WatchStateStore) -> "WatchState":
+        try:
+            payload = json.loads(zlib.decompress(base64.urlsafe_b64decode(token.encode())))
+        except (ValueError, zlib.error) as e:
+            raise ValueError(f"Invalid watch resume token: {e}") from e
+        if payload.get("v") != _TOKEN_VERSION:
+            raise ValueError(f"Unsupported watch resume token version: {payload.get('v')}")
+        versions = {}
+        if payload["checkpoint"] is not None:
+            versions = store.load(payload["checkpoint"])
+            if versions is None:
+                raise ValueError("The watch state of the resume token is no longer available")
+        state = WatchState(store, {uuid: tuple(version) for uuid, version in versions.items()})
+        state.checkpoint = payload["checkpoint"]
+        for uuid, version in payload["changes"]:
+            state._record(uuid, tuple(version) if version is not None else None)
+        return state
+
+    def apply(self, entity: Entity) -> Optional[WatchEventType]:
+        """Records the entity, returning the kind of change since it was last seen if any"""
+        uuid = entity.metadata.uuid
+        version = (entity.metadata.spec_version, entity.metadata.get("status_hash"))
+        previous = self.versions.get(uuid)
+        if previous == version:
+            return None
+        self._record(uuid, version)
+        if previous is None:
+            return WatchEventType.Created
+        if previous[0] != version[0]:
+            return WatchEventType.Updated
+        return WatchEventType.StatusChanged
+
+    def remove(self, uuid: str) -> None:
+        self._record(uuid, None)
+
+    def _record(self, uuid: str, version: Optional[Version]) -> None:
+        if version is None:
+            self.versions.pop(uuid, None)
+        else:
+            self.versions[uuid] = version
+        # None marks deleted entities
+        self.changes[uuid] = json.dumps([uuid, version], separators=(",", ":"))
+        self._token = None
+        if len(self.changes) >= MAX_TOKEN_CHANGES:
+            self._save_checkpoint()
+
+    def _save_checkpoint(self) -> None:
+        key = uuid4().hex
+        self.store.save(key, self.versions)
+        self.checkpoint = key
+        self.changes = {}
+        self._token = None
+        # Tokens handed out before this checkpoint may still be saved by the
+        # caller, the one before it is kept as well
+        self._saved.append(key)
+        while len(self._saved) > 2:
+            self.store.delete(self._saved.pop(0))
+
+
+class EntityWatch(object):
+    """Yields the changes to the entities returned by `scan` by rescanning
+    them every `interval_secs` and comparing against what was seen before.
+    Failed scans are retried with a growing delay, the iterator only ends
+    when closed.
+
+    `resume_token` reflects every event yielded so far, a watch started
+    again from it neither replays nor misses any change, as long as
+    `state_store` still has the checkpoint it refers to. Changes reverted
+    between two scans are not seen, neither are intermediate versions."""
+
+    def __init__(
+            self,
+            scan: Callable[[], AsyncGenerator[Entity, None]],
+            interval_secs: float = DEFAULT_WATCH_INTERVAL_SECS,
+            resume_token: Optional[str] = None,
+            emit_existing: bool = True,
+            state_store: Optional[WatchStateStore] = None,
+            logger: logging.Logger = logging.getLogger(__name__)
+    ):
+        self.scan = scan
+        self.interval_secs = interval_secs
+        self.logger = logger
+        store = state_store or default_watch_state_store
+        self.state = WatchState.from_token(resume_token, store) if resume_token is not None else WatchState(store)
+        # Without a token the entities existing at start are reported as created,
+        # unless the caller only cares about what changes from now on
+        self._silent_round = resume_token is None and not emit_existing
+        self._events = self._watch()
+
+    @property
+    def resume_token(self) -> str:
+        return self.state.to_token()
+
+    def __aiter__(self) -> "EntityWatch":
+        return self
+
+    async def __anext__(self) -> WatchEvent:
+        return await self._events.__anext__()
+
+    async def __aenter__(self) -> "EntityWatch":
+        return self
+
+    async def __aexit__(
+            self,
+            exc_type: Optional[Type[BaseException]],
+            exc_val: Optional[BaseException],
+            exc_tb: Optional[TracebackType],
+    ) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._events.aclose()
+
+    async def _watch(self) -> AsyncGenerator[WatchEvent, None]:
+        failures = 0
+        while True:
+            changes = self._scan_changes()
+            try:
+                async for event in changes:
+                    yield event
+                failures = 0
+                delay = self.interval_secs
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Events of the entities scanned before the failure were already
+                # yielded and recorded, the next scan picks up from there
+                failures += 1
+                delay = min(self.interval_secs * 2 ** failures, MAX_WATCH_RETRY_DELAY_SECS)
+                self.logger.warning(f"Watch scan failed ({failures} in a row), retrying in {delay:.1f}s: {e!r}")
+            finally:
+                await changes.aclose()
+            await asyncio.sleep(delay)
+
+    async def _scan_changes(self) -> AsyncGenerator[WatchEvent, None]:
+        seen: Set[str] = set()
+        entities = self.scan()
+        try:
+            async for entity in entities:
+                seen.add(entity.metadata.uuid)
+                event_type = self.state.apply(entity)
+                if event_type is not None and not self._silent_round:
+                    yield WatchEvent(event_type, entity.metadata.uuid, entity)
+        finally:
+            await entities.aclose()
+        # Only a complete scan tells which entities are gone
+        for uuid in [uuid for uuid in self.state.versions if uuid not in seen]:
+            self.state.remove(uuid)
+            if not self._silent_round:
+                yield WatchEvent(WatchEventType.Deleted, uuid, None)
+        self._silent_round = False
@@ -0,0 +1,77 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .core import IntentfulStatus, IntentWatcher
+
+
+class WatcherPoller(object):
+    """Polls every watcher currently awaited through it in one background
+    loop, refreshing them with one `fetch` per `chunk_size` watchers every
+    `interval_secs`. The cost of polling depends on the number of ticks
+    and watchers, not on how many coroutines wait on them."""
+
+    def __init__(
+            self,
+            fetch: Callable[[List[str]], Awaitable[List[IntentWatcher]]],
+            interval_secs: float = 0.5,
+            chunk_size: int = 100,
+            logger: logging.Logger = logging.getLogger(__name__)
+    ):
+        self.fetch = fetch
+        self.interval_secs = interval_secs
+        self.chunk_size = chunk_size
+        self.logger = logger
+        self._waiters: Dict[str, List[Tuple[IntentfulStatus, asyncio.Future]]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.ticks = 0
+
+    @property
+    def watching(self) -> int:
+        return len(self._waiters)
+
+    async def wait(self, uuid: str, watcher_status: IntentfulStatus, timeout_secs: float) -> IntentWatcher:
+        """Returns the watcher once it reaches the status, raises asyncio.TimeoutError
+        if it did not in `timeout_secs`"""
+        waiter = (watcher_status, asyncio.get_running_loop().create_future())
+        self._waiters.setdefault(uuid, []).append(waiter)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        try:
+            return await asyncio.wait_for(waiter[1], timeout_secs)
+        finally:
+            waiters = self._waiters.get(uuid)
+            if waiters is not None:
+                waiters.remove(waiter)
+                if not waiters:
+                    del self._waiters[uuid]
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while self._waiters:
+            uuids = list(self._waiters)
+            chunks = [uuids[i:i + self.chunk_size] for i in range(0, len(uuids), self.chunk_size)]
+            results = await asyncio.gather(*[self.fetch(chunk) for chunk in chunks], return_exceptions=True)
+            self.ticks += 1
+            for chunk, result in zip(chunks, results):
+                if isinstance(result, BaseException):
+                    # Requests are already retried by the api instance, the waiters decide what to do
+                    self.logger.debug(f"Failed to refresh {len(chunk)} intent watchers: {result!r}")
+                    for uuid in chunk:
+                        for _, future in self._pending(uuid):
+                            future.set_exception(result)
+                    continue
+                for watcher in result:
+                    for watcher_status, future in self._pending(watcher.uuid):
+                        if watcher.status == watcher_status:
+                            future.set_result(watcher)
+            await asyncio.sleep(self.interval_secs)
+
+    def _pending(self, uuid: str) -> List[Tuple[IntentfulStatus, asyncio.Future]]:
+        return [(watcher_status, future) for watcher_status, future in self._waiters.get(uuid, [])
+                if not future.done()]
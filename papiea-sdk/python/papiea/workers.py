@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import stat
+import time
+from typing import Callable, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+# Workers crashing sooner than this after starting are restarted with a growing delay
+MIN_WORKER_UPTIME_SECS = 10
+MAX_RESTART_DELAY_SECS = 30
+
+# aiohttp takes the shutdown timeout on the runner from 3.9 on, older versions on every site
+_RUNNER_SHUTDOWN_TIMEOUT = tuple(int(part) for part in aiohttp.__version__.split(".")[:2]) >= (3, 9)
+
+
+def make_runner(app: web.Application, shutdown_timeout: float) -> web.AppRunner:
+    if _RUNNER_SHUTDOWN_TIMEOUT:
+        return web.AppRunner(app, shutdown_timeout=shutdown_timeout)
+    return web.AppRunner(app)
+
+
+def site_options(shutdown_timeout: float) -> dict:
+    return {} if _RUNNER_SHUTDOWN_TIMEOUT else {"shutdown_timeout": shutdown_timeout}
+
+
+def bind_tcp(host: str, port: int, backlog: int = 128) -> socket.socket:
+    family, type_, proto, _, address = socket.getaddrinfo(
+        host, port, type=socket.SOCK_STREAM, flags=socket.AI_PASSIVE
+    )[0]
+    sock = socket.socket(family, type_, proto)
+    try:
+        # Same as asyncio, a restarted provider can listen again right away
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(address)
+        sock.listen(backlog)
+    except OSError:
+        sock.close()
+        raise
+    sock.set_inheritable(True)
+    return sock
+
+
+def bind_unix(path: str, backlog: int = 128) -> socket.socket:
+    # Same as asyncio, a socket file left behind by a previous run is replaced
+    try:
+        if stat.S_ISSOCK(os.stat(path).st_mode):
+            os.remove(path)
+    except FileNotFoundError:
+        pass
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+async def _serve(app: web.Application, sockets: List[socket.socket], shutdown_timeout: float) -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+    runner = make_runner(app, shutdown_timeout)
+    await runner.setup()
+    try:
+        for sock in sockets:
+            await web.SockSite(runner, sock, **site_options(shutdown_timeout)).start()
+        await stop.wait()
+    finally:
+        # Stops accepting and lets the handlers running finish
+        await runner.cleanup()
+
+
+def _run_worker(app: web.Application, sockets: List[socket.socket], shutdown_timeout: float,
+                on_start: Optional[Callable[[], None]]) -> None:
+    if on_start is not None:
+        on_start()
+    # The child starts off inside the parent's running loop, asyncio
+    # ignores loops of other processes so a fresh one can be run
+    asyncio.run(_serve(app, sockets, shutdown_timeout))
+
+
+class WorkerPool(object):
+    """Runs `app` in `workers` forked processes, all accepting connections
+    on the same listening sockets. The parent only supervises: workers
+    that die are started again, and on close they are asked to stop
+    (SIGTERM) and given `shutdown_timeout` to finish the calls in progress.
+    `on_start` runs in every worker right after the fork, e.g. to restart
+    background threads, which forked processes do not inherit."""
+
+    def __init__(
+            self,
+            app: web.Application,
+            sockets: List[socket.socket],
+            workers: int,
+            shutdown_timeout: float = 60,
+            check_interval_secs: float = 1,
+            on_start: Optional[Callable[[], None]] = None,
+            logger: logging.Logger = logging.getLogger(__name__)
+    ):
+        if workers < 1:
+            raise ValueError("workers should be at least 1")
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise Exception("Multiple provider workers need fork, which is not available on this platform")
+        self.app = app
+        self.sockets = sockets
+        self.workers = workers
+        self.shutdown_timeout = shutdown_timeout
+        self.check_interval_secs = check_interval_secs
+        self.on_start = on_start
+        self.logger = logger
+        self.restarts = 0
+        self._context = multiprocessing.get_context("fork")
+        self._processes: List[Optional[multiprocessing.Process]] = [None] * workers
+        self._started_at = [0.0] * workers
+        self._restart_delays = [0.0] * workers
+        self._restart_at = [0.0] * workers
+        self._supervisor: Optional[asyncio.Task] = None
+
+    @property
+    def pids(self) -> List[int]:
+        return [process.pid for process in self._processes if process is not None and process.is_alive()]
+
+    def start(self) -> None:
+        for index in range(self.workers):
+            self._spawn(index)
+        self._supervisor = asyncio.ensure_future(self._supervise())
+
+    def _spawn(self, index: int) -> None:
+        process = self._context.Process(
+            target=_run_worker, args=(self.app, self.sockets, self.shutdown_timeout, self.on_start),
+            name=f"papiea-provider-worker-{index}", daemon=True
+        )
+        process.start()
+        self._processes[index] = process
+        self._started_at[index] = time.monotonic()
+        self.logger.debug(f"Started provider worker {index} with pid {process.pid}")
+
+    async def _supervise(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval_secs)
+            now = time.monotonic()
+            for index, process in enumerate(self._processes):
+                if process is None or process.is_alive():
+                    continue
+                if not self._restart_at[index]:
+                    uptime = now - self._started_at[index]
+                    if uptime < MIN_WORKER_UPTIME_SECS:
+                        delay = min(max(self._restart_delays[index] * 2, self.check_interval_secs),
+                                    MAX_RESTART_DELAY_SECS)
+                    else:
+                        delay = 0
+                    self._restart_delays[index] = delay
+                    self._restart_at[index] = now + delay
+                    self.logger.error(f"Provider worker {index} (pid {process.pid}) exited with code"
+                                      f" {process.exitcode}, restarting it in {delay:.1f}s")
+                if now >= self._restart_at[index]:
+                    self._restart_at[index] = 0
+                    process.close()
+                    self._spawn(index)
+                    self.restarts += 1
+
+    async def close(self) -> None:
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+            await asyncio.gather(self._supervisor, return_exceptions=True)
+            self._supervisor = None
+        processes = [process for process in self._processes if process is not None]
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        loop = asyncio.get_event_loop()
+        deadline = time.monotonic() + self.shutdown_timeout + 5
+        for process in processes:
+            await loop.run_in_executor(None, process.join, max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                self.logger.error(f"Provider worker with pid {process.pid} did not stop in time, killing it")
+                process.kill()
+                await loop.run_in_executor(None, process.join)
+        self._processes = [None] * self.workers
+        for sock in self.sockets:
+            sock.close()
@@ -28,4 +28,8 @@ setuptools.setup(
     ],
     python_requires=">=3.7",
     install_requires=["aiohttp>=3.6.2", "jaeger-client>=4.4.0"],
+    extras_require={
+        "orjson": ["orjson>=3.4.0"],
+        "ujson": ["ujson>=4.0.0"],
+    },
 )
@@ -0,0 +1,102 @@
+import asyncio
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from papiea.backpressure import QUEUE_FULL, WAIT_TIMEOUT, HandlerLimit, HandlerMetrics, limit_handler
+from papiea.metrics import MetricsRegistry
+from papiea.python_sdk import ProviderServerManager
+
+from .local_server import serve, serve_app
+
+ROUTE = "/kind/procedure"
+
+
+class SlowHandler(object):
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self, request: web.Request) -> web.Response:
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await self.release.wait()
+            return web.json_response({"ok": True})
+        finally:
+            self.running -= 1
+
+
+async def call(session, url, route=ROUTE):
+    async with session.post(url + route, json={}) as resp:
+        return resp.status, resp.headers.get("Retry-After"), await resp.json()
+
+
+async def wait_until(condition):
+    while not condition():
+        await asyncio.sleep(0.005)
+
+
+class TestHandlerLimit:
+    def test_invalid_limits(self):
+        with pytest.raises(ValueError):
+            HandlerLimit(0)
+        with pytest.raises(ValueError):
+            HandlerLimit(1, max_queue=-1)
+
+    @pytest.mark.asyncio
+    async def test_queue_full_gets_429(self):
+        handler = SlowHandler()
+        metrics = HandlerMetrics(MetricsRegistry())
+        limited = limit_handler(ROUTE, handler, HandlerLimit(2, max_queue=1, retry_after_secs=2.5), metrics)
+        async with serve([web.post(ROUTE, limited)]) as url:
+            async with aiohttp.ClientSession() as session:
+                calls = [asyncio.ensure_future(call(session, url)) for _ in range(3)]
+                await wait_until(lambda: metrics.queue_depth.get((ROUTE,)) == 1)
+                status, retry_after, body = await call(session, url)
+                assert status == 429
+                assert retry_after == "3"
+                assert body["error"]["status_code"] == 429
+                handler.release.set()
+                assert [result[0] for result in await asyncio.gather(*calls)] == [200] * 3
+        assert handler.max_running == 2
+        assert metrics.rejected.get((ROUTE, QUEUE_FULL)) == 1
+        assert metrics.wait.count((ROUTE,)) == 1
+        assert metrics.in_flight.get((ROUTE,)) == 0
+
+    @pytest.mark.asyncio
+    async def test_long_wait_gets_503(self):
+        handler = SlowHandler()
+        metrics = HandlerMetrics(MetricsRegistry())
+        limited = limit_handler(ROUTE, handler, HandlerLimit(1, max_wait_secs=0.05), metrics)
+        async with serve([web.post(ROUTE, limited)]) as url:
+            async with aiohttp.ClientSession() as session:
+                first = asyncio.ensure_future(call(session, url))
+                await wait_until(lambda: handler.running == 1)
+                status, retry_after, _ = await call(session, url)
+                assert status == 503
+                assert retry_after == "1"
+                handler.release.set()
+                assert (await first)[0] == 200
+        assert metrics.rejected.get((ROUTE, WAIT_TIMEOUT)) == 1
+        assert metrics.queue_depth.get((ROUTE,)) == 0
+
+    @pytest.mark.asyncio
+    async def test_server_manager_default_limit(self):
+        handler = SlowHandler()
+        manager = ProviderServerManager(handler_limit=HandlerLimit(1, max_queue=0))
+        manager.register_handler(ROUTE, handler)
+        manager.register_handler("/unlimited", handler, HandlerLimit(10))
+        async with serve_app(manager.app) as url:
+            async with aiohttp.ClientSession() as session:
+                first = asyncio.ensure_future(call(session, url))
+                await wait_until(lambda: handler.running == 1)
+                assert (await call(session, url))[0] == 429
+                # Handlers registered with a limit of their own are not affected
+                other = asyncio.ensure_future(call(session, url, "/unlimited"))
+                await wait_until(lambda: handler.running == 2)
+                handler.release.set()
+                assert (await first)[0] == 200
+                assert (await other)[0] == 200
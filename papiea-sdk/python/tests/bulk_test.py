@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from papiea.bulk import collect_report, run_bulk
+from papiea.client import EntityCRUD
+from papiea.core import AttributeDict
+from papiea.python_sdk_exceptions import ConflictingEntityException, EntityNotFoundException
+
+from .local_server import serve
+
+
+class TestRunBulk:
+    @pytest.mark.asyncio
+    async def test_failures_do_not_stop_other_items(self):
+        async def operation(item):
+            await asyncio.sleep(0.001 * (item % 3))
+            if item % 4 == 0:
+                raise ValueError(item)
+            return item * 2
+
+        report = await collect_report(run_bulk(range(20), operation, concurrency=3), keep_results=True)
+        assert report.to_dict() == {"total": 20, "succeeded": 15, "failed": 5, "errors_by_type": {"ValueError": 5}}
+        assert sorted(failure.index for failure in report.failures) == [0, 4, 8, 12, 16]
+        assert all(result.result == result.item * 2 for result in report.results)
+
+    @pytest.mark.asyncio
+    async def test_results_kept_only_on_request(self):
+        async def operation(item):
+            return item
+
+        report = await collect_report(run_bulk([1, 2, 3], operation))
+        assert report.succeeded == 3
+        assert report.results == []
+
+    @pytest.mark.asyncio
+    async def test_inputs_are_pulled_lazily(self):
+        pulled = 0
+        running = 0
+        max_running = 0
+
+        async def items():
+            nonlocal pulled
+            for i in range(50):
+                pulled += 1
+                yield i
+
+        async def operation(item):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.001)
+            running -= 1
+
+        results = run_bulk(items(), operation, concurrency=4)
+        await results.__anext__()
+        assert pulled <= 5
+        await results.aclose()
+
+        await collect_report(run_bulk(items(), operation, concurrency=4))
+        assert max_running == 4
+
+    @pytest.mark.asyncio
+    async def test_closing_early_cancels_items_in_flight(self):
+        cancelled = 0
+
+        async def operation(item):
+            nonlocal cancelled
+            try:
+                await asyncio.sleep(0 if item == 0 else 10)
+            except asyncio.CancelledError:
+                cancelled += 1
+                raise
+
+        results = run_bulk(range(10), operation, concurrency=4)
+        assert (await results.__anext__()).index == 0
+        await results.aclose()
+        # Items 1 to 3 were still running
+        assert cancelled == 3
+
+    @pytest.mark.asyncio
+    async def test_cancellation_is_not_an_item_error(self):
+        async def operation(item):
+            if item == 1:
+                raise asyncio.CancelledError()
+            await asyncio.sleep(0)
+            return item
+
+        with pytest.raises(asyncio.CancelledError):
+            await collect_report(run_bulk(range(3), operation))
+
+
+class TestBulkEntities:
+    @pytest.mark.asyncio
+    async def test_bulk_create_reports_typed_errors(self):
+        created = []
+
+        async def create(request: web.Request) -> web.Response:
+            payload = await request.json()
+            if payload["spec"]["name"] in created:
+                return web.json_response({"error": {"type": "conflicting_entity_error", "message": "exists"}},
+                                         status=409)
+            created.append(payload["spec"]["name"])
+            return web.json_response({"metadata": {"uuid": payload["spec"]["name"]}, "spec": payload["spec"]})
+
+        async def delete(request: web.Request) -> web.Response:
+            return web.json_response({"error": {"type": "entity_not_found_error", "message": "gone"}}, status=404)
+
+        payloads = [{"spec": {"name": name}} for name in ["a", "b", "a", "c"]]
+        async with serve([web.post("/services/p/1/k/", create), web.delete("/services/p/1/k/{uuid}", delete)]) as url:
+            async with EntityCRUD(url, "p", "1", "k") as client:
+                report = await client.bulk_create(payloads, concurrency=1)
+                assert report.to_dict()["succeeded"] == 3
+                assert report.failures[0].index == 2
+                assert isinstance(report.failures[0].error, ConflictingEntityException)
+                assert report.failures[0].error.status == 409
+
+                report = await client.bulk_delete([AttributeDict(uuid="a")])
+                assert isinstance(report.failures[0].error, EntityNotFoundException)
@@ -0,0 +1,106 @@
+import logging
+import time
+
+import pytest
+from aiohttp import web
+
+from papiea.api import ApiInstance
+from papiea.circuit_breaker import (CircuitBreaker, CircuitBreakerRegistry, CircuitState, ENTITY_CRUD, FILTER,
+                                    INTENT_WATCHER, PROCEDURE, UPDATE_STATUS, route_family)
+from papiea.connection_pool import SessionRegistry
+from papiea.python_sdk_exceptions import ApiException, CircuitOpenException
+from papiea.retry import NO_RETRY
+
+from .local_server import serve
+
+logger = logging.getLogger(__name__)
+
+UNAVAILABLE = ApiException(503, "unavailable")
+
+
+class TestCircuitBreaker:
+    def test_route_families(self):
+        assert route_family("http://papiea/services/p/1/k/uuid") == ENTITY_CRUD
+        assert route_family("http://papiea/services/p/1/k/filter?limit=10") == FILTER
+        assert route_family("http://papiea/services/p/1/k/uuid/procedure/restart") == PROCEDURE
+        assert route_family("http://papiea/provider/update_status") == UPDATE_STATUS
+        assert route_family("http://papiea/services/intent_watcher/filter") == INTENT_WATCHER
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker("test", failure_threshold=3)
+        for _ in range(2):
+            breaker.record(UNAVAILABLE)
+        # A success resets the streak
+        breaker.record(None)
+        for _ in range(2):
+            breaker.record(UNAVAILABLE)
+        assert breaker.state == CircuitState.Closed
+        breaker.record(UNAVAILABLE)
+        assert breaker.state == CircuitState.Open
+        with pytest.raises(CircuitOpenException) as excinfo:
+            breaker.before_request()
+        assert excinfo.value.family == "test"
+        assert breaker.rejected == 1
+
+    def test_client_errors_are_not_failures(self):
+        breaker = CircuitBreaker("test", failure_threshold=1)
+        breaker.record(ApiException(404, "not found"))
+        breaker.record(ApiException(409, "conflict"))
+        assert breaker.state == CircuitState.Closed
+
+    def test_half_open_probes(self):
+        breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout_secs=0.05, success_threshold=2)
+        breaker.record(UNAVAILABLE)
+        assert breaker.state == CircuitState.Open
+        time.sleep(0.06)
+        assert breaker.state == CircuitState.HalfOpen
+        breaker.before_request()
+        # Only one probe at a time
+        with pytest.raises(CircuitOpenException):
+            breaker.before_request()
+        breaker.record(None)
+        breaker.before_request()
+        breaker.record(None)
+        assert breaker.state == CircuitState.Closed
+
+        breaker.record(UNAVAILABLE)
+        time.sleep(0.06)
+        breaker.before_request()
+        breaker.record(UNAVAILABLE)
+        assert breaker.state == CircuitState.Open
+        assert breaker.times_opened == 3
+
+    def test_abandoned_probe_frees_its_slot(self):
+        breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout_secs=0)
+        breaker.record(UNAVAILABLE)
+        breaker.before_request()
+        breaker.on_abandoned()
+        breaker.before_request()
+
+    def test_registry_keeps_one_breaker_per_family(self):
+        registry = CircuitBreakerRegistry(failure_threshold=1)
+        breaker = registry.breaker_for("http://papiea/services/p/1/k/a")
+        assert registry.breaker_for("http://papiea/services/p/1/k/b") is breaker
+        assert registry.breaker_for("http://papiea/services/p/1/k/filter") is not breaker
+        breaker.record(UNAVAILABLE)
+        assert registry.states() == {ENTITY_CRUD: CircuitState.Open, FILTER: CircuitState.Closed}
+
+    @pytest.mark.asyncio
+    async def test_open_circuit_fails_fast(self):
+        calls = 0
+
+        async def failing(request: web.Request) -> web.Response:
+            nonlocal calls
+            calls += 1
+            return web.json_response({"error": {"message": "unavailable"}}, status=503)
+
+        registry = CircuitBreakerRegistry(failure_threshold=2, recovery_timeout_secs=60)
+        async with serve([web.get("/services/p/1/k/{uuid}", failing)]) as url:
+            async with ApiInstance(f"{url}/services/p/1/k", logger=logger, session_registry=SessionRegistry(),
+                                   retry_policy=NO_RETRY, circuit_breakers=registry) as api:
+                for _ in range(2):
+                    with pytest.raises(ApiException):
+                        await api.get("a")
+                with pytest.raises(CircuitOpenException):
+                    await api.get("a")
+        assert calls == 2
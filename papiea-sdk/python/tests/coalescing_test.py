@@ -0,0 +1,102 @@
+import asyncio
+import logging
+
+import pytest
+from aiohttp import web
+
+from papiea.api import ApiInstance
+from papiea.coalescing import RequestCoalescer
+from papiea.connection_pool import SessionRegistry
+from papiea.core import AttributeDict
+from papiea.python_sdk_exceptions import DeadlineExceededException
+from papiea.timeouts import deadline, remaining_time
+
+from .local_server import serve
+
+logger = logging.getLogger(__name__)
+
+
+class TestCoalescing:
+    @pytest.mark.asyncio
+    async def test_concurrent_callers_share_one_request(self):
+        coalescer = RequestCoalescer()
+        calls = 0
+
+        async def request():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return AttributeDict(spec=AttributeDict(x=1))
+
+        results = await asyncio.gather(*[coalescer.run("key", request) for _ in range(5)])
+        assert calls == 1
+        assert coalescer.stats.to_dict() == {"requests": 1, "hits": 4, "collapsed": 1}
+        # Every caller gets its own copy
+        results[0].spec.x = 2
+        assert all(result.spec.x == 1 for result in results[1:])
+
+        await coalescer.run("key", request)
+        assert calls == 2
+
+    @pytest.mark.asyncio
+    async def test_failure_reaches_every_caller(self):
+        coalescer = RequestCoalescer()
+
+        async def request():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(*[coalescer.run("key", request) for _ in range(3)], return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+
+    @pytest.mark.asyncio
+    async def test_cancelled_first_caller_does_not_cancel_request(self):
+        coalescer = RequestCoalescer()
+
+        async def request():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        first = asyncio.ensure_future(coalescer.run("key", request))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(coalescer.run("key", request))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == "done"
+
+    @pytest.mark.asyncio
+    async def test_first_caller_deadline_is_not_shared(self):
+        coalescer = RequestCoalescer()
+
+        async def request():
+            assert remaining_time() is None
+            await asyncio.sleep(0.2)
+            return "done"
+
+        async def short():
+            with deadline(0.05):
+                return await coalescer.run("key", request)
+
+        results = await asyncio.gather(short(), coalescer.run("key", request), return_exceptions=True)
+        assert isinstance(results[0], DeadlineExceededException)
+        assert results[1] == "done"
+
+    @pytest.mark.asyncio
+    async def test_api_instance_collapses_identical_gets(self):
+        calls = 0
+
+        async def get_entity(request: web.Request) -> web.Response:
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return web.json_response({"uuid": request.match_info["uuid"]})
+
+        async with serve([web.get("/{uuid}", get_entity)]) as url:
+            coalescer = RequestCoalescer()
+            registry = SessionRegistry()
+            async with ApiInstance(url, logger=logger, session_registry=registry, coalescer=coalescer) as api, \
+                    ApiInstance(url, headers={"Authorization": "Bearer other"}, logger=logger,
+                                session_registry=registry, coalescer=coalescer) as other_user:
+                await asyncio.gather(*[api.get("a") for _ in range(5)], api.get("b"), other_user.get("a"))
+        # Different urls and different credentials are never collapsed
+        assert calls == 3
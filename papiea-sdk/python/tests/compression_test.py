@@ -0,0 +1,78 @@
+import gzip
+import logging
+
+import pytest
+from aiohttp import ClientSession, web
+
+from papiea.api import ApiInstance
+from papiea.compression import CompressionConfig
+from papiea.connection_pool import SessionRegistry
+
+from .local_server import serve_app
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION = CompressionConfig(compress_requests=True, request_threshold_bytes=1024,
+                                response_threshold_bytes=1024)
+
+
+async def get_blob(request: web.Request) -> web.Response:
+    return web.json_response({"blob": "x" * int(request.match_info["size"])})
+
+
+class EchoRequests(object):
+    def __init__(self):
+        self.encodings = []
+
+    async def echo(self, request: web.Request) -> web.Response:
+        self.encodings.append(request.headers.get("Content-Encoding"))
+        return web.json_response(await request.json())
+
+
+def make_app(echo: EchoRequests) -> web.Application:
+    app = web.Application(middlewares=[COMPRESSION.middleware()])
+    app.add_routes([web.get("/blob/{size}", get_blob), web.post("/echo", echo.echo)])
+    return app
+
+
+class TestCompression:
+    @pytest.mark.asyncio
+    async def test_responses_compressed_above_threshold(self):
+        async with serve_app(make_app(EchoRequests())) as url:
+            async with ClientSession(auto_decompress=False) as session:
+                async with session.get(f"{url}/blob/10", headers={"Accept-Encoding": "gzip"}) as resp:
+                    assert "Content-Encoding" not in resp.headers
+                async with session.get(f"{url}/blob/4096", headers={"Accept-Encoding": "gzip"}) as resp:
+                    assert resp.headers["Content-Encoding"] == "gzip"
+                    assert len(await resp.read()) < 1024
+                # Only callers accepting compression get it
+                async with session.get(f"{url}/blob/4096", headers={"Accept-Encoding": "identity"}) as resp:
+                    assert "Content-Encoding" not in resp.headers
+
+    @pytest.mark.asyncio
+    async def test_api_instance_decodes_responses(self):
+        async with serve_app(make_app(EchoRequests())) as url:
+            async with ApiInstance(url, logger=logger, session_registry=SessionRegistry(),
+                                   compression=COMPRESSION) as api:
+                assert (await api.get("blob/4096")).blob == "x" * 4096
+
+    @pytest.mark.asyncio
+    async def test_requests_compressed_above_threshold(self):
+        echo = EchoRequests()
+        async with serve_app(make_app(echo)) as url:
+            async with ApiInstance(url, logger=logger, session_registry=SessionRegistry(),
+                                   compression=COMPRESSION) as api:
+                assert (await api.post("echo", {"blob": "x"})).blob == "x"
+                assert (await api.post("echo", {"blob": "x" * 4096})).blob == "x" * 4096
+        assert echo.encodings == [None, "gzip"]
+
+    @pytest.mark.asyncio
+    async def test_server_decodes_compressed_requests(self):
+        echo = EchoRequests()
+        async with serve_app(make_app(echo)) as url:
+            async with ClientSession() as session:
+                body = gzip.compress(b'{"blob": "compressed"}')
+                async with session.post(f"{url}/echo", data=body, headers={"Content-Encoding": "gzip",
+                                                                           "Content-Type": "application/json"}) as resp:
+                    assert await resp.json() == {"blob": "compressed"}
+        assert echo.encodings == ["gzip"]
@@ -0,0 +1,119 @@
+import logging
+
+import pytest
+from aiohttp import web
+from multidict import CIMultiDict
+
+from papiea.api import ApiInstance
+from papiea.connection_pool import ConnectionPoolConfig, SessionRegistry, split_unix_url
+from papiea.core import Action, EntityReference
+from papiea.python_sdk import ProviderSdk
+from papiea.python_sdk_context import ProceduralCtx
+
+from .local_server import serve
+
+logger = logging.getLogger(__name__)
+
+
+async def get_entity(request: web.Request) -> web.Response:
+    return web.json_response({"uuid": request.match_info["uuid"], "peer": request.transport.get_extra_info("peername")})
+
+
+async def check_permission(request: web.Request) -> web.Response:
+    allowed = request.headers["Authorization"] == "Bearer user"
+    return web.json_response({"success": "Ok" if allowed else "Denied"})
+
+
+class TestConnectionPool:
+    def test_split_unix_url(self):
+        assert split_unix_url("unix://%2Fvar%2Frun%2Fpapiea.sock/services") == \
+               ("/var/run/papiea.sock", "http://localhost/services")
+        assert split_unix_url("http://127.0.0.1:3000/services") == (None, "http://127.0.0.1:3000/services")
+
+    @pytest.mark.asyncio
+    async def test_instances_share_session_per_origin(self):
+        registry = SessionRegistry()
+        first = ApiInstance("http://127.0.0.1:3000/services/a", logger=logger, session_registry=registry)
+        second = ApiInstance("http://127.0.0.1:3000/services/b", logger=logger, session_registry=registry)
+        other = ApiInstance("http://127.0.0.1:3001/services/a", logger=logger, session_registry=registry)
+        try:
+            assert first.session is second.session
+            assert first.session is not other.session
+        finally:
+            await first.close()
+            await second.close()
+            await other.close()
+
+    @pytest.mark.asyncio
+    async def test_session_closed_with_last_user(self):
+        registry = SessionRegistry()
+        first = ApiInstance("http://127.0.0.1:3000/a", logger=logger, session_registry=registry)
+        second = ApiInstance("http://127.0.0.1:3000/b", logger=logger, session_registry=registry)
+        session = first.session
+        assert second.session is session
+        await first.close()
+        assert not session.closed
+        await second.close()
+        assert session.closed
+
+    @pytest.mark.asyncio
+    async def test_requests_reuse_connections(self):
+        registry = SessionRegistry()
+        async with serve([web.get("/entity/{uuid}", get_entity)]) as url:
+            first = ApiInstance(f"{url}/entity", logger=logger, session_registry=registry)
+            second = ApiInstance(f"{url}/entity", logger=logger, session_registry=registry)
+            try:
+                peers = set()
+                for i in range(5):
+                    for api, prefix in ((first, "a"), (second, "b")):
+                        res = await api.get(f"{prefix}{i}")
+                        assert res.uuid == f"{prefix}{i}"
+                        peers.add(tuple(res.peer))
+                # Sequential requests of both instances go over the one pooled connection
+                assert len(peers) == 1
+            finally:
+                await first.close()
+                await second.close()
+
+    @pytest.mark.asyncio
+    async def test_renewed_session_waits_for_requests_in_flight(self):
+        registry = SessionRegistry()
+        api = ApiInstance("http://127.0.0.1:3000/a", logger=logger, session_registry=registry)
+        pooled = api.pooled_session
+        old_session = pooled.checkout()
+        await api.renew_session(old_session)
+        assert api.session is not old_session
+        assert not old_session.closed
+        await pooled.checkin(old_session)
+        assert old_session.closed
+        await api.close()
+
+    @pytest.mark.asyncio
+    async def test_conflicting_pool_config(self):
+        registry = SessionRegistry()
+        first = ApiInstance("http://127.0.0.1:3000/a", logger=logger, session_registry=registry,
+                            pool_config=ConnectionPoolConfig(limit=10))
+        same = ApiInstance("http://127.0.0.1:3000/b", logger=logger, session_registry=registry,
+                           pool_config=ConnectionPoolConfig(limit=10))
+        default = ApiInstance("http://127.0.0.1:3000/c", logger=logger, session_registry=registry)
+        other = ApiInstance("http://127.0.0.1:3000/d", logger=logger, session_registry=registry,
+                            pool_config=ConnectionPoolConfig(limit=20))
+        try:
+            assert same.session is first.session
+            assert default.session is first.session
+            with pytest.raises(ValueError):
+                other.session
+        finally:
+            for api in (first, same, default, other):
+                await api.close()
+
+    @pytest.mark.asyncio
+    async def test_permission_check_uses_pooled_session(self):
+        registry = SessionRegistry()
+        async with serve([web.post("/services/p/1/check_permission", check_permission)]) as url:
+            async with ProviderSdk(url, "provider-key", logger=logger, session_registry=registry) as sdk:
+                entity_action = [(Action.Read, EntityReference(uuid="e", kind="k"))]
+                ctx = ProceduralCtx(sdk, "p", "1", CIMultiDict(Authorization="Bearer user"))
+                assert await ctx.check_permission(entity_action)
+                assert not await ctx.check_permission(entity_action, user_token="other")
+                assert sdk.entity_api.session is sdk.provider_api.session
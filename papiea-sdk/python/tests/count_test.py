@@ -0,0 +1,33 @@
+import pytest
+from aiohttp import web
+
+from papiea.client import COUNT_OFFSET, EntityCRUD
+from papiea.core import AttributeDict
+
+from .local_server import FakeFilter, serve
+
+ENTITIES = [{"metadata": {"uuid": f"{i:03d}"}, "spec": {"size": i % 2}} for i in range(5)]
+
+
+class TestCount:
+    @pytest.mark.asyncio
+    async def test_count_returns_no_entities(self):
+        fake = FakeFilter(ENTITIES)
+        async with serve([web.post("/services/p/1/k/filter", fake.handle)]) as url:
+            async with EntityCRUD(url, "p", "1", "k") as client:
+                assert await client.count({"spec": {"size": 1}}) == 2
+                assert await client.count({"spec": {"size": 5}}) == 0
+        for query, _ in fake.requests:
+            # The offset is past any result and still a safe integer for papiea
+            assert query == {"offset": str(2 ** 53 - 1), "limit": "1"}
+        assert COUNT_OFFSET == 2 ** 53 - 1
+
+    @pytest.mark.asyncio
+    async def test_exists(self):
+        fake = FakeFilter(ENTITIES)
+        async with serve([web.post("/services/p/1/k/filter", fake.handle)]) as url:
+            async with EntityCRUD(url, "p", "1", "k") as client:
+                assert await client.exists(AttributeDict(uuid="003"))
+                assert not await client.exists(AttributeDict(uuid="missing"))
+        assert [filter_obj for _, filter_obj in fake.requests] == \
+               [{"metadata": {"uuid": "003"}}, {"metadata": {"uuid": "missing"}}]
@@ -0,0 +1,155 @@
+import asyncio
+import time
+
+import pytest
+from aiohttp import web
+
+from papiea.client import EntityCRUD
+from papiea.core import AttributeDict
+from papiea.entity_cache import EntityCache
+
+from .local_server import FakeFilter, serve
+
+
+def entity(uuid, spec_version=1, **spec):
+    return AttributeDict(metadata=AttributeDict(uuid=uuid, spec_version=spec_version), spec=AttributeDict(spec))
+
+
+class TestEntityCache:
+    def test_lookup_returns_copies(self):
+        cache = EntityCache()
+        cache.put("a", entity("a", x=1))
+        cached, fresh = cache.lookup("a")
+        assert fresh and cached.spec.x == 1
+        cached.spec.x = 2
+        assert cache.lookup("a")[0].spec.x == 1
+        assert cache.lookup("b") == (None, False)
+        assert cache.stats.to_dict()["hits"] == 2
+        assert cache.stats.to_dict()["misses"] == 1
+
+    def test_expired_entries_are_not_fresh(self):
+        cache = EntityCache(ttl_secs=0.01)
+        cache.put("a", entity("a"))
+        time.sleep(0.02)
+        cached, fresh = cache.lookup("a")
+        assert cached is not None and not fresh
+        cache.revalidated("a")
+        assert cache.lookup("a")[1]
+
+    def test_lru_eviction_by_entries(self):
+        cache = EntityCache(max_entries=2)
+        cache.put("a", entity("a"))
+        cache.put("b", entity("b"))
+        cache.lookup("a")
+        cache.put("c", entity("c"))
+        assert cache.lookup("b")[0] is None
+        assert cache.lookup("a")[0] is not None
+        assert cache.stats.evictions == 1
+
+    def test_eviction_by_size(self):
+        cache = EntityCache(max_bytes=100, size_of=lambda cached: cached.spec.size)
+        cache.put("a", entity("a", size=60))
+        cache.put("b", entity("b", size=30))
+        assert cache.size_bytes == 90
+        cache.put("c", entity("c", size=30))
+        assert len(cache) == 2
+        assert cache.size_bytes == 60
+        # Too large to be cached at all
+        cache.put("d", entity("d", size=101))
+        assert cache.lookup("d")[0] is None
+        assert len(cache) == 2
+
+    def test_scopes_are_separate(self):
+        cache = EntityCache()
+        cache.put("a", entity("a", owner="alice"), scope="alice")
+        assert cache.lookup("a", "bob")[0] is None
+        cache.put("a", entity("a", owner="bob"), scope="bob")
+        assert cache.lookup("a", "alice")[0].spec.owner == "alice"
+        cache.invalidate("a")
+        assert cache.lookup("a", "alice")[0] is None
+        assert cache.lookup("a", "bob")[0] is None
+        assert len(cache) == 0
+        assert cache.size_bytes == 0
+
+    def test_put_racing_invalidation_is_dropped(self):
+        cache = EntityCache()
+        generation = cache.generation()
+        cache.invalidate("a")
+        cache.put("a", entity("a", spec_version=1), generation)
+        assert cache.lookup("a")[0] is None
+        # Other keys are not affected
+        cache.put("b", entity("b"), generation)
+        assert cache.lookup("b")[0] is not None
+        cache.put("a", entity("a", spec_version=2), cache.generation())
+        assert cache.lookup("a")[0].metadata.spec_version == 2
+
+    def test_forgotten_invalidations_drop_older_puts(self):
+        cache = EntityCache(max_entries=2)
+        generation = cache.generation()
+        for key in ("a", "b", "c"):
+            cache.invalidate(key)
+        # The invalidation of "a" is no longer tracked, any older put might be stale
+        cache.put("a", entity("a"), generation)
+        assert cache.lookup("a")[0] is None
+        cache.clear()
+        cache.put("a", entity("a"), generation)
+        assert cache.lookup("a")[0] is None
+
+
+class TestCachedEntityCRUD:
+    @pytest.mark.asyncio
+    async def test_get_is_cached_per_credentials(self):
+        gets = []
+        entities = [entity("a", owner="alice")]
+
+        async def get_entity(request: web.Request) -> web.Response:
+            gets.append(request.headers.get("Authorization"))
+            return web.json_response(entities[0])
+
+        fake = FakeFilter(entities)
+        cache = EntityCache(ttl_secs=0.2)
+        routes = [web.get("/services/p/1/k/{uuid}", get_entity), web.post("/services/p/1/k/filter", fake.handle)]
+        async with serve(routes) as url:
+            async with EntityCRUD(url, "p", "1", "k", s2skey="alice", cache=cache) as alice, \
+                    EntityCRUD(url, "p", "1", "k", s2skey="bob", cache=cache) as bob:
+                reference = AttributeDict(uuid="a")
+                await alice.get(reference)
+                await alice.get(reference)
+                assert gets == ["Bearer alice"]
+                await bob.get(reference)
+                assert gets == ["Bearer alice", "Bearer bob"]
+
+                await asyncio.sleep(0.2)
+                # Expired but unchanged, revalidated with a count instead of fetched again
+                await alice.get(reference)
+                assert len(gets) == 2
+                assert cache.stats.revalidated == 1
+
+                entities[0] = entity("a", spec_version=2, owner="alice")
+                await asyncio.sleep(0.2)
+                assert (await alice.get(reference)).metadata.spec_version == 2
+                assert cache.stats.stale == 1
+
+    @pytest.mark.asyncio
+    async def test_update_during_get_is_not_cached(self):
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def get_entity(request: web.Request) -> web.Response:
+            started.set()
+            await release.wait()
+            return web.json_response(entity("a", spec_version=1))
+
+        async def update_entity(request: web.Request) -> web.Response:
+            return web.json_response({})
+
+        cache = EntityCache()
+        routes = [web.get("/services/p/1/k/{uuid}", get_entity), web.put("/services/p/1/k/{uuid}", update_entity)]
+        async with serve(routes) as url:
+            async with EntityCRUD(url, "p", "1", "k", cache=cache) as client:
+                get = asyncio.ensure_future(client.get(AttributeDict(uuid="a")))
+                await started.wait()
+                await client.update(AttributeDict(uuid="a", spec_version=1), {"x": 2})
+                release.set()
+                await get
+        assert cache.lookup(("p", "1", "k", "a"))[0] is None
@@ -0,0 +1,44 @@
+import pytest
+from aiohttp import web
+
+from papiea.client import EntityCRUD
+from papiea.core import AttributeDict
+
+from .local_server import FakeFilter, serve
+
+ENTITIES = [{"metadata": {"uuid": f"{i:03d}", "kind": "k"}, "spec": {"size": i}} for i in range(10)]
+
+
+def ref(uuid):
+    return AttributeDict(uuid=uuid, kind="k")
+
+
+class TestGetMany:
+    @pytest.mark.asyncio
+    async def test_uuids_are_requested_in_chunks(self):
+        fake = FakeFilter(ENTITIES)
+        async with serve([web.post("/services/p/1/k/filter", fake.handle)]) as url:
+            async with EntityCRUD(url, "p", "1", "k") as client:
+                uuids = [f"{i:03d}" for i in range(8)]
+                entities = await client.get_many([ref(uuid) for uuid in uuids], chunk_size=3)
+        assert [entity.metadata.uuid for entity in entities] == uuids
+        chunks = sorted(filter_obj["metadata"]["uuid"]["$in"] for _, filter_obj in fake.requests)
+        assert chunks == [uuids[0:3], uuids[3:6], uuids[6:8]]
+        # Every chunk asks for all of its entities, not papiea's default page
+        assert sorted(query["limit"] for query, _ in fake.requests) == ["2", "3", "3"]
+
+    @pytest.mark.asyncio
+    async def test_results_follow_the_references(self):
+        fake = FakeFilter(ENTITIES)
+        async with serve([web.post("/services/p/1/k/filter", fake.handle)]) as url:
+            async with EntityCRUD(url, "p", "1", "k") as client:
+                refs = [ref("007"), ref("missing"), ref("002"), ref("007")]
+                entities = await client.get_many(refs, chunk_size=2)
+                assert await client.get_many([]) == []
+        assert entities[0].spec.size == 7
+        assert entities[1] is None
+        assert entities[2].spec.size == 2
+        assert entities[3].spec.size == 7
+        # Repeated references are only requested once
+        assert sorted(uuid for _, filter_obj in fake.requests for uuid in filter_obj["metadata"]["uuid"]["$in"]) == \
+               ["002", "007", "missing"]
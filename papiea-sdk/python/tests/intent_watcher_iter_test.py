@@ -0,0 +1,51 @@
+import pytest
+from aiohttp import web
+
+from papiea.client import IntentWatcherClient
+from papiea.core import IntentfulStatus
+from papiea.pagination import KEYSET_MODE
+
+from .local_server import FakeFilter, serve
+
+WATCHERS = [{"uuid": f"{i:03d}", "created_at": f"2026-01-01T00:00:{59 - i:02d}Z",
+             "status": IntentfulStatus.Pending if i % 2 else IntentfulStatus.Completed_Successfully}
+            for i in range(40)]
+
+
+class TestIntentWatcherIter:
+    @pytest.mark.asyncio
+    async def test_sorted_with_limit(self):
+        fake = FakeFilter(WATCHERS)
+        async with serve([web.post("/services/intent_watcher/filter", fake.handle)]) as url:
+            async with IntentWatcherClient(url) as client:
+                iter_func = await client.filter_iter({"status": IntentfulStatus.Pending}, sort="created_at:asc",
+                                                     limit=7)
+                found = [watcher.uuid async for watcher in iter_func(batch_size=5)]
+        pending = sorted((w for w in WATCHERS if w["status"] == IntentfulStatus.Pending),
+                         key=lambda w: w["created_at"])
+        assert found == [w["uuid"] for w in pending[:7]]
+        # Nothing past the limit is requested
+        assert [(query["offset"], query["limit"]) for query, _ in fake.requests] == [("", "5"), ("5", "5")]
+        assert all(query["sort"] == "created_at:asc" for query, _ in fake.requests)
+
+    @pytest.mark.asyncio
+    async def test_page_size_capped_by_limit(self):
+        fake = FakeFilter(WATCHERS)
+        async with serve([web.post("/services/intent_watcher/filter", fake.handle)]) as url:
+            async with IntentWatcherClient(url) as client:
+                iter_func = await client.list_iter(limit=3)
+                assert len([watcher async for watcher in iter_func()]) == 3
+        assert [query["limit"] for query, _ in fake.requests] == ["3"]
+
+    @pytest.mark.asyncio
+    async def test_keyset_mode(self):
+        fake = FakeFilter(WATCHERS)
+        async with serve([web.post("/services/intent_watcher/filter", fake.handle)]) as url:
+            async with IntentWatcherClient(url) as client:
+                iter_func = await client.list_iter(mode=KEYSET_MODE)
+                found = [watcher.uuid async for watcher in iter_func(batch_size=15)]
+                assert found == [w["uuid"] for w in WATCHERS]
+                assert all(query["sort"] == "uuid:asc" for query, _ in fake.requests)
+                # Keyset pages are always sorted by their key
+                with pytest.raises(ValueError):
+                    await client.list_iter(mode=KEYSET_MODE, sort="created_at:desc")
@@ -0,0 +1,111 @@
+import asyncio
+import time
+
+import pytest
+from aiohttp import web
+
+from papiea.client import IntentWatcherClient
+from papiea.core import AttributeDict, IntentfulStatus
+
+from .local_server import FakeFilter, serve
+
+
+def watcher(uuid, status=IntentfulStatus.Pending):
+    return {"uuid": uuid, "status": status,
+            "entity_ref": {"uuid": "e", "kind": "k", "provider_prefix": "p", "provider_version": "1"}}
+
+
+class FakeWatchers(object):
+    def __init__(self, *uuids):
+        self.watchers = {uuid: watcher(uuid) for uuid in uuids}
+        self.gets = 0
+        self.filter = FakeFilter([])
+
+    async def get(self, request: web.Request) -> web.Response:
+        self.gets += 1
+        return web.json_response(self.watchers[request.match_info["uuid"]])
+
+    async def filter_watchers(self, request: web.Request) -> web.Response:
+        self.filter.entities = list(self.watchers.values())
+        return await self.filter.handle(request)
+
+    def complete_later(self, uuid, delay):
+        def complete():
+            self.watchers[uuid]["status"] = IntentfulStatus.Completed_Successfully
+
+        asyncio.get_running_loop().call_later(delay, complete)
+
+    def routes(self):
+        return [web.get("/services/intent_watcher/{uuid}", self.get),
+                web.post("/services/intent_watcher/filter", self.filter_watchers)]
+
+
+class TestWaitForWatcher:
+    @pytest.mark.asyncio
+    async def test_wait_backs_off(self):
+        watchers = FakeWatchers("w")
+        watchers.complete_later("w", 0.3)
+        async with serve(watchers.routes()) as url:
+            async with IntentWatcherClient(url) as client:
+                assert await client.wait_for_watcher_status(AttributeDict(uuid="w"),
+                                                            IntentfulStatus.Completed_Successfully,
+                                                            delay_millis=20, max_delay_millis=1000)
+        # Polling at a fixed 20ms would have taken 15 requests
+        assert watchers.gets < 8
+
+    @pytest.mark.asyncio
+    async def test_wait_does_not_block_the_loop(self):
+        watchers = FakeWatchers("w")
+        async with serve(watchers.routes()) as url:
+            async with IntentWatcherClient(url) as client:
+                wait = asyncio.ensure_future(client.wait_for_watcher_status(
+                    AttributeDict(uuid="w"), IntentfulStatus.Completed_Successfully, delay_millis=50
+                ))
+                started = time.monotonic()
+                await asyncio.sleep(0.01)
+                assert time.monotonic() - started < 0.05
+                watchers.complete_later("w", 0)
+                assert await wait
+
+    @pytest.mark.asyncio
+    async def test_wait_times_out(self):
+        watchers = FakeWatchers("w")
+        async with serve(watchers.routes()) as url:
+            async with IntentWatcherClient(url) as client:
+                with pytest.raises(Exception) as excinfo:
+                    await client.wait_for_watcher_status(AttributeDict(uuid="w"),
+                                                         IntentfulStatus.Completed_Successfully,
+                                                         timeout_secs=0.1, delay_millis=20)
+        assert "current status: Pending" in str(excinfo.value)
+
+    @pytest.mark.asyncio
+    async def test_wait_for_many_yields_as_completed(self):
+        watchers = FakeWatchers("a", "b", "c")
+        watchers.complete_later("c", 0.05)
+        watchers.complete_later("a", 0.2)
+        watchers.complete_later("b", 0.35)
+        async with serve(watchers.routes()) as url:
+            async with IntentWatcherClient(url) as client:
+                refs = [AttributeDict(uuid=uuid) for uuid in ("a", "b", "c")]
+                done = [w.uuid async for w in client.wait_for_many(refs, IntentfulStatus.Completed_Successfully,
+                                                                   delay_millis=20, max_delay_millis=50,
+                                                                   chunk_size=2)]
+        assert done == ["c", "a", "b"]
+        # Pending watchers are polled together, never one by one
+        assert watchers.gets == 0
+        assert all(len(filter_obj["uuid"]["$in"]) <= 2 for _, filter_obj in watchers.filter.requests)
+
+    @pytest.mark.asyncio
+    async def test_wait_for_many_reports_pending_watchers(self):
+        watchers = FakeWatchers("a", "b")
+        watchers.complete_later("a", 0)
+        async with serve(watchers.routes()) as url:
+            async with IntentWatcherClient(url) as client:
+                refs = [AttributeDict(uuid="a"), AttributeDict(uuid="b"), AttributeDict(uuid="missing")]
+                done = []
+                with pytest.raises(Exception) as excinfo:
+                    async for w in client.wait_for_many(refs, IntentfulStatus.Completed_Successfully,
+                                                        timeout_secs=0.2, delay_millis=20):
+                        done.append(w.uuid)
+        assert done == ["a"]
+        assert "b: Pending, missing: not found" in str(excinfo.value)
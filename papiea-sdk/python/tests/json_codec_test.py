@@ -0,0 +1,34 @@
+import math
+
+import pytest
+
+from papiea.json_codec import JsonCodec, OrjsonCodec, default_codec, get_codec, orjson
+
+BIG_INT = 2 ** 70
+
+
+class TestJsonCodec:
+    def test_json_module_is_the_default(self):
+        assert type(default_codec) is JsonCodec
+        assert type(get_codec()) is JsonCodec
+        with pytest.raises(Exception):
+            get_codec("simplejson")
+
+    def test_round_trip(self):
+        codec = get_codec()
+        decoded = codec.loads(codec.dumps({"size": BIG_INT, "ratio": float("nan"), "limit": float("inf"), 1: "a"}))
+        assert decoded["size"] == BIG_INT
+        assert math.isnan(decoded["ratio"])
+        assert decoded["limit"] == float("inf")
+        # Keys are always strings in json
+        assert decoded["1"] == "a"
+
+    def test_attribute_dicts_keep_big_ints(self):
+        decoded = get_codec().loads_attrs(b'{"spec": {"size": 1180591620717411303424}}')
+        assert decoded.spec.size == BIG_INT
+
+    @pytest.mark.skipif(orjson is None, reason="orjson is not installed")
+    def test_orjson_writes_big_ints(self):
+        codec = OrjsonCodec()
+        assert codec.dumps({"size": BIG_INT, 1: "a"}) == JsonCodec().dumps({"size": BIG_INT, 1: "a"})
+        assert codec.dumps({1: "a"}) == b'{"1":"a"}'
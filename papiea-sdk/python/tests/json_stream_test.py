@@ -0,0 +1,96 @@
+import asyncio
+import json
+import random
+
+import pytest
+from aiohttp import web
+
+from papiea.client import EntityCRUD
+from papiea.json_stream import JsonArrayStream, iter_json_array
+
+from .local_server import serve
+
+RESULTS = [
+    {"metadata": {"uuid": str(i), "spec_version": i}, "spec": {"name": f"entité {i}", "values": [i, i * 1.5, None]}}
+    for i in range(50)
+]
+BODY = json.dumps({"results": RESULTS, "entity_count": len(RESULTS)}, ensure_ascii=False, indent=1).encode()
+
+
+def random_chunks(data: bytes, rng: random.Random):
+    pos = 0
+    while pos < len(data):
+        size = rng.randint(1, 64)
+        yield data[pos:pos + size]
+        pos += size
+
+
+class TestJsonStream:
+    def test_random_chunk_splits(self):
+        rng = random.Random(42)
+        for _ in range(20):
+            parser = JsonArrayStream()
+            items = []
+            # Splits land inside strings, numbers and multi-byte characters alike
+            for chunk in random_chunks(BODY, rng):
+                items.extend(parser.feed(chunk))
+            items.extend(parser.finish())
+            assert items == RESULTS
+            assert items[0].spec.name == "entité 0"
+            assert parser.fields.entity_count == len(RESULTS)
+
+    def test_truncated_stream(self):
+        parser = JsonArrayStream()
+        parser.feed(BODY[:len(BODY) // 2])
+        with pytest.raises(ValueError):
+            parser.finish()
+
+    @pytest.mark.asyncio
+    async def test_iter_json_array(self):
+        async def chunks():
+            for chunk in random_chunks(BODY, random.Random(7)):
+                yield chunk
+
+        assert [item async for item in iter_json_array(chunks())] == RESULTS
+
+    @pytest.mark.asyncio
+    async def test_filter_stream_asks_for_every_entity(self):
+        queries = []
+
+        async def filter_entities(request: web.Request) -> web.Response:
+            queries.append(request.query)
+            return web.Response(body=BODY, content_type="application/json")
+
+        async with serve([web.post("/services/p/1/k/filter", filter_entities)]) as url:
+            async with EntityCRUD(url, "p", "1", "k") as client:
+                assert [entity async for entity in client.filter_stream({})] == RESULTS
+        # Without a limit papiea only returns its default page
+        assert int(queries[0]["limit"]) >= len(RESULTS)
+
+    @pytest.mark.asyncio
+    async def test_stream_closed_early_releases_response(self):
+        closed = asyncio.Event()
+
+        async def endless(request: web.Request) -> web.StreamResponse:
+            response = web.StreamResponse()
+            await response.prepare(request)
+            await response.write(b'{"results":[')
+            try:
+                for i in range(100000):
+                    await response.write((b"," if i else b"") + json.dumps(RESULTS[0]).encode())
+                    await asyncio.sleep(0.001)
+            except (ConnectionError, asyncio.CancelledError):
+                closed.set()
+                raise
+            return response
+
+        async with serve([web.post("/services/p/1/k/filter", endless)]) as url:
+            async with EntityCRUD(url, "p", "1", "k") as client:
+                stream = client.filter_stream({})
+                count = 0
+                async for _ in stream:
+                    count += 1
+                    if count == 5:
+                        break
+                await stream.aclose()
+                await asyncio.wait_for(closed.wait(), 5)
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from papiea.client import EntityCRUD
+from papiea.pagination import KEYSET_MODE, keyset_pages, with_bounds, with_lower_bound
+
+from .local_server import FakeFilter, serve
+
+
+def make_entities(count):
+    return [{"metadata": {"uuid": f"{i:04d}"}, "spec": {"size": i % 3}} for i in range(count)]
+
+
+class TestKeysetPages:
+    def test_with_bounds(self):
+        assert with_lower_bound({"spec": {"size": 1}}, "metadata.uuid", "a") == \
+               {"spec": {"size": 1}, "metadata": {"uuid": {"$gt": "a"}}}
+        # Tighter existing bounds are kept
+        assert with_bounds({"metadata": {"uuid": {"$gt": "m", "$lt": "x"}}}, "metadata.uuid",
+                           {"$gt": "a", "$lt": "z"}) == {"metadata": {"uuid": {"$gt": "m", "$lt": "x"}}}
+        with pytest.raises(ValueError):
+            with_lower_bound({"metadata": {"uuid": "a"}}, "metadata.uuid", "b")
+
+    def test_filter_is_not_modified(self):
+        filter_obj = {"metadata": {"uuid": {"$lt": "z"}}}
+        with_lower_bound(filter_obj, "metadata.uuid", "a")
+        assert filter_obj == {"metadata": {"uuid": {"$lt": "z"}}}
+
+    @pytest.mark.asyncio
+    async def test_pages_continue_after_last_key(self):
+        requested = []
+
+        async def fetch_page(after):
+            requested.append(after)
+            start = 0 if after is None else after + 1
+            return list(range(start, min(start + 10, 25)))
+
+        assert [item async for item in keyset_pages(fetch_page, 10, key=lambda item: item)] == list(range(25))
+        assert requested == [None, 9, 19]
+
+        requested.clear()
+        items = [item async for item in keyset_pages(fetch_page, 10, key=lambda item: item, after=4, limit=12)]
+        assert items == list(range(5, 17))
+        assert requested == [4, 14]
+
+    @pytest.mark.asyncio
+    async def test_next_page_is_prefetched(self):
+        requested = []
+
+        async def fetch_page(after):
+            requested.append(after)
+            start = 0 if after is None else after + 1
+            return list(range(start, start + 10))
+
+        pages = keyset_pages(fetch_page, 10, key=lambda item: item)
+        await pages.__anext__()
+        await asyncio.sleep(0)
+        assert requested == [None, 9]
+        await pages.aclose()
+
+        requested.clear()
+        pages = keyset_pages(fetch_page, 10, key=lambda item: item, prefetch=False)
+        await pages.__anext__()
+        await asyncio.sleep(0)
+        assert requested == [None]
+        await pages.aclose()
+
+
+class TestKeysetFilterIter:
+    @pytest.mark.asyncio
+    async def test_concurrent_deletes_do_not_skip_entities(self):
+        entities = make_entities(30)
+        fake = FakeFilter(entities)
+        async with serve([web.post("/services/p/1/k/filter", fake.handle)]) as url:
+            async with EntityCRUD(url, "p", "1", "k") as client:
+                iter_func = await client.filter_iter({}, mode=KEYSET_MODE, prefetch=0)
+                found = []
+                async for entity in iter_func(batch_size=10):
+                    found.append(entity.metadata.uuid)
+                    if len(found) == 10:
+                        # An offset based scan would skip the next 5 entities
+                        del entities[:5]
+        assert found == [f"{i:04d}" for i in range(30)]
+        for query, _ in fake.requests:
+            assert query["sort"] == "metadata.uuid:asc"
+            assert "offset" not in query
+
+    @pytest.mark.asyncio
+    async def test_keyset_is_added_to_projection(self):
+        fake = FakeFilter(make_entities(3))
+        async with serve([web.post("/services/p/1/k/filter", fake.handle)]) as url:
+            async with EntityCRUD(url, "p", "1", "k") as client:
+                iter_func = await client.filter_iter({}, mode=KEYSET_MODE, projection="spec")
+                assert len([entity async for entity in iter_func()]) == 3
+        assert fake.requests[0][0]["projection"] == "spec,metadata.uuid"
+
+    @pytest.mark.asyncio
+    async def test_unknown_mode(self):
+        async with EntityCRUD("http://127.0.0.1:3000", "p", "1", "k") as client:
+            with pytest.raises(ValueError):
+                await client.filter_iter({}, mode="cursor")
@@ -0,0 +1,74 @@
+from contextlib import asynccontextmanager
+from typing import Any, AsyncContextManager, AsyncIterator, Dict, Iterable, List, Tuple
+
+from aiohttp import web
+
+
+def serve(routes: Iterable[web.RouteDef]) -> AsyncContextManager[str]:
+    """Serves the routes on a free local port, yielding the base url"""
+    app = web.Application()
+    app.add_routes(routes)
+    return serve_app(app)
+
+
+@asynccontextmanager
+async def serve_app(app: web.Application) -> AsyncIterator[str]:
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    try:
+        yield f"http://127.0.0.1:{runner.addresses[0][1]}"
+    finally:
+        await runner.cleanup()
+
+
+def _get_path(obj: Any, path: str) -> Any:
+    for field in path.split("."):
+        obj = obj[field]
+    return obj
+
+
+_OPERATORS = {
+    "$gt": lambda value, bound: value > bound,
+    "$gte": lambda value, bound: value >= bound,
+    "$lt": lambda value, bound: value < bound,
+    "$lte": lambda value, bound: value <= bound,
+    "$in": lambda value, bound: value in bound,
+}
+
+
+def _matches(obj: Any, filter_obj: Any) -> bool:
+    for field, condition in filter_obj.items():
+        value = obj.get(field) if isinstance(obj, dict) else None
+        if isinstance(condition, dict) and any(key in _OPERATORS for key in condition):
+            if value is None or not all(_OPERATORS[op](value, bound) for op, bound in condition.items()):
+                return False
+        elif isinstance(condition, dict):
+            if not _matches(value, condition):
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeFilter(object):
+    """Answers papiea filter requests from a list of entities, supporting
+    offset, limit, sort and range operators. Queries are kept for inspection."""
+
+    def __init__(self, entities: List[Any]):
+        self.entities = entities
+        self.requests: List[Tuple[Dict[str, str], Any]] = []
+
+    async def handle(self, request: web.Request) -> web.Response:
+        filter_obj = await request.json()
+        self.requests.append((dict(request.query), filter_obj))
+        results = [entity for entity in self.entities if _matches(entity, filter_obj or {})]
+        sort = request.query.get("sort")
+        if sort:
+            path, _, order = sort.partition(":")
+            results.sort(key=lambda entity: _get_path(entity, path), reverse=order == "desc")
+        offset = int(request.query.get("offset") or 0)
+        # Same default page as papiea
+        limit = int(request.query.get("limit") or 30)
+        return web.json_response({"results": results[offset:offset + limit], "entity_count": len(results)})
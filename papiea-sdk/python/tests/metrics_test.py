@@ -0,0 +1,106 @@
+import logging
+
+import pytest
+from aiohttp import web
+
+from papiea.api import ApiInstance
+from papiea.connection_pool import SessionRegistry
+from papiea.hooks import route_template
+from papiea.metrics import ClientMetrics, MetricsRegistry
+from papiea.retry import NO_RETRY
+
+from .local_server import serve
+
+logger = logging.getLogger(__name__)
+
+UUID = "4f8a0b6e-3c2d-4e5f-9a1b-2c3d4e5f6a7b"
+
+
+async def get_entity(request: web.Request) -> web.Response:
+    return web.json_response({"uuid": request.match_info["uuid"]})
+
+
+async def missing(request: web.Request) -> web.Response:
+    return web.json_response({"error": {"type": "Not Found", "errors": [], "code": 404, "message": "missing"}},
+                             status=404)
+
+
+class TestRouteTemplate:
+    def test_entity_routes(self):
+        assert route_template(f"http://papiea/services/location_provider/0.1.0/Location/{UUID}") == \
+               ("/services/{prefix}/{version}/{kind}/{uuid}", "Location")
+        assert route_template("http://papiea/services/location_provider/0.1.0/Location/filter?limit=5") == \
+               ("/services/{prefix}/{version}/{kind}/filter", "Location")
+
+    def test_procedure_routes(self):
+        assert route_template(f"http://papiea/services/location_provider/0.1.0/Location/{UUID}/procedure/move") \
+               == ("/services/{prefix}/{version}/{kind}/{uuid}/procedure/move", "Location")
+        assert route_template("http://papiea/services/location_provider/0.1.0/Location/procedure/compute") == \
+               ("/services/{prefix}/{version}/{kind}/procedure/compute", "Location")
+        # Provider procedures are not about any kind
+        assert route_template("http://papiea/services/location_provider/0.1.0/procedure/compute") == \
+               ("/services/{prefix}/{version}/procedure/compute", "")
+        assert route_template("http://papiea/services/location_provider/0.1.0/check_permission") == \
+               ("/services/{prefix}/{version}/check_permission", "")
+
+    def test_provider_and_intent_watcher_routes(self):
+        assert route_template("http://papiea/provider/location_provider/0.1.0/update_status") == \
+               ("/provider/{prefix}/{version}/update_status", "")
+        assert route_template(f"http://papiea/services/intent_watcher/{UUID}") == \
+               ("/services/intent_watcher/{id}", "")
+        assert route_template("http://papiea/services/intent_watcher/filter") == \
+               ("/services/intent_watcher/filter", "")
+
+
+class TestMetricsRegistry:
+    def test_render(self):
+        registry = MetricsRegistry()
+        registry.counter("requests_total", "Requests", ("route",)).inc(("/a\"b",), 2)
+        registry.gauge("in_flight", "In flight").inc()
+        histogram = registry.histogram("duration_seconds", "Duration", ("route",), buckets=(0.1, 1))
+        histogram.observe(("/a",), 0.05)
+        histogram.observe(("/a",), 0.5)
+        histogram.observe(("/a",), 5)
+        assert registry.render() == "\n".join([
+            "# HELP requests_total Requests",
+            "# TYPE requests_total counter",
+            "requests_total{route=\"/a\\\"b\"} 2",
+            "# HELP in_flight In flight",
+            "# TYPE in_flight gauge",
+            "in_flight 1",
+            "# HELP duration_seconds Duration",
+            "# TYPE duration_seconds histogram",
+            "duration_seconds_bucket{route=\"/a\",le=\"0.1\"} 1",
+            "duration_seconds_bucket{route=\"/a\",le=\"1\"} 2",
+            "duration_seconds_bucket{route=\"/a\",le=\"+Inf\"} 3",
+            "duration_seconds_sum{route=\"/a\"} 5.55",
+            "duration_seconds_count{route=\"/a\"} 3",
+        ]) + "\n"
+
+    def test_conflicting_registration(self):
+        registry = MetricsRegistry()
+        assert registry.counter("requests_total", "Requests", ("route",)) is \
+               registry.counter("requests_total", "Requests", ("route",))
+        with pytest.raises(ValueError):
+            registry.gauge("requests_total", "Requests", ("route",))
+
+
+class TestClientMetrics:
+    @pytest.mark.asyncio
+    async def test_requests_are_recorded(self):
+        registry = MetricsRegistry()
+        metrics = ClientMetrics(registry, buckets=(10,))
+        routes = [web.get("/services/p/1/k/{uuid}", get_entity), web.get("/services/p/1/procedure/missing", missing)]
+        async with serve(routes) as url:
+            async with ApiInstance(f"{url}/services/p/1", logger=logger, session_registry=SessionRegistry(),
+                                   retry_policy=NO_RETRY, request_hooks=[metrics]) as api:
+                await api.get(f"k/{UUID}")
+                with pytest.raises(Exception):
+                    await api.get("procedure/missing")
+        rendered = registry.render()
+        assert "papiea_client_request_duration_seconds_count{method=\"get\"," \
+               "route=\"/services/{prefix}/{version}/{kind}/{uuid}\",kind=\"k\",status_class=\"2xx\"} 1" in rendered
+        assert "papiea_client_errors_total{method=\"get\",route=\"/services/{prefix}/{version}/procedure/missing\"," \
+               "kind=\"\",error=\"Not Found\"} 1" in rendered
+        assert "papiea_client_requests_in_flight{method=\"get\"," \
+               "route=\"/services/{prefix}/{version}/{kind}/{uuid}\",kind=\"k\"} 0" in rendered
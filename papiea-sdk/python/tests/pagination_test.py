@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from papiea.client import EntityCRUD
+from papiea.pagination import prefetch_pages
+
+from .local_server import FakeFilter, serve
+
+ENTITIES = [{"metadata": {"uuid": f"{i:04d}"}, "spec": {"size": i % 3}} for i in range(25)]
+
+
+class TestPrefetchPages:
+    @pytest.mark.asyncio
+    async def test_pages_until_short_page(self):
+        requested = []
+
+        async def fetch_page(offset):
+            requested.append(offset)
+            return list(range(offset, min(offset + 10, 25))), None
+
+        assert [item async for item in prefetch_pages(fetch_page, 10)] == list(range(25))
+        assert requested == [0, 10, 20]
+
+    @pytest.mark.asyncio
+    async def test_offset_and_limit(self):
+        requested = []
+
+        async def fetch_page(offset):
+            requested.append(offset)
+            return list(range(offset, offset + 10)), 1000
+
+        items = [item async for item in prefetch_pages(fetch_page, 10, offset=5, limit=15)]
+        assert items == list(range(5, 20))
+        # Nothing is requested past the limit
+        assert requested == [5, 15]
+        assert [item async for item in prefetch_pages(fetch_page, 10, limit=0)] == []
+
+    @pytest.mark.asyncio
+    async def test_prefetch_is_bounded_by_the_consumer(self):
+        requested = []
+
+        async def fetch_page(offset):
+            requested.append(offset)
+            return list(range(offset, offset + 10)), None
+
+        pages = prefetch_pages(fetch_page, 10, prefetch=2)
+        for _ in range(10):
+            await pages.__anext__()
+        for _ in range(5):
+            await asyncio.sleep(0)
+        # The current page plus two ahead, however long the consumer waits
+        assert requested == [0, 10, 20]
+        await pages.aclose()
+
+    @pytest.mark.asyncio
+    async def test_prefetch_stops_at_total(self):
+        requested = []
+
+        async def fetch_page(offset):
+            requested.append(offset)
+            return list(range(offset, offset + 10)), 20
+
+        pages = prefetch_pages(fetch_page, 10, prefetch=5)
+        await pages.__anext__()
+        await asyncio.sleep(0)
+        assert requested == [0, 10]
+        await pages.aclose()
+
+    @pytest.mark.asyncio
+    async def test_failed_page_is_raised_in_order(self):
+        async def fetch_page(offset):
+            if offset == 10:
+                raise ValueError("boom")
+            return list(range(offset, offset + 10)), None
+
+        items = []
+        with pytest.raises(ValueError):
+            async for item in prefetch_pages(fetch_page, 10):
+                items.append(item)
+        assert items == list(range(10))
+
+
+class TestFilterIter:
+    @pytest.mark.asyncio
+    async def test_filter_iter(self):
+        fake = FakeFilter(ENTITIES)
+        async with serve([web.post("/services/p/1/k/filter", fake.handle)]) as url:
+            async with EntityCRUD(url, "p", "1", "k") as client:
+                iter_func = await client.filter_iter({"spec": {"size": 1}})
+                found = [entity.metadata.uuid async for entity in iter_func(batch_size=3)]
+                assert found == [entity["metadata"]["uuid"] for entity in ENTITIES if entity["spec"]["size"] == 1]
+
+                fake.requests.clear()
+                iter_func = await client.list_iter(prefetch=0)
+                found = [entity.metadata.uuid async for entity in iter_func(batch_size=10, offset=20)]
+                assert found == [entity["metadata"]["uuid"] for entity in ENTITIES[20:]]
+                assert [query["offset"] for query, _ in fake.requests] == ["20"]
@@ -0,0 +1,93 @@
+import asyncio
+import uuid
+
+import pytest
+from aiohttp import web
+
+from papiea.client import EntityCRUD
+from papiea.pagination import merge_iterators, uuid_ranges
+
+from .local_server import FakeFilter, serve
+
+
+class TestUuidRanges:
+    def test_ranges_cover_keyspace(self):
+        assert uuid_ranges(1) == [(None, None)]
+        ranges = uuid_ranges(4)
+        assert ranges == [(None, "40000000"), ("40000000", "80000000"), ("80000000", "c0000000"), ("c0000000", None)]
+        with pytest.raises(ValueError):
+            uuid_ranges(0)
+
+    def test_every_uuid_in_exactly_one_range(self):
+        ranges = uuid_ranges(7)
+        for _ in range(200):
+            value = str(uuid.uuid4())
+            matching = [(start, end) for start, end in ranges
+                        if (start is None or value >= start) and (end is None or value < end)]
+            assert len(matching) == 1
+
+
+class TestMergeIterators:
+    @pytest.mark.asyncio
+    async def test_yields_every_item(self):
+        async def numbers(start):
+            for i in range(start, start + 10):
+                await asyncio.sleep(0)
+                yield i
+
+        merged = merge_iterators([numbers(i * 10) for i in range(5)], concurrency=2, queue_size=3)
+        assert sorted([item async for item in merged]) == list(range(50))
+
+    @pytest.mark.asyncio
+    async def test_failure_stops_other_iterators(self):
+        closed = []
+
+        async def endless(name):
+            try:
+                while True:
+                    await asyncio.sleep(0)
+                    yield name
+            finally:
+                closed.append(name)
+
+        async def failing():
+            yield "failing"
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            async for _ in merge_iterators([endless("a"), failing(), endless("b")], concurrency=3):
+                pass
+        assert sorted(closed) == ["a", "b"]
+
+
+class TestScanParallel:
+    @pytest.mark.asyncio
+    async def test_scan_finds_every_entity_once(self):
+        entities = [{"metadata": {"uuid": str(uuid.uuid4())}, "spec": {"size": i % 2}} for i in range(200)]
+        fake = FakeFilter(entities)
+        async with serve([web.post("/services/p/1/k/filter", fake.handle)]) as url:
+            async with EntityCRUD(url, "p", "1", "k") as client:
+                found = [entity.metadata.uuid
+                         async for entity in client.scan_parallel({"spec": {"size": 1}}, shards=8, batch_size=10)]
+        assert sorted(found) == sorted(entity["metadata"]["uuid"] for entity in entities
+                                       if entity["spec"]["size"] == 1)
+        # Every shard was restricted to its own uuid range
+        first_pages = [filter_obj for _, filter_obj in fake.requests if "$gt" not in filter_obj["metadata"]["uuid"]]
+        assert sorted(filter_obj["metadata"]["uuid"].get("$gte", "") for filter_obj in first_pages) == \
+               ["", "20000000", "40000000", "60000000", "80000000", "a0000000", "c0000000", "e0000000"]
+        assert all(filter_obj["spec"] == {"size": 1} for filter_obj in first_pages)
+
+    @pytest.mark.asyncio
+    async def test_stopping_early_cancels_shards(self):
+        entities = [{"metadata": {"uuid": str(uuid.uuid4())}, "spec": {}} for _ in range(500)]
+        fake = FakeFilter(entities)
+        async with serve([web.post("/services/p/1/k/filter", fake.handle)]) as url:
+            async with EntityCRUD(url, "p", "1", "k") as client:
+                scan = client.scan_parallel({}, shards=4, concurrency=2, batch_size=5)
+                async for _ in scan:
+                    break
+                await scan.aclose()
+                requests = len(fake.requests)
+                await asyncio.sleep(0.05)
+                assert len(fake.requests) == requests
+        assert requests < 500 / 5
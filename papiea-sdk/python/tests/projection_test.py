@@ -0,0 +1,45 @@
+import pytest
+from aiohttp import web
+
+from papiea.client import EntityCRUD
+from papiea.core import AttributeDict
+from papiea.projection import projection_fields, with_projection
+
+from .local_server import FakeFilter, serve
+
+ENTITIES = [{"metadata": {"uuid": "a"}, "spec": {"size": 1}}]
+
+
+class TestProjection:
+    def test_projection_fields(self):
+        assert projection_fields(None) is None
+        assert projection_fields("spec.size,metadata") == ["spec.size", "metadata"]
+        assert projection_fields(["spec"], "metadata.uuid") == ["spec", "metadata.uuid"]
+        # Required fields already covered by a selected parent are not added
+        assert projection_fields(["metadata"], "metadata.uuid") == ["metadata"]
+        with pytest.raises(ValueError):
+            projection_fields([])
+
+    def test_query_string(self):
+        assert with_projection("uuid", None) == "uuid"
+        assert with_projection("uuid", ["spec.size", "metadata"]) == "uuid?projection=spec.size,metadata"
+        assert with_projection("filter?limit=5", ["spec"]) == "filter?limit=5&projection=spec"
+        assert with_projection("filter", ["spec.a b&c"]) == "filter?projection=spec.a%20b%26c"
+
+    @pytest.mark.asyncio
+    async def test_projection_is_sent(self):
+        fake = FakeFilter(ENTITIES)
+        queries = []
+
+        async def get_entity(request: web.Request) -> web.Response:
+            queries.append(dict(request.query))
+            return web.json_response(ENTITIES[0])
+
+        routes = [web.post("/services/p/1/k/filter", fake.handle), web.get("/services/p/1/k/{uuid}", get_entity)]
+        async with serve(routes) as url:
+            async with EntityCRUD(url, "p", "1", "k") as client:
+                await client.get(AttributeDict(uuid="a"), projection=["spec.size"])
+                await client.get(AttributeDict(uuid="a"))
+                await client.filter({}, projection="metadata")
+        assert queries == [{"projection": "spec.size"}, {}]
+        assert fake.requests[0][0] == {"projection": "metadata"}
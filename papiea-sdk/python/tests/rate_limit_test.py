@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import time
+
+import pytest
+from aiohttp import web
+
+from papiea.api import ApiInstance
+from papiea.connection_pool import SessionRegistry
+from papiea.rate_limit import ConcurrencyLimiter, TokenBucket, concurrency_limiter, rate_limiter
+
+from .local_server import serve
+
+logger = logging.getLogger(__name__)
+
+
+class TestConcurrencyLimiter:
+    def test_invalid_limit(self):
+        with pytest.raises(ValueError):
+            ConcurrencyLimiter(0)
+
+    def test_numbers_create_limiters(self):
+        limiter = ConcurrencyLimiter(2)
+        assert concurrency_limiter(limiter) is limiter
+        assert concurrency_limiter(3).max_in_flight == 3
+        assert concurrency_limiter(None) is None
+        assert rate_limiter(5).rate_per_sec == 5
+
+    @pytest.mark.asyncio
+    async def test_waiters_served_in_order(self):
+        limiter = ConcurrencyLimiter(2)
+        order = []
+        running = 0
+        max_running = 0
+
+        async def request(i):
+            nonlocal running, max_running
+            async with limiter:
+                running += 1
+                max_running = max(max_running, running)
+                order.append(i)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        await asyncio.gather(*[request(i) for i in range(10)])
+        assert max_running == 2
+        assert order == list(range(10))
+        assert limiter.in_flight == 0
+        assert limiter.waiting == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_gives_up_its_place(self):
+        limiter = ConcurrencyLimiter(1)
+        await limiter.acquire()
+        cancelled = asyncio.ensure_future(limiter.acquire())
+        waiting = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.waiting == 2
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        limiter.release()
+        await asyncio.wait_for(waiting, 1)
+        limiter.release()
+        assert limiter.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_slot_handed_to_cancelled_waiter_is_passed_on(self):
+        limiter = ConcurrencyLimiter(1)
+        await limiter.acquire()
+        cancelled = asyncio.ensure_future(limiter.acquire())
+        waiting = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        # The slot is handed over and the waiter cancelled before it resumes
+        limiter.release()
+        cancelled.cancel()
+        await asyncio.wait_for(waiting, 1)
+        assert limiter.in_flight == 1
+
+
+class TestTokenBucket:
+    def test_invalid_rate(self):
+        with pytest.raises(ValueError):
+            TokenBucket(0)
+
+    @pytest.mark.asyncio
+    async def test_burst_then_rate(self):
+        bucket = TokenBucket(rate_per_sec=50, burst=5)
+        started = time.monotonic()
+        for _ in range(5):
+            await bucket.acquire()
+        assert time.monotonic() - started < 0.05
+        for _ in range(5):
+            await bucket.acquire()
+        # 5 more tokens at 50 per second
+        assert time.monotonic() - started >= 0.09
+
+    @pytest.mark.asyncio
+    async def test_cancelled_request_returns_its_token(self):
+        bucket = TokenBucket(rate_per_sec=10, burst=1)
+        await bucket.acquire()
+        waiter = asyncio.ensure_future(bucket.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        # The next request takes the cancelled one's place instead of queueing behind it
+        started = time.monotonic()
+        await bucket.acquire()
+        assert time.monotonic() - started < 0.15
+
+
+class TestApiInstanceLimits:
+    @pytest.mark.asyncio
+    async def test_shared_limiter_caps_requests_in_flight(self):
+        running = 0
+        max_running = 0
+
+        async def get_entity(request: web.Request) -> web.Response:
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return web.json_response({})
+
+        limiter = ConcurrencyLimiter(3)
+        registry = SessionRegistry()
+        async with serve([web.get("/{uuid}", get_entity)]) as url:
+            async with ApiInstance(url, logger=logger, session_registry=registry, concurrency_limit=limiter) as first, \
+                    ApiInstance(url, logger=logger, session_registry=registry, concurrency_limit=limiter) as second:
+                await asyncio.gather(*[api.get(str(i)) for i in range(10) for api in (first, second)])
+        assert max_running == 3
@@ -0,0 +1,70 @@
+import asyncio
+import logging
+
+import pytest
+from aiohttp import ServerDisconnectedError, web
+
+from papiea.api import ApiInstance
+from papiea.connection_pool import SessionRegistry
+from papiea.python_sdk_exceptions import ApiException
+from papiea.retry import RetryBudget, RetryPolicy
+
+from .local_server import serve
+
+logger = logging.getLogger(__name__)
+
+
+class TestRetry:
+    def test_retryable_errors(self):
+        policy = RetryPolicy()
+        assert policy.is_retryable("get", ApiException(503, "unavailable"))
+        assert not policy.is_retryable("get", ApiException(400, "bad request"))
+        assert policy.is_retryable("put", ServerDisconnectedError())
+        assert policy.is_retryable("delete", asyncio.TimeoutError())
+        # The request might have been applied, posting it again is not safe
+        assert not policy.is_retryable("post", ApiException(503, "unavailable"))
+        assert not policy.is_retryable("post", ServerDisconnectedError())
+
+    def test_attempts_are_capped(self):
+        policy = RetryPolicy(max_attempts=3)
+        error = ApiException(503, "unavailable")
+        assert policy.should_retry("get", error, 0)
+        assert policy.should_retry("get", error, 1)
+        assert not policy.should_retry("get", error, 2)
+
+    def test_backoff(self):
+        policy = RetryPolicy(backoff_base_secs=0.1, backoff_max_secs=1, jitter=False)
+        assert [policy.backoff(attempt) for attempt in range(5)] == [0.1, 0.2, 0.4, 0.8, 1]
+        jittered = RetryPolicy(backoff_base_secs=0.1, backoff_max_secs=1)
+        for attempt in range(5):
+            assert 0 <= jittered.backoff(attempt) <= policy.backoff(attempt)
+
+    def test_budget_caps_retries(self):
+        budget = RetryBudget(ratio=0.5, min_retries_per_sec=0, ttl_secs=10)
+        for _ in range(10):
+            budget.record_request()
+        withdrawn = [budget.try_withdraw() for _ in range(10)]
+        assert withdrawn == [True] * 5 + [False] * 5
+
+    @pytest.mark.asyncio
+    async def test_failed_gets_are_retried(self):
+        calls = []
+
+        async def flaky(request: web.Request) -> web.Response:
+            calls.append(request.method)
+            if len(calls) < 3:
+                return web.json_response({"error": {"message": "unavailable"}}, status=503)
+            return web.json_response({"ok": True})
+
+        policy = RetryPolicy(max_attempts=3, backoff_base_secs=0.01)
+        async with serve([web.get("/flaky", flaky), web.post("/flaky", flaky)]) as url:
+            async with ApiInstance(url, logger=logger, session_registry=SessionRegistry(),
+                                   retry_policy=policy) as api:
+                assert (await api.get("flaky")).ok
+                assert len(calls) == 3
+
+                calls.clear()
+                with pytest.raises(ApiException) as excinfo:
+                    await api.post("flaky", {})
+                assert excinfo.value.status == 503
+                assert len(calls) == 1
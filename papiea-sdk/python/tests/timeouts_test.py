@@ -0,0 +1,61 @@
+import asyncio
+import logging
+import time
+
+import pytest
+from aiohttp import web
+
+from papiea.api import ApiInstance
+from papiea.connection_pool import SessionRegistry
+from papiea.python_sdk_exceptions import DeadlineExceededException
+from papiea.retry import NO_RETRY
+from papiea.timeouts import Timeout, deadline, remaining_time
+
+from .local_server import serve
+
+logger = logging.getLogger(__name__)
+
+
+async def slow(request: web.Request) -> web.Response:
+    await asyncio.sleep(1)
+    return web.json_response({})
+
+
+class TestTimeouts:
+    def test_numbers_are_seconds(self):
+        timeout = Timeout.from_value(5)
+        assert (timeout.total, timeout.connect, timeout.read) == (5, 5, 5)
+        assert Timeout.from_value(30).connect == 10
+        assert Timeout.from_value(None) is None
+        api = ApiInstance("http://127.0.0.1:3000", timeout=2.5, logger=logger)
+        assert api.timeout.total == 2.5
+
+    def test_nested_deadlines_only_shorten(self):
+        assert remaining_time() is None
+        with deadline(10):
+            with deadline(100):
+                assert remaining_time() <= 10
+            with deadline(1):
+                assert remaining_time() <= 1
+        assert remaining_time() is None
+
+    def test_deadline_caps_request_timeout(self):
+        with deadline(1):
+            assert Timeout(total=120).to_client_timeout().total <= 1
+        with deadline(0):
+            time.sleep(0.001)
+            with pytest.raises(DeadlineExceededException):
+                Timeout().to_client_timeout()
+
+    @pytest.mark.asyncio
+    async def test_per_call_timeout(self):
+        async with serve([web.get("/slow", slow)]) as url:
+            async with ApiInstance(url, logger=logger, session_registry=SessionRegistry(),
+                                   retry_policy=NO_RETRY) as api:
+                started = time.monotonic()
+                with pytest.raises(asyncio.TimeoutError):
+                    await api.get("slow", timeout=0.1)
+                assert time.monotonic() - started < 0.9
+                with pytest.raises(asyncio.TimeoutError):
+                    with deadline(0.1):
+                        await api.get("slow")
@@ -0,0 +1,96 @@
+import asyncio
+import multiprocessing
+import socket
+
+from jaeger_client import Config
+from jaeger_client.reporter import CompositeReporter, Reporter
+from jaeger_client.sampler import ProbabilisticSampler, RemoteControlledSampler
+
+from papiea.python_sdk import ProviderServerManager
+
+
+def make_tracer(agent_port, sampler=None):
+    config = {
+        "local_agent": {"reporting_host": "127.0.0.1", "reporting_port": agent_port},
+        "reporter_queue_size": 50,
+        "sampling_refresh_interval": 123,
+        "logging": True,
+    }
+    # Without a sampler jaeger polls the agent for the sampling strategy
+    if sampler is not None:
+        config["sampler"] = sampler
+    return Config(config=config, service_name="tracing-test", validate=True).new_tracer()
+
+
+def agent_reporter(tracer):
+    reporter = tracer.reporter
+    if isinstance(reporter, CompositeReporter):
+        reporter = next(child for child in reporter.reporters if isinstance(child, Reporter))
+    return reporter
+
+
+def close_tracer(tracer):
+    # jaeger completes the future from its reporter thread, which does not wake
+    # the loop of the calling thread, so it is polled
+    async def flush():
+        closed = tracer.close()
+        while not closed.done():
+            await asyncio.sleep(0.01)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(asyncio.wait_for(flush(), 5))
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def report_span_after_fork(manager, tracer):
+    manager._on_worker_start()
+    tracer.start_span("worker-span").finish()
+    close_tracer(tracer)
+
+
+class TestTracerAfterFork:
+    def test_settings_survive_worker_start(self):
+        tracer = make_tracer(7777, {"type": "probabilistic", "param": 0.25})
+        remote = make_tracer(7777)
+        manager = ProviderServerManager()
+        manager.tracers.extend([tracer, remote])
+        try:
+            sampler = tracer.sampler
+            channel = agent_reporter(tracer)._channel
+            manager._on_worker_start()
+
+            assert tracer.sampler is sampler
+            assert isinstance(tracer.sampler, ProbabilisticSampler)
+            assert tracer.sampler.rate == 0.25
+            reporter = agent_reporter(tracer)
+            assert reporter._channel is channel
+            assert reporter.queue_capacity == 50
+
+            assert isinstance(remote.sampler, RemoteControlledSampler)
+            assert remote.sampler.service_name == "tracing-test"
+            assert remote.sampler.sampling_refresh_interval == 123
+        finally:
+            close_tracer(tracer)
+            close_tracer(remote)
+
+    def test_worker_spans_reach_configured_agent(self):
+        agent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        agent.bind(("127.0.0.1", 0))
+        agent.settimeout(10)
+        tracer = make_tracer(agent.getsockname()[1], {"type": "probabilistic", "param": 1})
+        manager = ProviderServerManager()
+        manager.tracers.append(tracer)
+        try:
+            worker = multiprocessing.get_context("fork").Process(target=report_span_after_fork,
+                                                                 args=(manager, tracer))
+            worker.start()
+            worker.join(10)
+            assert worker.exitcode == 0
+            assert b"worker-span" in agent.recv(65536)
+        finally:
+            close_tracer(tracer)
+            agent.close()
@@ -0,0 +1,152 @@
+import asyncio
+import logging
+
+import pytest
+
+from papiea.core import AttributeDict
+from papiea.watch import MAX_TOKEN_CHANGES, EntityWatch, WatchEventType, WatchStateStore
+
+
+def entity(uuid, spec_version=1, status_hash="s"):
+    return AttributeDict(metadata=AttributeDict(uuid=uuid, spec_version=spec_version, status_hash=status_hash))
+
+
+class FakeScan(object):
+    def __init__(self, entities):
+        self.entities = entities
+        self.scans = 0
+        self.failures = 0
+
+    def __call__(self):
+        self.scans += 1
+        return self._scan()
+
+    async def _scan(self):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("papiea is down")
+        for item in list(self.entities.values()):
+            yield item
+
+
+class BlockedScan(object):
+    def __init__(self):
+        self.scans = 0
+
+    def __call__(self):
+        self.scans += 1
+        return self._scan()
+
+    async def _scan(self):
+        await asyncio.Event().wait()
+        yield
+
+
+class RecordingStore(WatchStateStore):
+    def __init__(self):
+        super().__init__()
+        self.keys = set()
+
+    def save(self, key, versions):
+        super().save(key, versions)
+        self.keys.add(key)
+
+    def delete(self, key):
+        super().delete(key)
+        self.keys.discard(key)
+
+
+async def take(watch, count):
+    events = []
+    for _ in range(count):
+        event = await asyncio.wait_for(watch.__anext__(), 5)
+        events.append((event.type, event.uuid))
+    return events
+
+
+class TestEntityWatch:
+    @pytest.mark.asyncio
+    async def test_events(self):
+        scan = FakeScan({"a": entity("a"), "b": entity("b")})
+        async with EntityWatch(scan, interval_secs=0.01, state_store=WatchStateStore()) as watch:
+            assert set(await take(watch, 2)) == {(WatchEventType.Created, "a"), (WatchEventType.Created, "b")}
+            scan.entities["a"] = entity("a", spec_version=2)
+            scan.entities["b"] = entity("b", status_hash="t")
+            scan.entities["c"] = entity("c")
+            assert set(await take(watch, 3)) == {(WatchEventType.Created, "c"), (WatchEventType.Updated, "a"),
+                                                 (WatchEventType.StatusChanged, "b")}
+            del scan.entities["a"]
+            assert await take(watch, 1) == [(WatchEventType.Deleted, "a")]
+
+    @pytest.mark.asyncio
+    async def test_existing_entities_can_be_skipped(self):
+        scan = FakeScan({"a": entity("a")})
+        async with EntityWatch(scan, interval_secs=0.01, emit_existing=False, state_store=WatchStateStore()) as watch:
+            events = asyncio.ensure_future(take(watch, 1))
+            while not scan.scans:
+                await asyncio.sleep(0.001)
+            scan.entities["b"] = entity("b")
+            assert await events == [(WatchEventType.Created, "b")]
+
+    @pytest.mark.asyncio
+    async def test_resume_neither_replays_nor_misses(self):
+        store = WatchStateStore()
+        scan = FakeScan({str(i): entity(str(i)) for i in range(5)})
+        watch = EntityWatch(scan, interval_secs=0.01, state_store=store)
+        await take(watch, 3)
+        token = watch.resume_token
+        await watch.aclose()
+
+        scan.entities["0"] = entity("0", spec_version=2)
+        async with EntityWatch(scan, interval_secs=0.01, resume_token=token, state_store=store) as watch:
+            events = await take(watch, 3)
+        # Only the entities not reported before the token was taken, and the one changed since
+        assert set(events) == {(WatchEventType.Updated, "0"), (WatchEventType.Created, "3"),
+                               (WatchEventType.Created, "4")}
+
+    @pytest.mark.asyncio
+    async def test_token_stays_small(self):
+        store = RecordingStore()
+        scan = FakeScan({f"{i:05d}": entity(f"{i:05d}") for i in range(MAX_TOKEN_CHANGES * 10)})
+        async with EntityWatch(scan, interval_secs=0.01, state_store=store) as watch:
+            await take(watch, MAX_TOKEN_CHANGES * 10)
+            token = watch.resume_token
+            # Only the last checkpoints are kept in the store
+            assert len(store.keys) <= 2
+        assert len(token) < 4096
+        async with EntityWatch(scan, interval_secs=0.01, resume_token=token, state_store=store) as watch:
+            assert len(watch.state.versions) == MAX_TOKEN_CHANGES * 10
+
+    @pytest.mark.asyncio
+    async def test_invalid_tokens(self):
+        scan = FakeScan({})
+        with pytest.raises(ValueError):
+            EntityWatch(scan, resume_token="not a token")
+        scan = FakeScan({f"{i:05d}": entity(f"{i:05d}") for i in range(MAX_TOKEN_CHANGES)})
+        async with EntityWatch(scan, interval_secs=0.01, state_store=WatchStateStore()) as watch:
+            await take(watch, MAX_TOKEN_CHANGES)
+            token = watch.resume_token
+        # A store that never saw the checkpoint
+        with pytest.raises(ValueError):
+            EntityWatch(scan, resume_token=token, state_store=WatchStateStore())
+
+    @pytest.mark.asyncio
+    async def test_failed_scans_are_retried(self, caplog):
+        scan = FakeScan({"a": entity("a")})
+        scan.failures = 2
+        with caplog.at_level(logging.WARNING):
+            async with EntityWatch(scan, interval_secs=0.01, state_store=WatchStateStore()) as watch:
+                assert await take(watch, 1) == [(WatchEventType.Created, "a")]
+        assert scan.scans == 3
+        assert len([record for record in caplog.records if "Watch scan failed" in record.message]) == 2
+
+    @pytest.mark.asyncio
+    async def test_cancelled_watch_is_not_retried(self):
+        scan = BlockedScan()
+        async with EntityWatch(scan, interval_secs=0.01, state_store=WatchStateStore()) as watch:
+            waiting = asyncio.ensure_future(watch.__anext__())
+            await asyncio.sleep(0.05)
+            waiting.cancel()
+            await asyncio.wait([waiting], timeout=1)
+            assert waiting.cancelled()
+        assert scan.scans == 1
@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from papiea.client import IntentWatcherClient
+from papiea.core import AttributeDict, IntentfulStatus
+from papiea.watcher_poller import WatcherPoller
+
+from .intent_watcher_wait_test import FakeWatchers
+from .local_server import serve
+
+
+class FakeFetch(object):
+    def __init__(self):
+        self.statuses = {}
+        self.calls = []
+        self.error = None
+
+    async def __call__(self, uuids):
+        self.calls.append(list(uuids))
+        if self.error is not None:
+            raise self.error
+        return [AttributeDict(uuid=uuid, status=self.statuses[uuid]) for uuid in uuids if uuid in self.statuses]
+
+
+class TestWatcherPoller:
+    @pytest.mark.asyncio
+    async def test_waiters_share_polls(self):
+        fetch = FakeFetch()
+        fetch.statuses = {"a": IntentfulStatus.Pending, "b": IntentfulStatus.Pending}
+        poller = WatcherPoller(fetch, interval_secs=0.01)
+        waits = [asyncio.ensure_future(poller.wait(uuid, IntentfulStatus.Completed_Successfully, 5))
+                 for uuid in ("a", "a", "a", "b")]
+        await asyncio.sleep(0.05)
+        assert poller.watching == 2
+        fetch.statuses["a"] = IntentfulStatus.Completed_Successfully
+        fetch.statuses["b"] = IntentfulStatus.Completed_Successfully
+        results = await asyncio.gather(*waits)
+        assert [watcher.uuid for watcher in results] == ["a", "a", "a", "b"]
+        # One request per tick for all the waiters
+        assert len(fetch.calls) == poller.ticks
+        assert all(sorted(call) == ["a", "b"] for call in fetch.calls)
+        assert poller.watching == 0
+        await poller.close()
+
+    @pytest.mark.asyncio
+    async def test_waiters_for_different_statuses(self):
+        fetch = FakeFetch()
+        fetch.statuses = {"a": IntentfulStatus.Active}
+        poller = WatcherPoller(fetch, interval_secs=0.01)
+        active = asyncio.ensure_future(poller.wait("a", IntentfulStatus.Active, 5))
+        completed = asyncio.ensure_future(poller.wait("a", IntentfulStatus.Completed_Successfully, 5))
+        await active
+        assert not completed.done()
+        fetch.statuses["a"] = IntentfulStatus.Completed_Successfully
+        await completed
+        await poller.close()
+
+    @pytest.mark.asyncio
+    async def test_chunks(self):
+        fetch = FakeFetch()
+        fetch.statuses = {str(i): IntentfulStatus.Completed_Successfully for i in range(5)}
+        poller = WatcherPoller(fetch, interval_secs=0.01, chunk_size=2)
+        await asyncio.gather(*[poller.wait(str(i), IntentfulStatus.Completed_Successfully, 5) for i in range(5)])
+        assert sorted(len(call) for call in fetch.calls) == [1, 2, 2]
+        await poller.close()
+
+    @pytest.mark.asyncio
+    async def test_timeout_removes_waiter(self):
+        fetch = FakeFetch()
+        fetch.statuses = {"a": IntentfulStatus.Pending}
+        poller = WatcherPoller(fetch, interval_secs=0.01)
+        with pytest.raises(asyncio.TimeoutError):
+            await poller.wait("a", IntentfulStatus.Completed_Successfully, 0.05)
+        assert poller.watching == 0
+        # The loop stops once nobody waits
+        await asyncio.sleep(0.03)
+        calls = len(fetch.calls)
+        await asyncio.sleep(0.03)
+        assert len(fetch.calls) == calls
+        await poller.close()
+
+    @pytest.mark.asyncio
+    async def test_failed_fetch_reaches_waiters(self):
+        fetch = FakeFetch()
+        fetch.error = ConnectionError("papiea is down")
+        poller = WatcherPoller(fetch, interval_secs=0.01)
+        with pytest.raises(ConnectionError):
+            await poller.wait("a", IntentfulStatus.Completed_Successfully, 5)
+        await poller.close()
+
+    @pytest.mark.asyncio
+    async def test_client_with_shared_poller(self):
+        watchers = FakeWatchers("a", "b")
+        watchers.complete_later("a", 0.05)
+        watchers.complete_later("b", 0.1)
+        async with serve(watchers.routes()) as url:
+            async with IntentWatcherClient(url, shared_poll_interval_millis=10) as client:
+                refs = [AttributeDict(uuid="a"), AttributeDict(uuid="b")]
+
+                async def wait_many():
+                    return [w.uuid async for w in client.wait_for_many(refs, IntentfulStatus.Completed_Successfully)]
+
+                results = await asyncio.gather(
+                    wait_many(), *[client.wait_for_watcher_status(ref, IntentfulStatus.Completed_Successfully)
+                                   for ref in refs * 3]
+                )
+                assert results == [["a", "b"]] + [True] * 6
+                # Seven concurrent waits, still a single request per tick
+                assert len(watchers.filter.requests) == client.poller.ticks
+        assert watchers.gets == 0
@@ -0,0 +1,94 @@
+import asyncio
+import os
+import signal
+import socket
+import tempfile
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from papiea.workers import WorkerPool, bind_tcp, bind_unix
+
+started_by_hook = False
+
+
+def mark_started():
+    global started_by_hook
+    started_by_hook = True
+
+
+async def whoami(request: web.Request) -> web.Response:
+    return web.json_response({"pid": os.getpid(), "started_by_hook": started_by_hook})
+
+
+async def ask(url):
+    # A new connection every time, so different workers get to answer
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(force_close=True)) as session:
+        async with session.get(url) as resp:
+            return await resp.json()
+
+
+async def wait_until(condition, timeout_secs=10):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout_secs
+    while not condition():
+        assert loop.time() < deadline
+        await asyncio.sleep(0.02)
+
+
+class TestListen:
+    def test_bind_tcp(self):
+        sock = bind_tcp("127.0.0.1", 0)
+        port = sock.getsockname()[1]
+        assert sock.get_inheritable()
+        assert sock.getsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR)
+        sock.close()
+        # A restarted provider gets its port back right away
+        bind_tcp("127.0.0.1", port).close()
+
+    def test_bind_unix_replaces_stale_socket(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "provider.sock")
+            bind_unix(path).close()
+            assert os.path.exists(path)
+            sock = bind_unix(path)
+            assert sock.get_inheritable()
+            sock.close()
+
+
+class TestWorkerPool:
+    def test_invalid_workers(self):
+        with pytest.raises(ValueError):
+            WorkerPool(web.Application(), [], 0)
+
+    @pytest.mark.asyncio
+    async def test_workers_serve_and_restart(self):
+        app = web.Application()
+        app.add_routes([web.get("/", whoami)])
+        sock = bind_tcp("127.0.0.1", 0)
+        url = f"http://127.0.0.1:{sock.getsockname()[1]}/"
+        pool = WorkerPool(app, [sock], 2, shutdown_timeout=1, check_interval_secs=0.05, on_start=mark_started)
+        pool.start()
+        try:
+            await wait_until(lambda: len(pool.pids) == 2)
+            pids = set(pool.pids)
+            answers = [await ask(url) for _ in range(10)]
+            assert {answer["pid"] for answer in answers} <= pids
+            assert os.getpid() not in pids
+            assert all(answer["started_by_hook"] for answer in answers)
+            assert not started_by_hook
+
+            killed = pool.pids[0]
+            os.kill(killed, signal.SIGKILL)
+            await wait_until(lambda: pool.restarts == 1 and len(pool.pids) == 2)
+            assert killed not in pool.pids
+            assert (await ask(url))["pid"] in pool.pids
+        finally:
+            pids = pool.pids
+            await pool.close()
+        # Stopped and reaped
+        for pid in pids:
+            with pytest.raises(ProcessLookupError):
+                os.kill(pid, 0)
+        assert sock.fileno() == -1